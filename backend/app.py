@@ -1,46 +1,54 @@
 import os
+from importlib import import_module
 from flask import Flask
 from flask_cors import CORS
 import config
 from database import init_db
+from services import metrics, profiler, sql_trace
+from services.usage import BudgetExceeded, seconds_until_reset
+from utils import compression, json_provider
+from utils.helpers import error_response
+
+# Blueprint modules are imported inside create_app(); they are cheap to import
+# because the heavy libraries (openai, PyPDF2, python-docx) are only loaded on
+# first use. See wsgi.py / gunicorn.conf.py for production serving.
+BLUEPRINTS = [
+    'pomodoro', 'books', 'papers', 'quotes', 'problems', 'relaxation', 'documents',
+    'brainstorm', 'essays', 'error_questions', 'notes', 'usage', 'export',
+]
+
+
+def create_app(overrides=None):
+    """Build the Flask app; overrides are applied to app.config (e.g. TESTING)."""
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
+    if overrides:
+        app.config.update(overrides)
+    CORS(app, origins=config.CORS_ORIGINS, expose_headers=['ETag'])
+
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    init_db()
+    metrics.init_app(app)
+    profiler.init_app(app)
+    sql_trace.init_app(app)
+    json_provider.init_app(app)
+    compression.init_app(app)
+
+    for name in BLUEPRINTS:
+        app.register_blueprint(import_module(f'blueprints.{name}').bp)
+
+    @app.errorhandler(BudgetExceeded)
+    def budget_exceeded(e):
+        response, status = error_response('今日 AI 额度已用完，请明天再试', 429)
+        response.headers['Retry-After'] = str(seconds_until_reset())
+        return response, status
 
-app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
-CORS(app, origins=config.CORS_ORIGINS)
-
-os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
-
-# Register blueprints
-from blueprints.pomodoro import bp as pomodoro_bp
-from blueprints.books import bp as books_bp
-from blueprints.papers import bp as papers_bp
-from blueprints.quotes import bp as quotes_bp
-from blueprints.problems import bp as problems_bp
-from blueprints.relaxation import bp as relaxation_bp
-from blueprints.documents import bp as documents_bp
-from blueprints.brainstorm import bp as brainstorm_bp
-from blueprints.essays import bp as essays_bp
-from blueprints.error_questions import bp as error_questions_bp
-from blueprints.notes import bp as notes_bp
-
-app.register_blueprint(pomodoro_bp)
-app.register_blueprint(books_bp)
-app.register_blueprint(papers_bp)
-app.register_blueprint(quotes_bp)
-app.register_blueprint(problems_bp)
-app.register_blueprint(relaxation_bp)
-app.register_blueprint(documents_bp)
-app.register_blueprint(brainstorm_bp)
-app.register_blueprint(essays_bp)
-app.register_blueprint(error_questions_bp)
-app.register_blueprint(notes_bp)
-
-
-@app.route('/api/health')
-def health():
-    return {'status': 'ok'}
+    @app.route('/api/health')
+    def health():
+        return {'status': 'ok'}
+
+    return app
 
 
 if __name__ == '__main__':
-    init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -1,14 +1,22 @@
 import os
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
-from utils.file_parser import extract_text_from_file
-from services.ai_service import chat_completion, chat_completion_json
+from utils.file_parser import extract_text_from_file, save_upload
+from utils.http_cache import row_etag, collection_etag, is_fresh, not_modified, with_etag
+from services.sql_trace import query_budget
+from services.usage import tag_user
+from services.ai_service import chat_completion
+from utils.chunker import head
+from services import book_enrichment, extraction_cache, tasks, upload_sessions
 import config
 
 bp = Blueprint('books', __name__, url_prefix='/api/v1/books')
 
+_META_COLUMNS = 'id, title, author, summary, length(content) AS content_length, user_id, created_at, updated_at'
+MAX_RANGE_LENGTH = 200000
+
 
 @bp.route('/upload', methods=['POST'])
 def upload_book():
@@ -25,58 +33,234 @@ def upload_book():
         return error_response('Unsupported file type')
 
     file_path = os.path.join(config.UPLOAD_FOLDER, gen_id() + ext)
-    file.save(file_path)
+    digest, _ = save_upload(file.stream, file_path)
+    # Clients may pass their own uploadId and poll /upload/<uploadId>/progress meanwhile
+    return _ingest_upload(file_path, digest, ext, title, author, user_id, request.form.get('uploadId') or None)
+
+
+@bp.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json or {}
+    filename = data.get('filename', '')
+    if os.path.splitext(filename)[1].lower() not in ('.txt', '.pdf', '.docx'):
+        return error_response('Unsupported file type')
+    meta = {'title': data.get('title', filename), 'author': data.get('author', ''), 'userId': data.get('userId', '')}
+    try:
+        session = upload_sessions.create('book', filename, data.get('size'), data.get('sha256'), meta)
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return jsonify(upload_sessions.format_session(session)), 201
+
+
+@bp.route('/upload/sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    session = upload_sessions.get(upload_id, 'book')
+    if not session:
+        return error_response('Upload session not found', 404)
+    return jsonify(upload_sessions.format_session(session))
 
+
+@bp.route('/upload/sessions/<upload_id>/chunks', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    session = upload_sessions.get(upload_id, 'book')
+    if not session:
+        return error_response('Upload session not found', 404)
+    try:
+        session = upload_sessions.write_chunk(
+            session, request.args.get('offset', 0, type=int), request.content_length,
+            request.stream, request.headers.get('X-Chunk-Sha256')
+        )
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return jsonify(upload_sessions.format_session(session))
+
+
+@bp.route('/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    session = upload_sessions.get(upload_id, 'book')
+    if not session:
+        return error_response('Upload session not found', 404)
+    meta = session['meta']
+    ext = os.path.splitext(session['filename'])[1].lower()
+    try:
+        # The session is removed once the upload is ingested and reopened if that fails
+        with upload_sessions.completing(session) as (file_path, digest):
+            try:
+                # Parsing progress is reported under the session id
+                content = _extract(file_path, digest, ext, upload_id)
+            except Exception as e:
+                raise upload_sessions.UploadError(f'Failed to parse file: {str(e)}') from e
+            response = _create_book(content, digest + ext, meta['title'], meta['author'], meta['userId'])
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return response
+
+
+@bp.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+def delete_upload_session(upload_id):
+    if not upload_sessions.get(upload_id, 'book'):
+        return error_response('Upload session not found', 404)
+    upload_sessions.discard(upload_id)
+    return jsonify({'success': True})
+
+
+def _ingest_upload(file_path, digest, ext, title, author, user_id, upload_id=None):
+    """Parse a saved upload (deleting it afterwards) and create the book."""
     try:
-        content = extract_text_from_file(file_path)
+        content = _extract(file_path, digest, ext, upload_id)
     except Exception as e:
         return error_response(f'Failed to parse file: {str(e)}')
     finally:
         if os.path.exists(file_path):
             os.remove(file_path)
+    return _create_book(content, digest + ext, title, author, user_id)
+
+
+def _extract(file_path, digest, ext, upload_id):
+    # The extension is part of the key: the same bytes parse differently as .txt and .pdf
+    content_hash = digest + ext
+    job_id = tasks.track('book_upload', upload_id)
+    try:
+        content = extraction_cache.lookup(content_hash)
+        if content is None:
+            content = extract_text_from_file(file_path, progress=lambda done, total: tasks.update(job_id, done=done, total=total))
+            extraction_cache.store(content_hash, content)
+    except Exception as e:
+        tasks.finish(job_id, str(e))
+        raise
+    tasks.finish(job_id)
+    return content
+
 
-    book_id = gen_id()
+def _create_book(content, content_hash, title, author, user_id):
+    book_id = gen_id(user_id)
     now = now_iso()
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO books (id, title, author, content, user_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
         (book_id, title, author, content, user_id, now, now)
     )
+    extraction_cache.acquire(db, book_id, content_hash)
+    book_enrichment.build_index(db, book_id, content)
     db.commit()
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
     db.close()
+    if book['content']:
+        book_enrichment.enqueue(book_id)
     return jsonify(_format_book(book))
 
 
+@bp.route('/upload/<upload_id>/progress', methods=['GET'])
+def get_upload_progress(upload_id):
+    job = tasks.get(upload_id)
+    if not job:
+        return error_response('Upload not found', 404)
+    return jsonify(job)
+
+
 @bp.route('', methods=['POST'])
 def create_book():
     data = request.json
-    book_id = gen_id()
+    user_id = data.get('userId', '')
+    book_id = gen_id(user_id)
     now = now_iso()
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO books (id, title, author, content, user_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        (book_id, data.get('title'), data.get('author', ''), data.get('content', ''), data.get('userId', ''), now, now)
+        (book_id, data.get('title'), data.get('author', ''), data.get('content', ''), user_id, now, now)
     )
+    book_enrichment.build_index(db, book_id, data.get('content') or '')
     db.commit()
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
     db.close()
+    if book['content']:
+        book_enrichment.enqueue(book_id)
     return jsonify(_format_book(book))
 
 
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_books(user_id):
-    db = get_db()
+    with_content = request.args.get('content') != '0'
+    db = get_db(user_id)
+    etag = collection_etag(db, 'books', user_id, variant='full' if with_content else 'meta')
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
+
+    # ?content=0 lists books without their text; readers then fetch chapters on demand
+    if not with_content:
+        rows = db.execute(
+            f'SELECT {_META_COLUMNS} FROM books WHERE user_id = ? ORDER BY created_at DESC', (user_id,)
+        ).fetchall()
+        db.close()
+        return with_etag(jsonify([_format_book_meta(row_to_dict(r)) for r in rows]), etag)
+
     rows = db.execute('SELECT * FROM books WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
     db.close()
-    return jsonify([_format_book(row_to_dict(r)) for r in rows])
+    return with_etag(jsonify([_format_book(row_to_dict(r)) for r in rows]), etag)
+
+
+@bp.route('/<book_id>', methods=['GET'])
+def get_book(book_id):
+    db = get_db_for('books', book_id)
+    etag = row_etag(db, 'books', book_id)
+    if etag is None:
+        db.close()
+        return error_response('Book not found', 404)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
+    book = row_to_dict(db.execute(f'SELECT {_META_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone())
+    chapters = _load_chapters(db, book_id)
+    db.close()
+    result = _format_book_meta(book)
+    result['chapters'] = chapters
+    return with_etag(jsonify(result), etag)
+
+
+@bp.route('/<book_id>/chapters', methods=['GET'])
+def get_chapters(book_id):
+    db = get_db_for('books', book_id)
+    chapters = _load_chapters(db, book_id)
+    db.close()
+    return jsonify(chapters)
+
+
+@bp.route('/<book_id>/chapters/<int:index>', methods=['GET'])
+def get_chapter(book_id, index):
+    db = get_db_for('books', book_id)
+    chapter = _load_chapter(db, book_id, index)
+    db.close()
+    if not chapter:
+        return error_response('Chapter not found', 404)
+    return jsonify(chapter)
+
+
+@bp.route('/<book_id>/content', methods=['GET'])
+def get_content_range(book_id):
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    length = min(max(request.args.get('length', MAX_RANGE_LENGTH, type=int), 0), MAX_RANGE_LENGTH)
+
+    db = get_db_for('books', book_id)
+    # substr() counts characters, matching the Python string offsets stored in book_chapters
+    row = db.execute(
+        'SELECT substr(content, ?, ?) AS text, length(content) AS total FROM books WHERE id = ?',
+        (offset + 1, length, book_id)
+    ).fetchone()
+    db.close()
+    if not row:
+        return error_response('Book not found', 404)
+    return jsonify({'bookId': book_id, 'offset': offset, 'length': len(row['text'] or ''),
+                    'totalLength': row['total'] or 0, 'content': row['text'] or ''})
 
 
 @bp.route('/<book_id>', methods=['DELETE'])
 def delete_book(book_id):
-    db = get_db()
+    db = get_db_for('books', book_id)
     db.execute('DELETE FROM books WHERE id = ?', (book_id,))
     db.execute('DELETE FROM reading_progress WHERE book_id = ?', (book_id,))
+    book_enrichment.delete_book_data(db, book_id)
+    extraction_cache.release(db, book_id)
     db.commit()
     db.close()
     return jsonify({'message': 'ok'})
@@ -85,23 +269,28 @@ def delete_book(book_id):
 @bp.route('/<book_id>/summary', methods=['POST'])
 def generate_summary(book_id):
     data = request.json or {}
-    db = get_db()
+    db = get_db_for('books', book_id)
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
     db.close()
     if not book:
         return error_response('Book not found', 404)
+    tag_user(book['user_id'])
 
-    content_preview = book['content'][:3000] if book['content'] else ''
     style = data.get('style', 'concise')
     max_len = data.get('maxLength', 500)
 
-    summary = chat_completion([
-        {'role': 'system', 'content': '你是一个专业的书籍摘要助手。'},
-        {'role': 'user', 'content': f'请为以下书籍生成{style}风格的摘要，不超过{max_len}字：\n\n书名：{book["title"]}\n作者：{book["author"]}\n\n内容节选：\n{content_preview}'}
-    ])
+    chapter_index = data.get('chapterIndex')
+    if chapter_index is not None:
+        return _chapter_summary(book, chapter_index, style, max_len, data.get('refresh'))
+
+    # Serve the precomputed default summary unless the caller wants something else
+    if book['summary'] and not data.get('refresh') and style == 'concise' and max_len == 500:
+        return jsonify({'summary': book['summary']})
+
+    summary = book_enrichment.summarize(book, style, max_len)
 
-    db = get_db()
-    db.execute('UPDATE books SET summary = ? WHERE id = ?', (summary, book_id))
+    db = get_db_for('books', book_id)
+    db.execute('UPDATE books SET summary = ?, updated_at = ? WHERE id = ?', (summary, now_iso(), book_id))
     db.commit()
     db.close()
     return jsonify({'summary': summary})
@@ -111,33 +300,63 @@ def generate_summary(book_id):
 def sq3r_guide(book_id):
     data = request.json or {}
     chapter_title = data.get('chapterTitle', '')
-
-    db = get_db()
+    chapter_index = data.get('chapterIndex')
+
+    if chapter_index is not None:
+        db = get_db_for('books', book_id)
+        book = row_to_dict(db.execute(f'SELECT {_META_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone())
+        chapter = _load_chapter(db, book_id, chapter_index) if book else None
+        kind = f'sq3r:{chapter_index}'
+        precomputed = book_enrichment.latest_artifact(db, book_id, kind) if chapter and not data.get('refresh') else None
+        db.close()
+        if not book:
+            return error_response('Book not found', 404)
+        if not chapter:
+            return error_response('Chapter not found', 404)
+        tag_user(book['user_id'])
+        if precomputed:
+            return jsonify(precomputed)
+        result = book_enrichment.sq3r_guide(book, chapter['title'], chapter['content'])
+        db = get_db_for('books', book_id)
+        book_enrichment.save_artifact(db, book_id, kind, result)
+        db.commit()
+        db.close()
+        return jsonify(result)
+
+    db = get_db_for('books', book_id)
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
+    precomputed = None
+    if book and chapter_title in ('', book['title']) and not data.get('refresh'):
+        precomputed = book_enrichment.latest_artifact(db, book_id, 'sq3r')
     db.close()
     if not book:
         return error_response('Book not found', 404)
-
-    content_preview = book['content'][:2000] if book['content'] else ''
-    result = chat_completion_json([
-        {'role': 'system', 'content': '你是SQ3R阅读法专家。返回JSON格式：{"steps": [{"step": "survey|question|read|recite|review", "title": "步骤标题", "content": "具体指导内容", "completed": false}]}'},
-        {'role': 'user', 'content': f'为书籍《{book["title"]}》的章节"{chapter_title}"生成SQ3R阅读指导。\n\n内容节选：\n{content_preview}'}
-    ])
+    tag_user(book['user_id'])
+
+    if precomputed:
+        return jsonify(precomputed)
+    result = book_enrichment.sq3r_guide(book, chapter_title)
+    if chapter_title in ('', book['title']):
+        db = get_db_for('books', book_id)
+        book_enrichment.save_artifact(db, book_id, 'sq3r', result)
+        db.commit()
+        db.close()
     return jsonify(result)
 
 
 @bp.route('/<book_id>/progress/<user_id>', methods=['GET'])
 def get_progress(book_id, user_id):
-    db = get_db()
+    db = get_db_for('books', book_id)
     row = db.execute(
         'SELECT * FROM reading_progress WHERE book_id = ? AND user_id = ?',
         (book_id, user_id)
     ).fetchone()
+    total_chapters = _chapter_count(db, book_id) if not row else None
     db.close()
     if not row:
         return jsonify({
             'bookId': book_id, 'userId': user_id,
-            'currentChapter': 1, 'totalChapters': 1,
+            'currentChapter': 1, 'totalChapters': total_chapters,
             'completedSteps': [], 'comprehensionScore': 0
         })
     p = row_to_dict(row)
@@ -151,11 +370,12 @@ def get_progress(book_id, user_id):
 
 
 @bp.route('/<book_id>/progress/<user_id>/complete', methods=['POST'])
+@query_budget(4)
 def complete_step(book_id, user_id):
     data = request.json or {}
     step_type = data.get('stepType', '')
 
-    db = get_db()
+    db = get_db_for('books', book_id)
     row = db.execute(
         'SELECT * FROM reading_progress WHERE book_id = ? AND user_id = ?',
         (book_id, user_id)
@@ -173,8 +393,8 @@ def complete_step(book_id, user_id):
         pid = gen_id()
         steps = [{'step': step_type, 'completed': True, 'userResponse': data.get('userResponse', '')}]
         db.execute(
-            'INSERT INTO reading_progress (id, book_id, user_id, completed_steps) VALUES (?, ?, ?, ?)',
-            (pid, book_id, user_id, json.dumps(steps))
+            'INSERT INTO reading_progress (id, book_id, user_id, total_chapters, completed_steps) VALUES (?, ?, ?, ?, ?)',
+            (pid, book_id, user_id, _chapter_count(db, book_id), json.dumps(steps))
         )
 
     db.commit()
@@ -195,33 +415,55 @@ def complete_step(book_id, user_id):
 
 @bp.route('/<book_id>/author-agent', methods=['POST'])
 def create_author_agent(book_id):
-    db = get_db()
+    db = get_db_for('books', book_id)
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
+    precomputed = book_enrichment.latest_artifact(db, book_id, 'author_intro') if book else None
     db.close()
     if not book:
         return error_response('Book not found', 404)
+    tag_user(book['user_id'])
+
+    if precomputed:
+        return jsonify({'response': precomputed, 'bookId': book_id})
 
-    content_preview = book['content'][:2000] if book['content'] else ''
-    response = chat_completion([
-        {'role': 'system', 'content': f'你现在扮演《{book["title"]}》的作者{book["author"]}。基于书籍内容回答读者的问题，保持作者的语气和风格。'},
-        {'role': 'user', 'content': f'书籍内容节选：\n{content_preview}\n\n请以作者身份做一个简短的自我介绍，并欢迎读者提问。'}
-    ])
+    response = book_enrichment.author_intro(book)
+    db = get_db_for('books', book_id)
+    book_enrichment.save_artifact(db, book_id, 'author_intro', response)
+    db.commit()
+    db.close()
     return jsonify({'response': response, 'bookId': book_id})
 
 
+@bp.route('/<book_id>/enrichment', methods=['GET'])
+def get_enrichment(book_id):
+    return jsonify(book_enrichment.status(book_id))
+
+
+@bp.route('/<book_id>/enrichment', methods=['POST'])
+def rerun_enrichment(book_id):
+    db = get_db_for('books', book_id)
+    row = db.execute('SELECT id FROM books WHERE id = ?', (book_id,)).fetchone()
+    db.close()
+    if not row:
+        return error_response('Book not found', 404)
+    job_id = book_enrichment.enqueue(book_id)
+    return jsonify({'jobId': job_id})
+
+
 @bp.route('/<book_id>/author-chat', methods=['POST'])
 def author_chat(book_id):
     data = request.json or {}
     message = data.get('message', '')
     history = data.get('conversationHistory', [])
 
-    db = get_db()
+    db = get_db_for('books', book_id)
     book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
     db.close()
     if not book:
         return error_response('Book not found', 404)
+    tag_user(book['user_id'])
 
-    content_preview = book['content'][:2000] if book['content'] else ''
+    content_preview = head(book['content'], config.EXCERPT_TOKENS)
     messages = [
         {'role': 'system', 'content': f'你现在扮演《{book["title"]}》的作者{book["author"]}。基于书籍内容回答问题。\n\n书籍内容节选：\n{content_preview}'}
     ]
@@ -233,6 +475,70 @@ def author_chat(book_id):
     return jsonify({'response': response})
 
 
+def _chapter_summary(book, chapter_index, style, max_len, refresh):
+    kind = f'summary:{chapter_index}:{style}:{max_len}'
+    db = get_db_for('books', book['id'])
+    chapter = _load_chapter(db, book['id'], chapter_index)
+    precomputed = book_enrichment.latest_artifact(db, book['id'], kind) if chapter and not refresh else None
+    db.close()
+    if not chapter:
+        return error_response('Chapter not found', 404)
+    if precomputed:
+        return jsonify({'summary': precomputed, 'chapterIndex': chapter_index})
+
+    summary = book_enrichment.summarize(book, style, max_len, chapter=chapter)
+    db = get_db_for('books', book['id'])
+    book_enrichment.save_artifact(db, book['id'], kind, summary)
+    db.commit()
+    db.close()
+    return jsonify({'summary': summary, 'chapterIndex': chapter_index})
+
+
+def _load_chapters(db, book_id):
+    rows = db.execute(
+        'SELECT idx, title, start_offset, end_offset FROM book_chapters WHERE book_id = ? ORDER BY idx',
+        (book_id,)
+    ).fetchall()
+    return [{
+        'index': r['idx'], 'title': r['title'],
+        'offset': r['start_offset'], 'length': r['end_offset'] - r['start_offset'],
+    } for r in rows]
+
+
+def _load_chapter(db, book_id, index):
+    row = db.execute(
+        'SELECT c.idx, c.title, c.start_offset, c.end_offset, '
+        'substr(b.content, c.start_offset + 1, c.end_offset - c.start_offset) AS text '
+        'FROM book_chapters c JOIN books b ON b.id = c.book_id WHERE c.book_id = ? AND c.idx = ?',
+        (book_id, index)
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        'bookId': book_id, 'index': row['idx'], 'title': row['title'],
+        'offset': row['start_offset'], 'length': row['end_offset'] - row['start_offset'],
+        'content': row['text'] or '',
+    }
+
+
+def _chapter_count(db, book_id):
+    row = db.execute('SELECT COUNT(*) AS n FROM book_chapters WHERE book_id = ?', (book_id,)).fetchone()
+    return row['n'] or 1
+
+
+def _format_book_meta(b):
+    return {
+        'id': b['id'],
+        'title': b['title'],
+        'author': b['author'],
+        'summary': b['summary'],
+        'contentLength': b['content_length'] or 0,
+        'userId': b['user_id'],
+        'createdAt': b['created_at'],
+        'updatedAt': b['updated_at'],
+    }
+
+
 def _format_book(b):
     return {
         'id': b['id'],
@@ -1,8 +1,11 @@
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
+from services.sql_trace import query_budget
+from services.usage import tag_user
 from services.ai_service import chat_completion, chat_completion_json
+from services import brainstorm_synthesis
 
 bp = Blueprint('brainstorm', __name__, url_prefix='/api/v1/brainstorm')
 
@@ -13,8 +16,8 @@ def create_session():
     user_id = data.get('userId', '')
     topic = data.get('topic', '')
 
-    session_id = gen_id()
-    db = get_db()
+    session_id = gen_id(user_id)
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO brainstorm_sessions (id, user_id, topic, created_at) VALUES (?,?,?,?)',
         (session_id, user_id, topic, now_iso())
@@ -27,7 +30,7 @@ def create_session():
 
 @bp.route('/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
-    db = get_db()
+    db = get_db_for('brainstorm_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     db.close()
     if not session:
@@ -38,7 +41,7 @@ def get_session(session_id):
 @bp.route('/sessions', methods=['GET'])
 def get_sessions():
     user_id = request.args.get('userId', '')
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM brainstorm_sessions WHERE user_id = ? ORDER BY created_at DESC',
         (user_id,)
@@ -48,12 +51,15 @@ def get_sessions():
 
 
 @bp.route('/sessions/<session_id>/start-discussion', methods=['POST'])
+# Session read, update and re-read; LLM usage accounting is not counted
+@query_budget(3)
 def start_discussion(session_id):
-    db = get_db()
+    db = get_db_for('brainstorm_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     if not session:
         db.close()
         return error_response('Session not found', 404)
+    tag_user(session['user_id'])
 
     topic = session['topic']
     roles = ['optimist', 'pessimist', 'realist', 'creative']
@@ -65,6 +71,7 @@ def start_discussion(session_id):
     }
 
     messages = parse_json_field(session['messages'], [])
+    first = len(messages)
     for role in roles:
         content = chat_completion([
             {'role': 'system', 'content': '你是头脑风暴讨论的参与者。'},
@@ -77,6 +84,7 @@ def start_discussion(session_id):
         (json.dumps(messages), session_id)
     )
     db.commit()
+    brainstorm_synthesis.round_added(session, first, len(messages) - first)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     db.close()
     return jsonify(_format_session(session))
@@ -84,24 +92,14 @@ def start_discussion(session_id):
 
 @bp.route('/sessions/<session_id>/synthesize', methods=['POST'])
 def synthesize(session_id):
-    db = get_db()
+    db = get_db_for('brainstorm_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     if not session:
         db.close()
         return error_response('Session not found', 404)
+    tag_user(session['user_id'])
 
-    messages = parse_json_field(session['messages'], [])
-    discussion = '\n'.join([f"[{m['role']}]: {m['content']}" for m in messages])
-
-    synthesis = chat_completion([
-        {'role': 'system', 'content': '你是讨论总结专家，综合各方观点给出结论。'},
-        {'role': 'user', 'content': f'话题：{session["topic"]}\n\n讨论内容：\n{discussion}\n\n请综合以上观点，给出总结和建议。'}
-    ])
-
-    db.execute(
-        'UPDATE brainstorm_sessions SET synthesis = ?, status = "completed" WHERE id = ?',
-        (synthesis, session_id)
-    )
+    brainstorm_synthesis.synthesize(db, session)
     db.commit()
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     db.close()
@@ -113,13 +111,15 @@ def deep_dive(session_id):
     data = request.json or {}
     focus_point = data.get('focusPoint', '')
 
-    db = get_db()
+    db = get_db_for('brainstorm_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     if not session:
         db.close()
         return error_response('Session not found', 404)
+    tag_user(session['user_id'])
 
     messages = parse_json_field(session['messages'], [])
+    first = len(messages)
     roles = ['optimist', 'pessimist', 'realist', 'creative']
 
     for role in roles:
@@ -134,6 +134,7 @@ def deep_dive(session_id):
         (json.dumps(messages), session_id)
     )
     db.commit()
+    brainstorm_synthesis.round_added(session, first, len(messages) - first)
     session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
     db.close()
     return jsonify(_format_session(session))
@@ -141,8 +142,9 @@ def deep_dive(session_id):
 
 @bp.route('/sessions/<session_id>', methods=['DELETE'])
 def delete_session(session_id):
-    db = get_db()
+    db = get_db_for('brainstorm_sessions', session_id)
     db.execute('DELETE FROM brainstorm_sessions WHERE id = ?', (session_id,))
+    brainstorm_synthesis.delete_session_data(db, session_id)
     db.commit()
     db.close()
     return jsonify({'message': 'ok'})
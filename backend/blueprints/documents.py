@@ -1,7 +1,9 @@
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, error_response
+from utils.http_cache import row_etag, version_etag, collection_etag, is_fresh, precondition_failed, not_modified, with_etag
+from services.usage import tag_user
 from services.ai_service import chat_completion, chat_completion_json
 
 bp = Blueprint('documents', __name__, url_prefix='/api/v1/documents')
@@ -10,12 +12,13 @@ bp = Blueprint('documents', __name__, url_prefix='/api/v1/documents')
 @bp.route('', methods=['POST'])
 def create_document():
     data = request.json
-    doc_id = gen_id()
+    user_id = data.get('userId', '')
+    doc_id = gen_id(user_id)
     now = now_iso()
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO documents (id, title, content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?)',
-        (doc_id, data.get('title',''), data.get('content',''), data.get('userId',''), now, now)
+        (doc_id, data.get('title',''), data.get('content',''), user_id, now, now)
     )
     db.commit()
     doc = row_to_dict(db.execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone())
@@ -25,27 +28,44 @@ def create_document():
 
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_documents(user_id):
-    db = get_db()
+    db = get_db(user_id)
+    etag = collection_etag(db, 'documents', user_id)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
     rows = db.execute('SELECT * FROM documents WHERE user_id = ? ORDER BY updated_at DESC', (user_id,)).fetchall()
     db.close()
-    return jsonify([_format_doc(row_to_dict(r)) for r in rows])
+    return with_etag(jsonify([_format_doc(row_to_dict(r)) for r in rows]), etag)
 
 
 @bp.route('/<doc_id>', methods=['GET'])
 def get_document(doc_id):
-    db = get_db()
+    db = get_db_for('documents', doc_id)
+    etag = row_etag(db, 'documents', doc_id)
+    if etag is None:
+        db.close()
+        return error_response('Document not found', 404)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
     doc = row_to_dict(db.execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone())
     db.close()
-    if not doc:
-        return error_response('Document not found', 404)
-    return jsonify(_format_doc(doc))
+    return with_etag(jsonify(_format_doc(doc)), etag)
 
 
 @bp.route('/<doc_id>', methods=['PUT'])
 def update_document(doc_id):
     data = request.json
     now = now_iso()
-    db = get_db()
+    db = get_db_for('documents', doc_id)
+    etag = row_etag(db, 'documents', doc_id)
+    if etag is None:
+        db.close()
+        return error_response('Document not found', 404)
+    # If-Match guards against overwriting an edit made elsewhere since the client loaded the document
+    if precondition_failed(etag):
+        db.close()
+        return error_response('Document has been modified since it was loaded', 412)
     db.execute(
         'UPDATE documents SET title = ?, content = ?, updated_at = ? WHERE id = ?',
         (data.get('title',''), data.get('content',''), now, doc_id)
@@ -53,12 +73,12 @@ def update_document(doc_id):
     db.commit()
     doc = row_to_dict(db.execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone())
     db.close()
-    return jsonify(_format_doc(doc))
+    return with_etag(jsonify(_format_doc(doc)), version_etag('documents', doc_id, doc['updated_at']))
 
 
 @bp.route('/<doc_id>', methods=['DELETE'])
 def delete_document(doc_id):
-    db = get_db()
+    db = get_db_for('documents', doc_id)
     db.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
     db.commit()
     db.close()
@@ -67,11 +87,12 @@ def delete_document(doc_id):
 
 @bp.route('/<doc_id>/chat', methods=['POST'])
 def document_chat(doc_id):
-    db = get_db()
+    db = get_db_for('documents', doc_id)
     doc = row_to_dict(db.execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone())
     db.close()
     if not doc:
         return error_response('Document not found', 404)
+    tag_user(doc['user_id'])
 
     data = request.json or {}
     history = data.get('history', [])
@@ -110,9 +131,9 @@ def generate_document():
     title = result.get('title', '未命名文档')
     content = result.get('content', '')
 
-    doc_id = gen_id()
+    doc_id = gen_id(user_id)
     now = now_iso()
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO documents (id, title, content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?)',
         (doc_id, title, content, user_id, now, now)
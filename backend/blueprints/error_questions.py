@@ -1,34 +1,119 @@
+import hashlib
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+import config
+from database import get_db, get_db_for
+from utils import images
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
-from services.ai_service import chat_completion_json
+from services import bulk_import, question_index, vision_cache
+from services.ai_service import chat_completion_json, vision_completion_json
 
 bp = Blueprint('error_questions', __name__, url_prefix='/api/v1/error-questions')
 
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+IMPORT_FIELDS = [
+    bulk_import.Field('question', required=True),
+    bulk_import.Field('userAnswer', 'user_answer'),
+    bulk_import.Field('correctAnswer', 'correct_answer'),
+    bulk_import.Field('explanation'),
+    bulk_import.Field('subject', max_length=100),
+    bulk_import.Field('difficulty', default='medium', choices=DIFFICULTIES),
+]
+
+# Bump when the recognition prompt changes so cached answers are not reused
+VISION_PROMPT_VERSION = 1
+
 
 @bp.route('', methods=['POST'])
 def add_error_question():
     data = request.json
-    eq_id = gen_id()
-    db = get_db()
+    user_id = data.get('userId', '')
+    eq_id = gen_id(user_id)
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO error_questions (id, user_id, question, user_answer, correct_answer, explanation, subject, difficulty, created_at) VALUES (?,?,?,?,?,?,?,?,?)',
-        (eq_id, data.get('userId',''), data.get('question',''),
+        (eq_id, user_id, data.get('question',''),
          data.get('userAnswer',''), data.get('correctAnswer',''),
          data.get('explanation',''), data.get('subject',''),
          data.get('difficulty','medium'), now_iso())
     )
+    question_index.add(db, [(eq_id, user_id, data.get('question', ''))])
     db.commit()
     row = row_to_dict(db.execute('SELECT * FROM error_questions WHERE id = ?', (eq_id,)).fetchone())
     db.close()
     return jsonify(_format_eq(row))
 
 
+@bp.route('/import', methods=['POST'])
+def import_error_questions():
+    """Bulk-add error questions from a JSON array or CSV (see services/bulk_import.py)."""
+    return bulk_import.import_rows(
+        request, 'error_questions', IMPORT_FIELDS, {'created_at': now_iso()}, after_insert=question_index.schedule
+    )
+
+
+@bp.route('/from-image', methods=['POST'])
+def add_error_question_from_image():
+    """Create an error question from a photo of it (multipart: image, userId, optional subject).
+
+    The photo is preprocessed (utils/images.py) and read by the vision model;
+    photos seen before are answered from services/vision_cache.py.
+    """
+    upload = request.files.get('image')
+    if not upload:
+        return error_response('No image uploaded')
+    data = upload.read(config.VISION_MAX_UPLOAD_BYTES + 1)
+    if len(data) > config.VISION_MAX_UPLOAD_BYTES:
+        return error_response('Image too large', 413)
+    if config.VISION_PREPROCESS:
+        try:
+            image = images.load(data)
+        except images.ImageError as e:
+            return error_response(str(e))
+        image_hash = images.image_hash(image)
+    else:
+        image, image_hash = None, 'sha256:' + hashlib.sha256(data).hexdigest()
+
+    user_id = request.form.get('userId', '')
+    result = vision_cache.lookup(image_hash, VISION_PROMPT_VERSION, user_id)
+    cached = result is not None
+    if not cached:
+        if image is not None:
+            payload, mime = images.encode(image), 'image/jpeg'
+        else:
+            payload, mime = data, upload.mimetype or 'image/jpeg'
+        result = vision_completion_json(
+            payload, '请识别这张图片中的错题。',
+            '你是错题识别专家。识别图片中的题目，返回JSON：{"question":"题目原文","userAnswer":"学生作答，没有则为空","correctAnswer":"正确答案","explanation":"解析","subject":"学科","difficulty":"easy|medium|hard"}',
+            mime
+        )
+        if not isinstance(result, dict) or not str(result.get('question') or '').strip():
+            return error_response('No question found in the image', 422)
+        vision_cache.store(image_hash, VISION_PROMPT_VERSION, result, user_id)
+
+    difficulty = result.get('difficulty')
+    eq_id = gen_id(user_id)
+    db = get_db(user_id)
+    db.execute(
+        'INSERT INTO error_questions (id, user_id, question, user_answer, correct_answer, explanation, subject, difficulty, created_at) VALUES (?,?,?,?,?,?,?,?,?)',
+        (eq_id, user_id, str(result.get('question', '')),
+         str(result.get('userAnswer') or ''), str(result.get('correctAnswer') or ''),
+         str(result.get('explanation') or ''), request.form.get('subject') or str(result.get('subject') or ''),
+         difficulty if difficulty in DIFFICULTIES else 'medium', now_iso())
+    )
+    question_index.add(db, [(eq_id, user_id, str(result.get('question', '')))])
+    db.commit()
+    row = row_to_dict(db.execute('SELECT * FROM error_questions WHERE id = ?', (eq_id,)).fetchone())
+    db.close()
+    return jsonify(dict(_format_eq(row), fromCache=cached))
+
+
 @bp.route('/<eq_id>', methods=['DELETE'])
 def delete_error_question(eq_id):
-    db = get_db()
+    db = get_db_for('error_questions', eq_id)
     db.execute('DELETE FROM error_questions WHERE id = ?', (eq_id,))
+    question_index.remove(db, eq_id)
     db.commit()
     db.close()
     return jsonify({'message': 'ok'})
@@ -36,7 +121,7 @@ def delete_error_question(eq_id):
 
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_errors(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM error_questions WHERE user_id = ? ORDER BY created_at DESC',
         (user_id,)
@@ -47,7 +132,7 @@ def get_user_errors(user_id):
 
 @bp.route('/user/<user_id>/analysis', methods=['GET'])
 def get_analysis(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM error_questions WHERE user_id = ?', (user_id,)
     ).fetchall()
@@ -75,7 +160,7 @@ def get_analysis(user_id):
 
 @bp.route('/user/<user_id>/weak-subjects', methods=['GET'])
 def get_weak_subjects(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT subject, COUNT(*) as cnt, AVG(mastery_level) as avg_mastery FROM error_questions WHERE user_id = ? GROUP BY subject',
         (user_id,)
@@ -93,40 +178,78 @@ def get_weak_subjects(user_id):
     return jsonify(result)
 
 
+CLUSTER_PAGE_SIZE = 50
+MAX_CLUSTER_PAGE_SIZE = 200
+MAX_PRACTICE_QUESTIONS = 20
+
+
+@bp.route('/user/<user_id>/clusters', methods=['GET'])
+def get_clusters(user_id):
+    """Groups of near-duplicate error questions (services/question_index.py).
+
+    ?order=largest (default) or weakest; paged with ?limit (default
+    CLUSTER_PAGE_SIZE, at most MAX_CLUSTER_PAGE_SIZE) and ?offset.
+    """
+    order = request.args.get('order', 'largest')
+    limit = min(max(request.args.get('limit', CLUSTER_PAGE_SIZE, type=int), 1), MAX_CLUSTER_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    db = get_db(user_id)
+    question_index.ensure_indexed(db, user_id)
+    result = question_index.clusters(db, user_id, order, limit, offset)
+    db.close()
+    return jsonify([_format_cluster(c) for c in result])
+
+
 @bp.route('/user/<user_id>/generate-practice', methods=['POST'])
 def generate_practice(user_id):
+    """Practice questions aimed at the user's recurring mistakes.
+
+    One representative question is taken from each of the `count` largest
+    clusters of similar errors, or the weakest ones with "strategy": "weakest".
+    """
     data = request.json or {}
     count = data.get('count', 3)
+    strategy = data.get('strategy', 'largest')
+    if not isinstance(count, int) or isinstance(count, bool):
+        return error_response('count must be an integer')
+    count = min(max(count, 1), MAX_PRACTICE_QUESTIONS)
 
-    db = get_db()
-    rows = db.execute(
-        'SELECT * FROM error_questions WHERE user_id = ? ORDER BY created_at DESC LIMIT 10',
-        (user_id,)
-    ).fetchall()
+    db = get_db(user_id)
+    question_index.ensure_indexed(db, user_id)
+    groups = question_index.clusters(db, user_id, strategy, count)
     db.close()
-
-    errors = rows_to_list(rows)
-    if not errors:
+    if not groups:
         return jsonify([])
 
     error_summary = '\n'.join([
-        f"- 学科:{e['subject']}，题目:{e['question'][:50]}"
-        for e in errors[:5]
+        f"- 学科:{g['representative']['subject']}，同类错题{g['size']}道，掌握度{g['average_mastery']:.1f}，"
+        f"代表题:{g['representative']['question'][:200]}"
+        for g in groups
     ])
 
     result = chat_completion_json([
         {'role': 'system', 'content': f'你是出题专家。根据学生的错题记录生成练习题。返回JSON数组：[{{"question":"题目","correctAnswer":"答案","explanation":"解析","hints":["提示"],"subject":"学科","difficulty":"easy|medium|hard","basedOnErrorId":""}}]'},
-        {'role': 'user', 'content': f'根据以下错题记录生成{count}道练习题：\n{error_summary}'}
+        {'role': 'user', 'content': f'以下是学生反复出错的几类题目，每类给出一道代表题。请针对这些薄弱点生成{count}道练习题，按类别轮流出题：\n{error_summary}'}
     ])
 
     if isinstance(result, list):
         for i, item in enumerate(result):
-            if i < len(errors):
-                item['basedOnErrorId'] = errors[i]['id']
+            if isinstance(item, dict):
+                item['basedOnErrorId'] = groups[i % len(groups)]['representative']['id']
         return jsonify(result)
     return jsonify([])
 
 
+def _format_cluster(c):
+    return {
+        'clusterId': c['cluster_id'],
+        'size': c['size'],
+        'averageMastery': round(c['average_mastery'], 2),
+        'lastErrorAt': c['last_error_at'],
+        'representative': _format_eq(c['representative']),
+    }
+
+
 def _format_eq(e):
     return {
         'id': e['id'],
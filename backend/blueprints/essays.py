@@ -1,20 +1,34 @@
 import json
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from functools import partial
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for, all_shards
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
+from services import tasks, usage
+from services.usage import tag_user
 from services.ai_service import chat_completion_json
+import config
 
 bp = Blueprint('essays', __name__, url_prefix='/api/v1/essays')
 
+MAX_BATCH_ESSAYS = 500
+
+# Batch grading runs here rather than in a services.tasks worker, which a
+# whole class would hold for its entire run
+_grading_pool = None
+_grading_pool_lock = threading.Lock()
+
 
 @bp.route('', methods=['POST'])
 def submit_essay():
     data = request.json
-    essay_id = gen_id()
-    db = get_db()
+    user_id = data.get('userId', '')
+    essay_id = gen_id(user_id)
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO essays (id, user_id, title, content, subject, grade, created_at) VALUES (?,?,?,?,?,?,?)',
-        (essay_id, data.get('userId',''), data.get('title',''),
+        (essay_id, user_id, data.get('title',''),
          data.get('content',''), data.get('subject',''), data.get('grade',''), now_iso())
     )
     db.commit()
@@ -25,7 +39,7 @@ def submit_essay():
 
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_essays(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute('SELECT * FROM essays WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
     db.close()
     return jsonify([_format_essay(row_to_dict(r)) for r in rows])
@@ -33,29 +47,171 @@ def get_user_essays(user_id):
 
 @bp.route('/<essay_id>/feedback', methods=['GET'])
 def get_feedback(essay_id):
-    db = get_db()
+    db = get_db_for('essays', essay_id)
     essay = row_to_dict(db.execute('SELECT * FROM essays WHERE id = ?', (essay_id,)).fetchone())
     if not essay:
         db.close()
         return error_response('Essay not found', 404)
+    tag_user(essay['user_id'])
 
     # Return cached feedback if available
     if essay['feedback']:
         db.close()
         return jsonify(parse_json_field(essay['feedback'], {}))
 
-    content = essay['content'][:3000] if essay['content'] else ''
-    feedback = chat_completion_json([
-        {'role': 'system', 'content': '你是作文批改专家。返回JSON：{"analysis":{"structureScore":80,"languageScore":85,"contentScore":75,"overallScore":80,"structureAnalysis":"结构分析","languageAnalysis":"语言分析","contentAnalysis":"内容分析"},"improvementPoints":[{"category":"分类","issue":"问题","suggestion":"建议","priority":"high|medium|low"}],"optimizedExamples":[{"originalText":"原文","optimizedText":"优化","explanation":"说明","improvementType":"类型"}],"strengths":["优点"],"areasForImprovement":["待改进"],"overallComment":"总评"}'},
-        {'role': 'user', 'content': f'请批改以下作文：\n\n标题：{essay["title"]}\n学科：{essay["subject"] or "语文"}\n年级：{essay["grade"] or "高中"}\n\n内容：\n{content}'}
-    ])
+    db.close()
+    feedback = _grade(essay)
 
+    db = get_db_for('essays', essay_id)
     db.execute('UPDATE essays SET feedback = ? WHERE id = ?', (json.dumps(feedback), essay_id))
     db.commit()
     db.close()
     return jsonify(feedback)
 
 
+@bp.route('/grade-batch', methods=['POST'])
+def grade_batch():
+    """Grade many essays in the background, e.g. a whole class.
+
+    Accepts essayIds and/or userIds (every essay of those users). Essays that
+    already have feedback are skipped unless force is set. Poll
+    /grade-batch/<jobId> for progress; each feedback is saved as it arrives.
+    """
+    data = request.json or {}
+    essay_ids = data.get('essayIds') or []
+    user_ids = data.get('userIds') or []
+    if not isinstance(essay_ids, list) or not isinstance(user_ids, list) or not (essay_ids or user_ids):
+        return error_response('essayIds or userIds must be a non-empty list')
+    # Checked before the lookups below run one query per shard with every id
+    if len(essay_ids) > MAX_BATCH_ESSAYS or len(user_ids) > MAX_BATCH_ESSAYS:
+        return error_response(f'At most {MAX_BATCH_ESSAYS} essays per batch')
+
+    rows = []
+    # A class spans users, and so possibly every shard
+    for db in all_shards():
+        if essay_ids:
+            marks = ','.join('?' * len(essay_ids))
+            rows += db.execute(f'SELECT id, user_id, feedback IS NOT NULL AS graded FROM essays WHERE id IN ({marks})', essay_ids).fetchall()
+        if user_ids:
+            marks = ','.join('?' * len(user_ids))
+            rows += db.execute(f'SELECT id, user_id, feedback IS NOT NULL AS graded FROM essays WHERE user_id IN ({marks})', user_ids).fetchall()
+        db.close()
+
+    essays = {r['id']: r for r in rows}
+    if not essays:
+        return error_response('No essays found', 404)
+    if len(essays) > MAX_BATCH_ESSAYS:
+        return error_response(f'At most {MAX_BATCH_ESSAYS} essays per batch')
+
+    pending = [eid for eid, r in essays.items() if data.get('force') or not r['graded']]
+    job_id = tasks.track('essay_grading')
+    tasks.update(job_id, skipped=len(essays) - len(pending))
+    _GradingBatch(job_id, pending).start()
+    return jsonify({'jobId': job_id, 'total': len(pending), 'skipped': len(essays) - len(pending)}), 202
+
+
+@bp.route('/grade-batch/<job_id>', methods=['GET'])
+def get_grade_batch(job_id):
+    job = tasks.get(job_id)
+    if not job or job['kind'] != 'essay_grading':
+        return error_response('Job not found', 404)
+    return jsonify(job)
+
+
+def _get_grading_pool():
+    global _grading_pool
+    if _grading_pool is None:
+        with _grading_pool_lock:
+            if _grading_pool is None:
+                _grading_pool = ThreadPoolExecutor(max_workers=config.ESSAY_GRADING_WORKERS, thread_name_prefix='grading')
+    return _grading_pool
+
+
+class _GradingBatch:
+    """One grade-batch job; each essay is a task on the shared grading pool, counted as it finishes."""
+
+    def __init__(self, job_id, essay_ids):
+        self.job_id = job_id
+        self.essay_ids = essay_ids
+        self.remaining = len(essay_ids)
+        self.graded = 0
+        self.cancelled = 0
+        self.errors = []
+        self.futures = []
+        self.stopped = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        tasks.update(self.job_id, total=len(self.essay_ids), graded=0, failed=0, cancelled=0, errors=[])
+        if not self.essay_ids:
+            tasks.finish(self.job_id)
+            return
+        pool = _get_grading_pool()
+        for essay_id in self.essay_ids:
+            future = pool.submit(_grade_and_save, essay_id)
+            self.futures.append(future)
+            if self.stopped:
+                future.cancel()
+            future.add_done_callback(partial(self._done, essay_id))
+
+    def _done(self, essay_id, future):
+        error = None
+        out_of_budget = False
+        try:
+            future.result()
+        except usage.BudgetExceeded as e:
+            error = str(e)
+            # Out of budget: the remaining essays would fail the same way
+            out_of_budget = True
+        except CancelledError:
+            pass
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        with self.lock:
+            if future.cancelled():
+                self.cancelled += 1
+            elif error:
+                self.errors.append({'essayId': essay_id, 'error': error})
+            else:
+                self.graded += 1
+            self.remaining -= 1
+            finished = self.remaining == 0
+            fields = {'graded': self.graded, 'failed': len(self.errors), 'cancelled': self.cancelled,
+                      'errors': list(self.errors)}
+        tasks.update(self.job_id, **fields)
+        tasks.advance(self.job_id)
+        if out_of_budget:
+            self.stopped = True
+            for other in list(self.futures):
+                other.cancel()
+        if finished:
+            tasks.finish(self.job_id, f'{fields["failed"]} essay(s) could not be graded' if fields['failed'] else None)
+
+
+def _grade_and_save(essay_id):
+    db = get_db_for('essays', essay_id)
+    essay = row_to_dict(db.execute('SELECT * FROM essays WHERE id = ?', (essay_id,)).fetchone())
+    db.close()
+    if not essay:
+        raise LookupError('Essay not found')
+
+    with usage.attribute(essay['user_id'], 'essays', 'grade_batch'):
+        feedback = _grade(essay)
+
+    db = get_db_for('essays', essay_id)
+    db.execute('UPDATE essays SET feedback = ? WHERE id = ?', (json.dumps(feedback), essay_id))
+    db.commit()
+    db.close()
+
+
+def _grade(essay):
+    content = essay['content'][:3000] if essay['content'] else ''
+    return chat_completion_json([
+        {'role': 'system', 'content': '你是作文批改专家。返回JSON：{"analysis":{"structureScore":80,"languageScore":85,"contentScore":75,"overallScore":80,"structureAnalysis":"结构分析","languageAnalysis":"语言分析","contentAnalysis":"内容分析"},"improvementPoints":[{"category":"分类","issue":"问题","suggestion":"建议","priority":"high|medium|low"}],"optimizedExamples":[{"originalText":"原文","optimizedText":"优化","explanation":"说明","improvementType":"类型"}],"strengths":["优点"],"areasForImprovement":["待改进"],"overallComment":"总评"}'},
+        {'role': 'user', 'content': f'请批改以下作文：\n\n标题：{essay["title"]}\n学科：{essay["subject"] or "语文"}\n年级：{essay["grade"] or "高中"}\n\n内容：\n{content}'}
+    ])
+
+
 def _format_essay(e):
     return {
         'id': e['id'],
@@ -0,0 +1,34 @@
+from flask import Blueprint, request, Response
+from utils.helpers import error_response
+from utils.compression import compress_stream
+from services import export
+
+bp = Blueprint('export', __name__, url_prefix='/api/v1/export')
+
+
+@bp.route('/user/<user_id>', methods=['GET'])
+def export_user(user_id):
+    """Stream all of a user's data as NDJSON (see services/export.py for the format).
+
+    ?after=<cursor> resumes after the last complete record a previous download
+    received; ?gzip=1 returns a .ndjson.gz file instead of plain NDJSON.
+    """
+    after = request.args.get('after') or None
+    try:
+        lines = export.export_user(user_id, after)
+    except export.CursorError as e:
+        return error_response(str(e))
+
+    body = export.blocks(lines)
+    filename = f'export-{user_id}.ndjson'
+    if request.args.get('gzip') == '1':
+        body = compress_stream(body, 'gzip')
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'application/x-ndjson'
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
@@ -1,7 +1,11 @@
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, error_response, parse_json_field
+from utils.http_cache import row_etag, version_etag, collection_etag, is_fresh, precondition_failed, not_modified, with_etag
+from services import bulk_import
+from services.sql_trace import query_budget
+from services.usage import tag_user
 from services.ai_service import chat_completion, chat_completion_json
 from datetime import datetime, timedelta
 
@@ -10,18 +14,26 @@ bp = Blueprint('notes', __name__, url_prefix='/api/v1/notes')
 # Spaced repetition intervals (in days)
 REVIEW_INTERVALS = [1, 3, 7, 14, 30, 60]
 
+IMPORT_FIELDS = [
+    bulk_import.Field('title', required=True, max_length=500),
+    bulk_import.Field('content', max_length=200000),
+    bulk_import.Field('method', default='free', max_length=20),
+    bulk_import.Field('tags', kind='list', default=[]),
+]
+
 
 @bp.route('', methods=['POST'])
 def create_note():
     data = request.json
-    note_id = gen_id()
+    user_id = data.get('userId', '')
+    note_id = gen_id(user_id)
     now = now_iso()
     next_review = (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
 
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO notes (id, user_id, title, content, method, cornell_data, feynman_result, tags, next_review_at, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)',
-        (note_id, data.get('userId', ''), data.get('title', ''),
+        (note_id, user_id, data.get('title', ''),
          data.get('content', ''), data.get('method', 'free'),
          json.dumps(data.get('cornellData', {})),
          '{}', json.dumps(data.get('tags', [])),
@@ -33,31 +45,59 @@ def create_note():
     return jsonify(_format_note(note))
 
 
+@bp.route('/import', methods=['POST'])
+def import_notes():
+    """Bulk-add notes from a JSON array or CSV (see services/bulk_import.py)."""
+    now = now_iso()
+    next_review = (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
+    return bulk_import.import_rows(request, 'notes', IMPORT_FIELDS, {
+        'cornell_data': '{}', 'feynman_result': '{}', 'next_review_at': next_review,
+        'created_at': now, 'updated_at': now,
+    })
+
+
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_notes(user_id):
-    db = get_db()
+    db = get_db(user_id)
+    etag = collection_etag(db, 'notes', user_id)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
     rows = db.execute(
         'SELECT * FROM notes WHERE user_id = ? ORDER BY updated_at DESC', (user_id,)
     ).fetchall()
     db.close()
-    return jsonify([_format_note(row_to_dict(r)) for r in rows])
+    return with_etag(jsonify([_format_note(row_to_dict(r)) for r in rows]), etag)
 
 
 @bp.route('/<note_id>', methods=['GET'])
 def get_note(note_id):
-    db = get_db()
+    db = get_db_for('notes', note_id)
+    etag = row_etag(db, 'notes', note_id)
+    if etag is None:
+        db.close()
+        return error_response('Note not found', 404)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
     row = db.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone()
     db.close()
-    if not row:
-        return error_response('Note not found', 404)
-    return jsonify(_format_note(row_to_dict(row)))
+    return with_etag(jsonify(_format_note(row_to_dict(row))), etag)
 
 
 @bp.route('/<note_id>', methods=['PUT'])
 def update_note(note_id):
     data = request.json
     now = now_iso()
-    db = get_db()
+    db = get_db_for('notes', note_id)
+    etag = row_etag(db, 'notes', note_id)
+    if etag is None:
+        db.close()
+        return error_response('Note not found', 404)
+    # If-Match guards against overwriting an edit made elsewhere since the client loaded the note
+    if precondition_failed(etag):
+        db.close()
+        return error_response('Note has been modified since it was loaded', 412)
     db.execute(
         'UPDATE notes SET title=?, content=?, method=?, cornell_data=?, tags=?, updated_at=? WHERE id=?',
         (data.get('title', ''), data.get('content', ''), data.get('method', 'free'),
@@ -67,12 +107,12 @@ def update_note(note_id):
     db.commit()
     note = row_to_dict(db.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone())
     db.close()
-    return jsonify(_format_note(note))
+    return with_etag(jsonify(_format_note(note)), version_etag('notes', note_id, note['updated_at']))
 
 
 @bp.route('/<note_id>', methods=['DELETE'])
 def delete_note(note_id):
-    db = get_db()
+    db = get_db_for('notes', note_id)
     db.execute('DELETE FROM notes WHERE id = ?', (note_id,))
     db.commit()
     db.close()
@@ -81,11 +121,12 @@ def delete_note(note_id):
 
 @bp.route('/<note_id>/cornell', methods=['POST'])
 def cornell_guide(note_id):
-    db = get_db()
+    db = get_db_for('notes', note_id)
     note = row_to_dict(db.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone())
     if not note:
         db.close()
         return error_response('Note not found', 404)
+    tag_user(note['user_id'])
 
     content = note['content'][:3000] if note['content'] else ''
     result = chat_completion_json([
@@ -102,11 +143,12 @@ def cornell_guide(note_id):
 
 @bp.route('/<note_id>/feynman-chat', methods=['POST'])
 def feynman_chat(note_id):
-    db = get_db()
+    db = get_db_for('notes', note_id)
     note = row_to_dict(db.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone())
     if not note:
         db.close()
         return error_response('Note not found', 404)
+    tag_user(note['user_id'])
     db.close()
 
     data = request.json
@@ -140,7 +182,7 @@ def feynman_chat(note_id):
 @bp.route('/user/<user_id>/review', methods=['GET'])
 def get_review_notes(user_id):
     now = datetime.utcnow().isoformat() + 'Z'
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM notes WHERE user_id = ? AND next_review_at <= ? ORDER BY next_review_at ASC',
         (user_id, now)
@@ -150,8 +192,9 @@ def get_review_notes(user_id):
 
 
 @bp.route('/<note_id>/review-done', methods=['POST'])
+@query_budget(3)
 def mark_reviewed(note_id):
-    db = get_db()
+    db = get_db_for('notes', note_id)
     note = row_to_dict(db.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone())
     if not note:
         db.close()
@@ -1,10 +1,14 @@
 import os
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
-from utils.file_parser import extract_text_from_file
+from utils.file_parser import extract_text_from_file, save_upload
+from utils.http_cache import collection_etag, is_fresh, not_modified, with_etag
+from services.usage import tag_user
+from services import extraction_cache, tasks, upload_sessions
 from services.ai_service import chat_completion, chat_completion_json, translate_long_text
+from utils.chunker import head
 import config
 
 bp = Blueprint('papers', __name__, url_prefix='/api/v1/papers')
@@ -21,31 +25,127 @@ def upload_paper():
         return error_response('Only PDF files are supported')
 
     file_path = os.path.join(config.UPLOAD_FOLDER, gen_id() + ext)
-    file.save(file_path)
+    digest, _ = save_upload(file.stream, file_path)
+    # Clients may pass their own uploadId and poll /upload/<uploadId>/progress meanwhile
+    return _ingest_upload(file_path, digest, ext, file.filename, request.form.get('uploadId') or None)
 
+
+@bp.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json or {}
+    filename = data.get('filename', '')
+    if os.path.splitext(filename)[1].lower() != '.pdf':
+        return error_response('Only PDF files are supported')
     try:
-        content = extract_text_from_file(file_path)
+        session = upload_sessions.create('paper', filename, data.get('size'), data.get('sha256'))
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return jsonify(upload_sessions.format_session(session)), 201
+
+
+@bp.route('/upload/sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    session = upload_sessions.get(upload_id, 'paper')
+    if not session:
+        return error_response('Upload session not found', 404)
+    return jsonify(upload_sessions.format_session(session))
+
+
+@bp.route('/upload/sessions/<upload_id>/chunks', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    session = upload_sessions.get(upload_id, 'paper')
+    if not session:
+        return error_response('Upload session not found', 404)
+    try:
+        session = upload_sessions.write_chunk(
+            session, request.args.get('offset', 0, type=int), request.content_length,
+            request.stream, request.headers.get('X-Chunk-Sha256')
+        )
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return jsonify(upload_sessions.format_session(session))
+
+
+@bp.route('/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    session = upload_sessions.get(upload_id, 'paper')
+    if not session:
+        return error_response('Upload session not found', 404)
+    try:
+        # The session is removed once the upload is ingested and reopened if that fails
+        with upload_sessions.completing(session) as (file_path, digest):
+            try:
+                # Parsing progress is reported under the session id
+                content = _extract(file_path, digest, '.pdf', upload_id)
+            except Exception as e:
+                raise upload_sessions.UploadError(f'Failed to parse PDF: {str(e)}') from e
+            response = _paper_fields(content, session['filename'])
+    except upload_sessions.UploadError as e:
+        return error_response(e.message, e.status_code)
+    return response
+
+
+@bp.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+def delete_upload_session(upload_id):
+    if not upload_sessions.get(upload_id, 'paper'):
+        return error_response('Upload session not found', 404)
+    upload_sessions.discard(upload_id)
+    return jsonify({'success': True})
+
+
+def _ingest_upload(file_path, digest, ext, filename, upload_id=None):
+    """Parse a saved upload (deleting it afterwards) into title/abstract/content."""
+    try:
+        content = _extract(file_path, digest, ext, upload_id)
     except Exception as e:
         return error_response(f'Failed to parse PDF: {str(e)}')
     finally:
         if os.path.exists(file_path):
             os.remove(file_path)
+    return _paper_fields(content, filename)
+
+
+def _extract(file_path, digest, ext, upload_id):
+    # The extension is part of the key: the same bytes parse differently as .txt and .pdf
+    content_hash = digest + ext
+    job_id = tasks.track('paper_upload', upload_id)
+    try:
+        content = extraction_cache.lookup(content_hash)
+        if content is None:
+            content = extract_text_from_file(file_path, progress=lambda done, total: tasks.update(job_id, done=done, total=total))
+            extraction_cache.store(content_hash, content)
+    except Exception as e:
+        tasks.finish(job_id, str(e))
+        raise
+    tasks.finish(job_id)
+    return content
+
 
-    title = file.filename.rsplit('.', 1)[0]
+def _paper_fields(content, filename):
+    title = filename.rsplit('.', 1)[0]
     abstract = content[:500] if content else ''
     return jsonify({'title': title, 'abstract': abstract, 'content': content})
 
 
+@bp.route('/upload/<upload_id>/progress', methods=['GET'])
+def get_upload_progress(upload_id):
+    job = tasks.get(upload_id)
+    if not job:
+        return error_response('Upload not found', 404)
+    return jsonify(job)
+
+
 @bp.route('', methods=['POST'])
 def create_paper():
     data = request.json
-    paper_id = gen_id()
+    user_id = data.get('userId', '')
+    paper_id = gen_id(user_id)
     now = now_iso()
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO papers (id, title, authors, abstract, content, user_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
         (paper_id, data.get('title'), json.dumps(data.get('authors', [])),
-         data.get('abstract', ''), data.get('content', ''), data.get('userId', ''), now, now)
+         data.get('abstract', ''), data.get('content', ''), user_id, now, now)
     )
     db.commit()
     paper = row_to_dict(db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone())
@@ -56,24 +156,29 @@ def create_paper():
 @bp.route('', methods=['GET'])
 def get_papers():
     user_id = request.args.get('userId', '')
-    db = get_db()
+    db = get_db(user_id)
+    etag = collection_etag(db, 'papers', user_id)
+    if is_fresh(etag):
+        db.close()
+        return not_modified(etag)
     rows = db.execute('SELECT * FROM papers WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
     db.close()
-    return jsonify([_format_paper(row_to_dict(r)) for r in rows])
+    return with_etag(jsonify([_format_paper(row_to_dict(r)) for r in rows]), etag)
 
 
 @bp.route('/<paper_id>/translate', methods=['POST'])
 def translate_paper(paper_id):
-    db = get_db()
+    db = get_db_for('papers', paper_id)
     paper = row_to_dict(db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone())
     if not paper:
         db.close()
         return error_response('Paper not found', 404)
+    tag_user(paper['user_id'])
 
     content = paper['content'] or ''
     translated = translate_long_text(content)
 
-    db.execute('UPDATE papers SET translated_content = ? WHERE id = ?', (translated, paper_id))
+    db.execute('UPDATE papers SET translated_content = ?, updated_at = ? WHERE id = ?', (translated, now_iso(), paper_id))
     db.commit()
     db.close()
     return jsonify({'translatedContent': translated})
@@ -85,13 +190,14 @@ def paper_question(paper_id):
     question = data.get('question', '')
     context = data.get('context', '')
 
-    db = get_db()
+    db = get_db_for('papers', paper_id)
     paper = row_to_dict(db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone())
     db.close()
     if not paper:
         return error_response('Paper not found', 404)
+    tag_user(paper['user_id'])
 
-    content = paper['content'][:3000] if paper['content'] else ''
+    content = head(paper['content'], config.EXCERPT_TOKENS)
 
     if context:
         prompt = (
@@ -100,7 +206,7 @@ def paper_question(paper_id):
             f'用户针对这段选中文本提出了问题：{question}\n\n'
             f'请围绕选中的文本片段来回答，解释其含义、作用或相关背景。'
             f'可以结合论文上下文辅助说明，但不要偏离选中内容去概括全文。\n\n'
-            f'论文上下文（仅供参考）：\n{content[:1500]}'
+            f'论文上下文（仅供参考）：\n{head(content, config.EXCERPT_TOKENS // 2)}'
         )
     else:
         prompt = (
@@ -121,11 +227,12 @@ def identify_terms(paper_id):
     data = request.json or {}
     text = data.get('text', '')
 
-    db = get_db()
+    db = get_db_for('papers', paper_id)
     paper = row_to_dict(db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone())
     db.close()
     if not paper:
         return error_response('Paper not found', 404)
+    tag_user(paper['user_id'])
 
     result = chat_completion_json([
         {'role': 'system', 'content': '你是学术术语注释专家。返回JSON格式：{"annotations": [{"term": "术语", "explanation": "解释", "context": "上下文"}]}'},
@@ -136,13 +243,14 @@ def identify_terms(paper_id):
 
 @bp.route('/<paper_id>/summary', methods=['POST'])
 def paper_summary(paper_id):
-    db = get_db()
+    db = get_db_for('papers', paper_id)
     paper = row_to_dict(db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone())
     db.close()
     if not paper:
         return error_response('Paper not found', 404)
+    tag_user(paper['user_id'])
 
-    content = paper['content'][:3000] if paper['content'] else ''
+    content = head(paper['content'], config.EXCERPT_TOKENS)
     result = chat_completion_json([
         {'role': 'system', 'content': '你是学术论文摘要专家。返回JSON格式：{"overview":"总览","keyFindings":["发现1"],"methodology":"方法论","conclusions":"结论","significance":"意义"}'},
         {'role': 'user', 'content': f'请为以下论文生成结构化摘要：\n\n标题：{paper["title"]}\n\n内容：\n{content}'}
@@ -1,10 +1,17 @@
 import json
-from flask import Blueprint, request, jsonify
+import queue
+import threading
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from database import get_db
-from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, error_response
+from utils.helpers import row_to_dict, rows_to_list, error_response
+from services import pomodoro_sessions
+import config
 
 bp = Blueprint('pomodoro', __name__, url_prefix='/api/pomodoro')
 
+_streams = threading.BoundedSemaphore(config.POMODORO_MAX_STREAMS)
+
 
 @bp.route('/start', methods=['POST'])
 def start_session():
@@ -16,50 +23,68 @@ def start_session():
     if not user_id:
         return error_response('userId is required')
 
-    session_id = gen_id()
-    start_time = now_iso()
-
-    db = get_db()
-    db.execute(
-        'INSERT INTO pomodoro_sessions (id, user_id, task, duration, start_time) VALUES (?, ?, ?, ?, ?)',
-        (session_id, user_id, task, duration, start_time)
-    )
-    db.commit()
-
-    session = row_to_dict(db.execute('SELECT * FROM pomodoro_sessions WHERE id = ?', (session_id,)).fetchone())
-    db.close()
+    session = pomodoro_sessions.start(user_id, task, duration)
     return jsonify(_format_session(session))
 
 
 @bp.route('/user/<user_id>/active', methods=['GET'])
 def get_active_session(user_id):
-    db = get_db()
-    session = db.execute(
-        'SELECT * FROM pomodoro_sessions WHERE user_id = ? AND completed = 0 ORDER BY created_at DESC LIMIT 1',
-        (user_id,)
-    ).fetchone()
-    db.close()
+    session = pomodoro_sessions.active(user_id)
     if not session:
         return jsonify(None)
-    return jsonify(_format_session(row_to_dict(session)))
+    return jsonify(_format_session(session))
 
 
 @bp.route('/<session_id>/complete', methods=['POST'])
 def complete_session(session_id):
-    end_time = now_iso()
-    db = get_db()
-    db.execute(
-        'UPDATE pomodoro_sessions SET completed = 1, end_time = ? WHERE id = ?',
-        (end_time, session_id)
-    )
-    db.commit()
-    db.close()
+    pomodoro_sessions.complete(session_id)
     return jsonify({'message': 'ok'})
 
 
+@bp.route('/user/<user_id>/events', methods=['GET'])
+def session_events(user_id):
+    """Server-sent events for one user's pomodoro state.
+
+    Sends a snapshot on connect, then start/complete/expire as they happen and
+    a tick with the remaining seconds every POMODORO_TICK_SECONDS while a
+    session runs. The stream ends after POMODORO_STREAM_SECONDS so it does
+    not pin a worker thread forever; EventSource reconnects by itself.
+    At most POMODORO_MAX_STREAMS streams are open per worker, so they cannot
+    take every thread from the other endpoints; past that the answer is 503.
+    """
+    if not _streams.acquire(blocking=False):
+        response, status = error_response('Too many open event streams', 503)
+        response.headers['Retry-After'] = str(int(config.POMODORO_TICK_SECONDS * 6))
+        return response, status
+    subscription = pomodoro_sessions.subscribe(user_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            yield _sse('snapshot', pomodoro_sessions.active(user_id))
+            deadline = time.monotonic() + config.POMODORO_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event, session = subscription.get(timeout=config.POMODORO_TICK_SECONDS)
+                except queue.Empty:
+                    session = pomodoro_sessions.active(user_id)
+                    # Idle users only get a comment line, which keeps proxies from closing the stream
+                    yield _sse('tick', session) if session else ': keep-alive\n\n'
+                    continue
+                yield _sse(event, session)
+        finally:
+            pomodoro_sessions.unsubscribe(user_id, subscription)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the body was never read
+    response.call_on_close(_streams.release)
+    return response
+
+
 @bp.route('/user/<user_id>/stats', methods=['GET'])
 def get_stats(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM pomodoro_sessions WHERE user_id = ? AND completed = 1',
         (user_id,)
@@ -91,7 +116,7 @@ def get_stats(user_id):
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_sessions(user_id):
     limit = request.args.get('limit', 20, type=int)
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM pomodoro_sessions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?',
         (user_id, limit)
@@ -100,6 +125,15 @@ def get_sessions(user_id):
     return jsonify([_format_session(row_to_dict(r)) for r in rows])
 
 
+def _sse(event, session):
+    data = None
+    if session:
+        data = _format_session(session)
+        if session['completed'] == pomodoro_sessions.STATUS_ACTIVE:
+            data['remainingSeconds'] = pomodoro_sessions.remaining_seconds(session)
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
 def _format_session(s):
     return {
         'id': s['id'],
@@ -107,7 +141,8 @@ def _format_session(s):
         'startTime': s['start_time'],
         'endTime': s['end_time'],
         'duration': s['duration'],
-        'completed': bool(s['completed']),
+        'completed': s['completed'] == pomodoro_sessions.STATUS_COMPLETED,
+        'expired': s['completed'] == pomodoro_sessions.STATUS_EXPIRED,
         'task': s['task'],
         'createdAt': s['created_at'],
     }
@@ -1,8 +1,13 @@
 import json
-from flask import Blueprint, request, jsonify
-from database import get_db
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify, copy_current_request_context
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, parse_json_field, error_response
+from services.sql_trace import query_budget
+from services.usage import tag_user
 from services.ai_service import chat_completion, chat_completion_json
+from utils.chunker import estimate_tokens
+import config
 
 bp = Blueprint('problems', __name__, url_prefix='/api/v1/problems')
 
@@ -16,10 +21,111 @@ def analyze_problem():
     result = chat_completion_json([
         {'role': 'system', 'content': '你是题目分析专家。返回JSON：{"problemType":"题目类型","difficulty":"easy|medium|hard","requiredConcepts":["概念"],"estimatedTime":15,"solutionApproach":["步骤"]}'},
         {'role': 'user', 'content': f'学科：{subject}\n题目：{question}'}
-    ])
+    ], cache_ttl=config.LLM_CACHE_TTL)
     return jsonify(result)
 
 
+MAX_BATCH_QUESTIONS = 200
+# Prompt tokens per packed call; the JSON answer is roughly 80 tokens per question
+DEFAULT_PACK_TOKENS = 1500
+MAX_PACK_TOKENS = 8000
+MAX_QUESTIONS_PER_PACK = 10
+
+
+@bp.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    data = request.json or {}
+    default_subject = data.get('subject', '')
+    items = data.get('questions', [])
+    pack_tokens = data.get('maxTokensPerPack', DEFAULT_PACK_TOKENS)
+
+    if not isinstance(items, list) or not items:
+        return error_response('questions must be a non-empty list')
+    if len(items) > MAX_BATCH_QUESTIONS:
+        return error_response(f'At most {MAX_BATCH_QUESTIONS} questions per batch')
+    # bool is an int subclass; True is not a token count
+    if not isinstance(pack_tokens, int) or isinstance(pack_tokens, bool) or not 1 <= pack_tokens <= MAX_PACK_TOKENS:
+        return error_response(f'maxTokensPerPack must be an integer between 1 and {MAX_PACK_TOKENS}')
+
+    # Deduplicate identical (subject, question) pairs; each unique one is analyzed once
+    unique = {}
+    order = []
+    for item in items:
+        if isinstance(item, dict):
+            question = str(item.get('question', ''))
+            subject = str(item.get('subject') or default_subject)
+        else:
+            question, subject = str(item), default_subject
+        key = (subject.strip(), ' '.join(question.split()))
+        order.append(key)
+        if key[1] and key not in unique:
+            unique[key] = None
+
+    packs = _pack_questions(list(unique), pack_tokens)
+
+    with ThreadPoolExecutor(max_workers=min(config.LLM_BATCH_CONCURRENCY, len(packs) or 1)) as pool:
+        # Each worker gets its own copy of the request context so usage is attributed to the caller
+        futures = [(pack, pool.submit(copy_current_request_context(_analyze_pack), pack)) for pack in packs]
+        for pack, future in futures:
+            unique.update(zip(pack, future.result()))
+
+    results = []
+    for i, key in enumerate(order):
+        outcome = unique.get(key) if key[1] else {'error': 'Empty question'}
+        entry = {'index': i, 'question': key[1], 'subject': key[0]}
+        if 'error' in outcome:
+            entry.update({'ok': False, 'error': outcome['error']})
+        else:
+            entry.update({'ok': True, 'analysis': outcome['analysis']})
+        results.append(entry)
+
+    return jsonify({
+        'results': results,
+        'stats': {'questions': len(items), 'unique': len(unique), 'llmCalls': len(packs)},
+    })
+
+
+def _pack_questions(keys, max_tokens):
+    packs = []
+    current = []
+    current_tokens = 0
+    for key in keys:
+        tokens = estimate_tokens(key[0]) + estimate_tokens(key[1]) + 8
+        if current and (current_tokens + tokens > max_tokens or len(current) >= MAX_QUESTIONS_PER_PACK):
+            packs.append(current)
+            current = []
+            current_tokens = 0
+        current.append(key)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _analyze_pack(pack):
+    listing = '\n'.join(f'{i + 1}. 学科：{subject or "未指定"}\n   题目：{question}' for i, (subject, question) in enumerate(pack))
+    try:
+        result = chat_completion_json([
+            {'role': 'system', 'content': '你是题目分析专家。逐题分析，返回JSON：{"results":[{"index":1,"problemType":"题目类型","difficulty":"easy|medium|hard","requiredConcepts":["概念"],"estimatedTime":15,"solutionApproach":["步骤"]}]}，index 与题目编号对应，每道题都必须有结果。'},
+            {'role': 'user', 'content': f'请分析以下{len(pack)}道题目：\n{listing}'}
+        ])
+    except Exception as e:
+        return [{'error': f'Analysis failed: {type(e).__name__}'}] * len(pack)
+
+    entries = result.get('results', []) if isinstance(result, dict) else result
+    by_index = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict) and isinstance(entry.get('index'), int):
+            by_index[entry.pop('index')] = entry
+    if len(pack) == 1 and not by_index and isinstance(result, dict) and 'problemType' in result:
+        by_index[1] = result
+
+    return [
+        {'analysis': by_index[i + 1]} if i + 1 in by_index else {'error': 'Missing from model output'}
+        for i in range(len(pack))
+    ]
+
+
 @bp.route('/start-session', methods=['POST'])
 def start_session():
     data = request.json
@@ -32,8 +138,8 @@ def start_session():
         {'role': 'user', 'content': f'学科：{subject}\n题目：{question}'}
     ])
 
-    session_id = gen_id()
-    db = get_db()
+    session_id = gen_id(user_id)
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO problem_sessions (id, user_id, question, subject, analysis, created_at) VALUES (?,?,?,?,?,?)',
         (session_id, user_id, question, subject, json.dumps(analysis), now_iso())
@@ -56,11 +162,12 @@ def process_step():
     session_id = data.get('sessionId', '')
     user_input = data.get('userInput', '')
 
-    db = get_db()
+    db = get_db_for('problem_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM problem_sessions WHERE id = ?', (session_id,)).fetchone())
     if not session:
         db.close()
         return error_response('Session not found', 404)
+    tag_user(session['user_id'])
 
     progress = parse_json_field(session['user_progress'], [])
     step = session['current_step'] + 1
@@ -88,11 +195,12 @@ def get_hint():
     data = request.json
     session_id = data.get('sessionId', '')
 
-    db = get_db()
+    db = get_db_for('problem_sessions', session_id)
     session = row_to_dict(db.execute('SELECT * FROM problem_sessions WHERE id = ?', (session_id,)).fetchone())
     db.close()
     if not session:
         return error_response('Session not found', 404)
+    tag_user(session['user_id'])
 
     result = chat_completion_json([
         {'role': 'system', 'content': '你是解题提示专家。返回JSON：{"stepNumber":1,"hintLevel":"gentle|moderate|strong","content":"提示内容","revealsSolution":false}'},
@@ -106,7 +214,7 @@ def complete_session():
     data = request.json
     session_id = data.get('sessionId', '')
 
-    db = get_db()
+    db = get_db_for('problem_sessions', session_id)
     db.execute(
         'UPDATE problem_sessions SET completed = 1 WHERE id = ?',
         (session_id,)
@@ -118,7 +226,7 @@ def complete_session():
 
 @bp.route('/active-session/<user_id>', methods=['GET'])
 def get_active_session(user_id):
-    db = get_db()
+    db = get_db(user_id)
     row = db.execute(
         'SELECT * FROM problem_sessions WHERE user_id = ? AND completed = 0 ORDER BY created_at DESC LIMIT 1',
         (user_id,)
@@ -137,8 +245,9 @@ def get_active_session(user_id):
 
 
 @bp.route('/history/<user_id>', methods=['GET'])
+@query_budget(1)
 def get_history(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT * FROM problem_sessions WHERE user_id = ? ORDER BY created_at DESC',
         (user_id,)
@@ -184,11 +293,12 @@ def generate_similar():
     problem_id = data.get('problemId', '')
     count = data.get('count', 3)
 
-    db = get_db()
+    db = get_db_for('problem_sessions', problem_id)
     session = row_to_dict(db.execute('SELECT * FROM problem_sessions WHERE id = ?', (problem_id,)).fetchone())
     db.close()
     if not session:
         return error_response('Problem not found', 404)
+    tag_user(session['user_id'])
 
     result = chat_completion_json([
         {'role': 'system', 'content': f'你是出题专家。返回JSON数组，包含{count}道类似题目：[{{"question":"题目","subject":"学科","difficulty":"easy|medium|hard","problemType":"类型"}}]'},
@@ -1,16 +1,25 @@
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, rows_to_list, error_response
+from services import bulk_import
 from services.ai_service import chat_completion, chat_completion_json
 
 bp = Blueprint('quotes', __name__, url_prefix='/api/v1/quotes')
 
+IMPORT_FIELDS = [
+    bulk_import.Field('content', required=True, max_length=2000),
+    bulk_import.Field('theme', max_length=100),
+    bulk_import.Field('language', default='zh', max_length=20),
+    bulk_import.Field('author', max_length=200),
+    bulk_import.Field('category', max_length=100),
+]
+
 
 @bp.route('/user/<user_id>/today', methods=['GET'])
 def get_today_quote(user_id):
     today = now_iso()[:10]
-    db = get_db()
+    db = get_db(user_id)
     row = db.execute(
         'SELECT * FROM quotes WHERE user_id = ? AND daily_date = ? AND is_daily = 1',
         (user_id, today)
@@ -33,9 +42,9 @@ def generate_daily():
         {'role': 'user', 'content': f'请生成一条{theme}主题的每日金句，语言：{language}'}
     ])
 
-    quote_id = gen_id()
+    quote_id = gen_id(user_id)
     today = now_iso()[:10]
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO quotes (id, content, theme, language, author, category, user_id, is_daily, daily_date, created_at) VALUES (?,?,?,?,?,?,?,1,?,?)',
         (quote_id, result.get('content',''), theme, language,
@@ -63,8 +72,8 @@ def generate_custom():
         {'role': 'user', 'content': f'请生成一条{theme}主题、{style_cn}风格的金句，语言：{language}'}
     ])
 
-    quote_id = gen_id()
-    db = get_db()
+    quote_id = gen_id(user_id)
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO quotes (id, content, theme, language, author, category, user_id, created_at) VALUES (?,?,?,?,?,?,?,?)',
         (quote_id, result.get('content',''), theme, language,
@@ -78,7 +87,7 @@ def generate_custom():
 
 @bp.route('/user/<user_id>', methods=['GET'])
 def get_user_quotes(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute('SELECT * FROM quotes WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
     db.close()
     return jsonify([_format_quote(row_to_dict(r)) for r in rows])
@@ -86,7 +95,7 @@ def get_user_quotes(user_id):
 
 @bp.route('/user/<user_id>/categories', methods=['GET'])
 def get_categories(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute(
         'SELECT DISTINCT category FROM quotes WHERE user_id = ? AND category IS NOT NULL AND category != ""',
         (user_id,)
@@ -97,7 +106,7 @@ def get_categories(user_id):
 
 @bp.route('/user/<user_id>/statistics', methods=['GET'])
 def get_statistics(user_id):
-    db = get_db()
+    db = get_db(user_id)
     rows = db.execute('SELECT * FROM quotes WHERE user_id = ?', (user_id,)).fetchall()
     db.close()
     quotes = rows_to_list(rows)
@@ -117,7 +126,7 @@ def get_statistics(user_id):
 
 @bp.route('/user/<user_id>/random', methods=['GET'])
 def get_random(user_id):
-    db = get_db()
+    db = get_db(user_id)
     row = db.execute(
         'SELECT * FROM quotes WHERE user_id = ? ORDER BY RANDOM() LIMIT 1',
         (user_id,)
@@ -128,9 +137,15 @@ def get_random(user_id):
     return jsonify(_format_quote(row_to_dict(row)))
 
 
+@bp.route('/import', methods=['POST'])
+def import_quotes():
+    """Bulk-add quotes from a JSON array or CSV (see services/bulk_import.py)."""
+    return bulk_import.import_rows(request, 'quotes', IMPORT_FIELDS, {'created_at': now_iso()})
+
+
 @bp.route('/<quote_id>', methods=['DELETE'])
 def delete_quote(quote_id):
-    db = get_db()
+    db = get_db_for('quotes', quote_id)
     db.execute('DELETE FROM quotes WHERE id = ?', (quote_id,))
     db.commit()
     db.close()
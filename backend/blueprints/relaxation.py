@@ -1,8 +1,9 @@
 import json
 from flask import Blueprint, request, jsonify
-from database import get_db
+from database import get_db, get_db_for
 from utils.helpers import gen_id, now_iso, row_to_dict, parse_json_field, error_response
 from services.ai_service import chat_completion, chat_completion_json
+import config
 
 bp = Blueprint('relaxation', __name__, url_prefix='/api/v1/relaxation-chat')
 
@@ -11,9 +12,9 @@ bp = Blueprint('relaxation', __name__, url_prefix='/api/v1/relaxation-chat')
 def create_session():
     data = request.json
     user_id = data.get('userId', '')
-    session_id = gen_id()
+    session_id = gen_id(user_id)
 
-    db = get_db()
+    db = get_db(user_id)
     db.execute(
         'INSERT INTO relaxation_sessions (id, user_id, created_at) VALUES (?, ?, ?)',
         (session_id, user_id, now_iso())
@@ -30,7 +31,7 @@ def send_message():
     session_id = data.get('sessionId', '')
     content = data.get('content', '')
 
-    db = get_db()
+    db = get_db_for('relaxation_sessions', session_id)
     session = row_to_dict(db.execute(
         'SELECT * FROM relaxation_sessions WHERE id = ?', (session_id,)
     ).fetchone())
@@ -78,5 +79,5 @@ def get_suggestions(stress_level):
     result = chat_completion_json([
         {'role': 'system', 'content': '你是放松建议专家。返回JSON：{"suggestions":["建议1","建议2","建议3"]}'},
         {'role': 'user', 'content': f'用户压力等级为{stress_level}(1-10)，请给出3-5条放松建议。'}
-    ])
+    ], cache_ttl=config.LLM_CACHE_TTL)
     return jsonify(result)
@@ -0,0 +1,151 @@
+import hmac
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+import config
+from database import get_db, all_shards
+from utils.helpers import now_iso, error_response, rows_to_list
+from services import usage
+
+bp = Blueprint('usage', __name__, url_prefix='/api/v1/usage')
+
+
+@bp.route('/user/<user_id>', methods=['GET'])
+def get_user_usage(user_id):
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return error_response('granularity must be hour or day')
+    since = _since(request.args.get('days', 7, type=int), granularity)
+
+    db = get_db(user_id)
+    rows = db.execute(
+        'SELECT bucket, blueprint, feature, model, calls, prompt_tokens, completion_tokens FROM llm_usage_buckets '
+        'WHERE user_id = ? AND granularity = ? AND bucket >= ? ORDER BY bucket DESC',
+        (user_id, granularity, since)
+    ).fetchall()
+    limit = usage.daily_limit(db, user_id)
+    used = usage.tokens_today(db, user_id)
+    db.close()
+
+    by_feature = {}
+    for r in rows:
+        key = f"{r['blueprint']}.{r['feature']}"
+        by_feature[key] = by_feature.get(key, 0) + r['prompt_tokens'] + r['completion_tokens']
+
+    return jsonify({
+        'userId': user_id,
+        'dailyLimit': limit,
+        'usedToday': used,
+        'byFeature': by_feature,
+        'buckets': [_format_bucket(r) for r in rows],
+    })
+
+
+@bp.route('/summary', methods=['GET'])
+def get_summary():
+    since = _since(request.args.get('days', 7, type=int), 'day')
+    top = request.args.get('top', 10, type=int)
+
+    # Usage rows live on their user's shard; merge the per-shard totals
+    features, users = {}, []
+    for db in all_shards():
+        for r in db.execute(
+            "SELECT blueprint, feature, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens FROM llm_usage_buckets "
+            "WHERE granularity = 'day' AND bucket >= ? GROUP BY blueprint, feature",
+            (since,)
+        ):
+            total = features.setdefault((r['blueprint'], r['feature']), {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            for key in total:
+                total[key] += r[key]
+        users += rows_to_list(db.execute(
+            "SELECT user_id, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens FROM llm_usage_buckets "
+            "WHERE granularity = 'day' AND bucket >= ? GROUP BY user_id "
+            "ORDER BY SUM(prompt_tokens + completion_tokens) DESC LIMIT ?",
+            (since, top)
+        ))
+        db.close()
+    features = sorted(({'blueprint': bp_name, 'feature': feature, **total} for (bp_name, feature), total in features.items()),
+                      key=lambda r: r['prompt_tokens'] + r['completion_tokens'], reverse=True)
+    users = sorted(users, key=lambda r: r['prompt_tokens'] + r['completion_tokens'], reverse=True)[:top]
+
+    return jsonify({
+        'since': since,
+        'byFeature': [{
+            'blueprint': r['blueprint'], 'feature': r['feature'], 'calls': r['calls'],
+            'promptTokens': r['prompt_tokens'], 'completionTokens': r['completion_tokens'],
+        } for r in features],
+        'topUsers': [{
+            'userId': r['user_id'], 'calls': r['calls'],
+            'promptTokens': r['prompt_tokens'], 'completionTokens': r['completion_tokens'],
+        } for r in users],
+    })
+
+
+@bp.route('/budgets/<user_id>', methods=['GET'])
+def get_budget(user_id):
+    db = get_db(user_id)
+    limit = usage.daily_limit(db, user_id)
+    used = usage.tokens_today(db, user_id)
+    db.close()
+    return jsonify({'userId': user_id, 'dailyTokens': limit, 'usedToday': used})
+
+
+@bp.route('/budgets/<user_id>', methods=['PUT'])
+def set_budget(user_id):
+    if not _is_budget_admin():
+        return error_response('Forbidden', 403)
+    data = request.json or {}
+    daily_tokens = data.get('dailyTokens')
+    if not isinstance(daily_tokens, int) or isinstance(daily_tokens, bool) or daily_tokens < 0:
+        return error_response('dailyTokens must be a non-negative integer')
+
+    db = get_db(user_id)
+    db.execute(
+        'INSERT INTO llm_budgets (user_id, daily_tokens, updated_at) VALUES (?,?,?) '
+        'ON CONFLICT (user_id) DO UPDATE SET daily_tokens = excluded.daily_tokens, updated_at = excluded.updated_at',
+        (user_id, daily_tokens, now_iso())
+    )
+    db.commit()
+    db.close()
+    usage.forget_limit(user_id)
+    return jsonify({'userId': user_id, 'dailyTokens': daily_tokens})
+
+
+@bp.route('/budgets/<user_id>', methods=['DELETE'])
+def reset_budget(user_id):
+    if not _is_budget_admin():
+        return error_response('Forbidden', 403)
+    db = get_db(user_id)
+    db.execute('DELETE FROM llm_budgets WHERE user_id = ?', (user_id,))
+    db.commit()
+    db.close()
+    usage.forget_limit(user_id)
+    return jsonify({'message': 'ok'})
+
+
+def _is_budget_admin():
+    # Users must not be able to lift their own cap
+    if not config.BUDGET_ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    return hmac.compare_digest(supplied, f'Bearer {config.BUDGET_ADMIN_TOKEN}'.encode('utf-8'))
+
+
+def _since(days, granularity):
+    start = datetime.utcnow() - timedelta(days=max(days, 1) - 1)
+    if granularity == 'hour':
+        return start.strftime('%Y-%m-%dT00')
+    return start.strftime('%Y-%m-%d')
+
+
+def _format_bucket(r):
+    return {
+        'bucket': r['bucket'],
+        'blueprint': r['blueprint'],
+        'feature': r['feature'],
+        'model': r['model'],
+        'calls': r['calls'],
+        'promptTokens': r['prompt_tokens'],
+        'completionTokens': r['completion_tokens'],
+    }
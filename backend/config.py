@@ -2,12 +2,137 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DATABASE_PATH = os.path.join(BASE_DIR, 'learning.db')
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(BASE_DIR, 'learning.db'))
+# Number of SQLite files user data is spread over (see database.py); change it
+# only together with tools/reshard.py
+DB_SHARDS = int(os.environ.get('DB_SHARDS', '1'))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 
-DASHSCOPE_API_KEY = 'sk-f3821fb0d9714882bd14a52f220b4400'
-DASHSCOPE_BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY', 'sk-f3821fb0d9714882bd14a52f220b4400')
+# Point at tools/fake_llm_server.py (e.g. http://127.0.0.1:8001/v1) for local benchmarking
+DASHSCOPE_BASE_URL = os.environ.get('DASHSCOPE_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
 TEXT_MODEL = 'qwen2.5-7b-instruct-1m'
 VISION_MODEL = 'qwen2.5-vl-32b-instruct'
+VISION_FALLBACK_MODEL = os.environ.get('VISION_FALLBACK_MODEL', 'qwen2.5-vl-7b-instruct')
+
+# Per-user daily LLM token budget (0 = unlimited); over budget calls fall back
+# to the cheaper model, and over BUDGET_HARD_LIMIT_RATIO x budget they are refused
+DAILY_TOKEN_BUDGET = int(os.environ.get('DAILY_TOKEN_BUDGET', '0'))
+BUDGET_FALLBACK_MODEL = os.environ.get('BUDGET_FALLBACK_MODEL', 'qwen2.5-3b-instruct')
+BUDGET_HARD_LIMIT_RATIO = float(os.environ.get('BUDGET_HARD_LIMIT_RATIO', '2'))
+# Changing a user's budget (PUT/DELETE /api/v1/usage/budgets/<user_id>) wants
+# `Authorization: Bearer <BUDGET_ADMIN_TOKEN>`; unset, budgets cannot be changed
+BUDGET_ADMIN_TOKEN = os.environ.get('BUDGET_ADMIN_TOKEN', '')
+
+# Concurrent LLM calls allowed for a single batch request
+LLM_BATCH_CONCURRENCY = int(os.environ.get('LLM_BATCH_CONCURRENCY', '4'))
+# Threads grading essays for /essays/grade-batch, shared by all batches (so also
+# the cap on their concurrent LLM calls); kept apart from BACKGROUND_WORKERS
+ESSAY_GRADING_WORKERS = int(os.environ.get('ESSAY_GRADING_WORKERS', '4'))
+
+# Estimated tokens (utils/chunker.py) per translation chunk, and in the excerpt
+# of a book or paper that summary, guide and Q&A prompts include
+TRANSLATE_CHUNK_TOKENS = int(os.environ.get('TRANSLATE_CHUNK_TOKENS', '1200'))
+EXCERPT_TOKENS = int(os.environ.get('EXCERPT_TOKENS', '2000'))
+
+# Threads for background jobs (book enrichment etc.)
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', '2'))
+# Precompute chapters, summary, SQ3R guide and author intro when a book is added
+BOOK_ENRICHMENT_ENABLED = os.environ.get('BOOK_ENRICHMENT_ENABLED', '1') == '1'
+
+# PDF extraction runs in a process pool, where PDF_PAGE_TIMEOUT can be enforced;
+# pages are fanned out in batches once a document has at least
+# PDF_PARALLEL_MIN_PAGES pages, shorter documents are one job
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_BATCH_PAGES = int(os.environ.get('PDF_BATCH_PAGES', '16'))
+PDF_PAGE_TIMEOUT = float(os.environ.get('PDF_PAGE_TIMEOUT', '20'))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '32'))
+# Unreferenced cached extractions are dropped after this many idle days
+EXTRACTION_CACHE_TTL_DAYS = int(os.environ.get('EXTRACTION_CACHE_TTL_DAYS', '30'))
+
+# Resumable chunked uploads: total file cap, per-chunk cap (must stay below
+# the 50MB request limit) and how long an idle session is kept
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(1024 * 1024 * 1024)))
+UPLOAD_CHUNK_MAX_BYTES = int(os.environ.get('UPLOAD_CHUNK_MAX_BYTES', str(8 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', '24'))
+
+# Pomodoro: unfinished sessions expire this long after their planned end;
+# SSE streams tick every POMODORO_TICK_SECONDS and are recycled after
+# POMODORO_STREAM_SECONDS (clients reconnect automatically)
+POMODORO_GRACE_MINUTES = int(os.environ.get('POMODORO_GRACE_MINUTES', '15'))
+POMODORO_SWEEP_SECONDS = int(os.environ.get('POMODORO_SWEEP_SECONDS', '60'))
+POMODORO_TICK_SECONDS = float(os.environ.get('POMODORO_TICK_SECONDS', '5'))
+POMODORO_STREAM_SECONDS = int(os.environ.get('POMODORO_STREAM_SECONDS', '300'))
+# Open SSE streams per worker; each holds a worker thread, so keep this well
+# below GUNICORN_THREADS. Streams over the cap get 503 with Retry-After.
+POMODORO_MAX_STREAMS = int(os.environ.get('POMODORO_MAX_STREAMS', '4'))
+
+# Shared cache / KV store (services/cache.py): memory://, sqlite:///path or
+# redis://host:port/db
+CACHE_URL = os.environ.get('CACHE_URL', 'memory://')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))
+# How long answers to cacheable (input-determined) LLM prompts are reused
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(24 * 3600)))
+
+# User data export (services/export.py): text columns longer than this many
+# bytes are streamed as separate chunk records
+EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', str(1024 * 1024)))
+
+# Error questions whose estimated text similarity (Jaccard of token pairs,
+# numbers ignored) reaches this share the same cluster (services/question_index.py)
+ERROR_CLUSTER_SIMILARITY = float(os.environ.get('ERROR_CLUSTER_SIMILARITY', '0.5'))
+
+# Bulk import endpoints (services/bulk_import.py): items per request, and rows
+# per insert transaction
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '20000'))
+IMPORT_BATCH_ROWS = int(os.environ.get('IMPORT_BATCH_ROWS', '1000'))
+
+# Error questions from photos: uploads are cropped, scaled down to
+# VISION_MAX_SIDE pixels and re-encoded before they are sent to VISION_MODEL
+# (VISION_PREPROCESS=0 sends them as uploaded). Answers are reused for photos
+# whose image hashes differ in at most VISION_HASH_DISTANCE bits (0-15, see
+# services/vision_cache.py) and dropped after VISION_CACHE_TTL_DAYS unused
+VISION_PREPROCESS = os.environ.get('VISION_PREPROCESS', '1') == '1'
+VISION_MAX_SIDE = int(os.environ.get('VISION_MAX_SIDE', '1600'))
+VISION_JPEG_QUALITY = int(os.environ.get('VISION_JPEG_QUALITY', '80'))
+VISION_MAX_UPLOAD_BYTES = int(os.environ.get('VISION_MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+VISION_HASH_DISTANCE = int(os.environ.get('VISION_HASH_DISTANCE', '12'))
+VISION_CACHE_TTL_DAYS = int(os.environ.get('VISION_CACHE_TTL_DAYS', '30'))
+
+# JSON encoder for responses: 'auto' uses orjson when installed, 'stdlib' forces json
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+# gzip/brotli responses for clients that accept them (brotli needs the optional
+# `brotli` package); bodies under COMPRESSION_MIN_BYTES are sent as is
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '3'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Prometheus-style /metrics endpoint and request/SQL/LLM instrumentation.
+# /metrics is only served with METRICS_TOKEN set, and wants
+# `Authorization: Bearer <METRICS_TOKEN>`; without it the endpoint is a 404
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# SQL tracing (services/sql_trace.py): statements taking SLOW_QUERY_MS or more
+# go to SLOW_QUERY_LOG with their query plan, every response reports its query
+# count and time in Server-Timing, and testing apps enforce @query_budget.
+# Statement times are accurate to SQL_TRACE_PROGRESS_OPS VM instructions.
+# Off by default; turn it on in development and test runs
+SQL_TRACE = os.environ.get('SQL_TRACE', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log'))
+SQL_TRACE_PROGRESS_OPS = int(os.environ.get('SQL_TRACE_PROGRESS_OPS', '1000'))
+
+# Per-request sampling profiler (services/profiler.py): requests sent with
+# `X-Profile: <PROFILE_TOKEN>`, and a PROFILE_SAMPLE_RATE share of all requests,
+# are profiled into PROFILE_DIR (newest PROFILE_KEEP kept). Leave both unset to
+# not install the profiler at all
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '200'))
 
 CORS_ORIGINS = ['http://localhost:5173', 'http://127.0.0.1:5173']
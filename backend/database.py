@@ -1,19 +1,225 @@
 import sqlite3
 import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import config
+from services import metrics, profiler, sql_trace
+from utils.helpers import id_slot, user_slot
 
-def get_db():
-    conn = sqlite3.connect(config.DATABASE_PATH)
+try:
+    import fcntl
+except ImportError:  # Windows: init_db runs unlocked, fine for the single dev server
+    fcntl = None
+
+# Bump SCHEMA_VERSION whenever schema.sql changes. Changes that CREATE ... IF
+# NOT EXISTS need nothing else; a column added to an existing table also goes
+# in MIGRATIONS under the new version as (table, column, declaration).
+# Migrations run before schema.sql, on databases of any older version, so the
+# table may not exist yet (schema.sql then creates it with the column) or may
+# already have the column; both are skipped. Fresh databases get schema.sql
+# only, which already contains the end state.
+SCHEMA_VERSION = 8
+MIGRATIONS = {
+    5: [('brainstorm_sessions', 'synthesized_count', 'INTEGER DEFAULT 0')],
+    6: [('vision_cache', 'user_id', "TEXT NOT NULL DEFAULT ''")],
+    8: [('upload_sessions', 'status', "TEXT NOT NULL DEFAULT 'open'")],
+}
+
+
+_connection_classes = {}
+
+
+def _connection_class():
+    """sqlite3.Connection with the mixins of the instrumentation that is switched on."""
+    mixins = tuple(mixin for on, mixin in (
+        (metrics.enabled(), metrics.InstrumentedConnection),
+        (sql_trace.enabled(), sql_trace.TracedConnection),
+        # Last, because it reroutes execute() through a cursor
+        (profiler.enabled(), profiler.ProfiledConnection),
+    ) if on)
+    if not mixins:
+        return sqlite3.Connection
+    if mixins not in _connection_classes:
+        _connection_classes[mixins] = type('Connection', mixins + (sqlite3.Connection,), {})
+    return _connection_classes[mixins]
+
+
+# --- Shard routing ----------------------------------------------------------------
+#
+# With DB_SHARDS = N > 1 a user's rows live in one of N SQLite files, chosen by
+# user_slot(user_id) % N. Shard 0 is DATABASE_PATH itself and also holds the
+# tables that belong to no user (extraction_cache, upload_sessions/chunks);
+# shard i > 0 is "<name>.shard<i>.db" next to it. Every file carries the full
+# schema. With the default DB_SHARDS = 1 everything stays in one file.
+#
+# Ids made with gen_id(user_id) carry the owner's slot, so a request that only
+# has a resource id (GET /notes/<id>) still finds the right file. Older ids do
+# not; get_db_for() looks those up on each shard once and remembers the answer.
+# Child rows (book_chapters, reading_progress, ...) live with their parent, so
+# route them by the parent's id.
+
+# Tables that stay on shard 0, and child tables with the (parent table, column)
+# that places them; every other table is placed by its user_id column.
+# tools/reshard.py moves rows by these rules, so new tables belong in one of them
+# unless they have a user_id.
+GLOBAL_TABLES = ('extraction_cache', 'upload_sessions', 'upload_chunks', 'vision_cache', 'vision_cache_bands')
+CHILD_TABLES = {
+    'reading_progress': ('books', 'book_id'),
+    'book_chapters': ('books', 'book_id'),
+    'book_artifacts': ('books', 'book_id'),
+    'book_sources': ('books', 'book_id'),
+    'brainstorm_digests': ('brainstorm_sessions', 'session_id'),
+}
+
+_LOCATED_MAX = 10000
+_located = OrderedDict()  # (table, id) -> shard of rows with legacy ids
+_located_lock = threading.Lock()
+
+
+def shard_count():
+    return max(1, config.DB_SHARDS)
+
+
+def shard_path(shard, base=None):
+    base = base or config.DATABASE_PATH
+    if shard == 0:
+        return base
+    root, ext = os.path.splitext(base)
+    return f'{root}.shard{shard}{ext or ".db"}'
+
+
+def shard_for_user(user_id, shards=None):
+    return user_slot(user_id) % (shards or shard_count())
+
+
+def shard_for_id(resource_id, shards=None):
+    """Shard encoded in resource_id, or None for ids without a slot."""
+    slot = id_slot(resource_id)
+    return None if slot is None else slot % (shards or shard_count())
+
+
+def connect(path):
+    conn = sqlite3.connect(path, factory=_connection_class())
+    if sql_trace.enabled():
+        sql_trace.install(conn, path)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
-def init_db():
-    schema_path = os.path.join(config.BASE_DIR, 'schema.sql')
-    with open(schema_path, 'r', encoding='utf-8') as f:
-        schema = f.read()
-    conn = get_db()
-    conn.executescript(schema)
-    conn.close()
-    print("Database initialized.")
+
+def get_db(user_id=None, shard=None):
+    """Connection to the shard holding user_id's rows (shard 0 without a key)."""
+    if shard is None:
+        shard = 0 if user_id is None or shard_count() == 1 else shard_for_user(user_id)
+    return connect(shard_path(shard))
+
+
+def get_db_for(table, resource_id):
+    """Connection to the shard holding row resource_id of table (or its children)."""
+    return get_db(shard=locate(table, resource_id))
+
+
+def locate(table, resource_id):
+    """Shard of row resource_id in table; 0 when it exists nowhere."""
+    shards = shard_count()
+    if shards == 1:
+        return 0
+    shard = shard_for_id(resource_id)
+    if shard is not None:
+        return shard
+    key = (table, resource_id)
+    with _located_lock:
+        if key in _located:
+            _located.move_to_end(key)
+            return _located[key]
+    for candidate in range(shards):
+        conn = sqlite3.connect(shard_path(candidate))
+        try:
+            found = conn.execute(f'SELECT 1 FROM {table} WHERE id = ?', (resource_id,)).fetchone()
+        finally:
+            conn.close()
+        if found:
+            with _located_lock:
+                _located[key] = candidate
+                while len(_located) > _LOCATED_MAX:
+                    _located.popitem(last=False)
+            return candidate
+    return 0
+
+
+def is_home(conn):
+    """Whether conn is a connection to shard 0."""
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    return shard_count() == 1 or os.path.abspath(path) == os.path.abspath(shard_path(0))
+
+
+def all_shards():
+    """Connections to every shard, for the few queries that span users."""
+    return [get_db(shard=shard) for shard in range(shard_count())]
+
+
+def init_db(shards=None):
+    """Create or migrate the schema of every shard; safe to call from every worker at startup."""
+    for shard in range(shards or shard_count()):
+        _init_file(shard_path(shard))
+
+
+def _init_file(path):
+    """Create or migrate the schema of one database file.
+
+    PRAGMA user_version records the applied SCHEMA_VERSION, so an up-to-date
+    database costs one read. Otherwise an exclusive file lock next to the
+    database makes sure only one process migrates while the others wait.
+    """
+    if _schema_version(path) >= SCHEMA_VERSION:
+        return
+    with _init_lock(path):
+        current = _schema_version(path)
+        if current >= SCHEMA_VERSION:
+            return
+        conn = connect(path)
+        try:
+            fresh = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0] == 0
+            if not fresh:
+                # Databases from before user_version tracking are at version 1
+                for version in range(max(current, 1) + 1, SCHEMA_VERSION + 1):
+                    for table, column, declaration in MIGRATIONS.get(version, ()):
+                        _add_column(conn, table, column, declaration)
+            schema_path = os.path.join(config.BASE_DIR, 'schema.sql')
+            with open(schema_path, 'r', encoding='utf-8') as f:
+                conn.executescript(f.read())
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        finally:
+            conn.close()
+    print(f"Database initialized: {os.path.basename(path)}")
+
+
+def _add_column(conn, table, column, declaration):
+    columns = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+    # A table the database does not have yet comes from schema.sql, column included
+    if columns and column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def _schema_version(path):
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _init_lock(path):
+    with open(path + '.init.lock', 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,43 @@
+"""gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+Requests mostly wait on the LLM API, so each worker runs many threads
+(gthread) rather than adding processes; a few processes keep CPU-bound work
+(JSON, SQLite, file parsing) spread across cores. Every value can be
+overridden through the environment.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count() + 1))))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+# Import the app (and the preloaded LLM client, see wsgi.py) once in the master;
+# init_db() runs there before any worker exists
+preload_app = True
+
+# LLM calls (translations, batch analysis) can legitimately take minutes
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot grow without bound
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+# Heartbeat file on tmpfs instead of a possibly slow disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+# Note: background jobs (services.tasks), upload progress and /metrics are
+# per-worker state; scrape or poll through a sticky route, or run one worker.
+
+
+def pre_fork(server, worker):
+    # Move everything the master imported into the permanent generation so the
+    # workers' garbage collector does not touch (and un-share) those pages
+    gc.freeze()
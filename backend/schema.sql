@@ -104,6 +104,7 @@ CREATE TABLE IF NOT EXISTS brainstorm_sessions (
     synthesis TEXT,
     recommendation TEXT,
     status TEXT DEFAULT 'active',
+    synthesized_count INTEGER DEFAULT 0,
     created_at TEXT DEFAULT (datetime('now'))
 );
 
@@ -145,3 +146,211 @@ CREATE TABLE IF NOT EXISTS notes (
     created_at TEXT DEFAULT (datetime('now')),
     updated_at TEXT DEFAULT (datetime('now'))
 );
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    blueprint TEXT,
+    feature TEXT,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    degraded INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_user_created ON llm_usage(user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS llm_usage_buckets (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    blueprint TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER DEFAULT 0,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, user_id, blueprint, feature, model)
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_buckets_user ON llm_usage_buckets(user_id, granularity, bucket);
+
+CREATE TABLE IF NOT EXISTS llm_budgets (
+    user_id TEXT PRIMARY KEY,
+    daily_tokens INTEGER NOT NULL,
+    updated_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS book_chapters (
+    book_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    title TEXT,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    PRIMARY KEY (book_id, idx)
+);
+
+CREATE TABLE IF NOT EXISTS book_artifacts (
+    book_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    pipeline_version INTEGER NOT NULL,
+    content TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (book_id, kind, version)
+);
+
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    content_hash TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    content TEXT,
+    size INTEGER DEFAULT 0,
+    ref_count INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT (datetime('now')),
+    last_used_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (content_hash, extractor_version)
+);
+
+CREATE TABLE IF NOT EXISTS book_sources (
+    book_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    meta TEXT DEFAULT '{}',
+    -- 'open' while chunks arrive, 'assembling' once a /complete has claimed it
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at TEXT DEFAULT (datetime('now')),
+    updated_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    upload_id TEXT NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    PRIMARY KEY (upload_id, start_offset)
+);
+
+-- Covering indexes for ETag version checks (utils/http_cache.py)
+CREATE INDEX IF NOT EXISTS idx_books_version ON books(id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_books_user_version ON books(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_papers_user_version ON papers(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_documents_version ON documents(id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_documents_user_version ON documents(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_notes_version ON notes(id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_notes_user_version ON notes(user_id, updated_at);
+
+-- Per-user write counter of the collections above, bumped by the triggers below.
+-- COUNT(*) and MAX(updated_at) alone miss an update plus a delete and insert
+-- with the same timestamp; the counter does not.
+CREATE TABLE IF NOT EXISTS collection_versions (
+    user_id TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_id, table_name)
+);
+CREATE TRIGGER IF NOT EXISTS trg_books_version_insert AFTER INSERT ON books BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'books')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_books_version_update AFTER UPDATE ON books BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'books')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_books_version_delete AFTER DELETE ON books BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (OLD.user_id, 'books')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_papers_version_insert AFTER INSERT ON papers BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'papers')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_papers_version_update AFTER UPDATE ON papers BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'papers')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_papers_version_delete AFTER DELETE ON papers BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (OLD.user_id, 'papers')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_documents_version_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'documents')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_documents_version_update AFTER UPDATE ON documents BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'documents')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_documents_version_delete AFTER DELETE ON documents BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (OLD.user_id, 'documents')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_notes_version_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'notes')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_notes_version_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (NEW.user_id, 'notes')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_notes_version_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO collection_versions (user_id, table_name) VALUES (OLD.user_id, 'notes')
+    ON CONFLICT (user_id, table_name) DO UPDATE SET version = version + 1;
+END;
+
+-- Active pomodoro lookups only ever touch uncompleted rows
+CREATE INDEX IF NOT EXISTS idx_pomodoro_active ON pomodoro_sessions(user_id, created_at) WHERE completed = 0;
+
+-- Vision model answers for uploaded photos (services/vision_cache.py); user_id is
+-- the uploader, whose entries alone serve near matches
+CREATE TABLE IF NOT EXISTS vision_cache (
+    image_hash TEXT PRIMARY KEY,
+    prompt_version INTEGER NOT NULL,
+    user_id TEXT NOT NULL DEFAULT '',
+    result TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now')),
+    last_used_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS vision_cache_bands (
+    band INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    image_hash TEXT NOT NULL,
+    PRIMARY KEY (band, value, image_hash)
+) WITHOUT ROWID;
+
+-- Near-duplicate index and clusters over error questions (services/question_index.py);
+-- derived from error_questions and rebuilt by ensure_indexed() when missing
+CREATE TABLE IF NOT EXISTS error_question_index (
+    question_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    signature BLOB,
+    cluster_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_error_question_index_cluster ON error_question_index(user_id, cluster_id);
+
+CREATE TABLE IF NOT EXISTS error_question_bands (
+    user_id TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, band, value, question_id)
+) WITHOUT ROWID;
+
+-- One digest per brainstorm discussion round (services/brainstorm_synthesis.py),
+-- keyed by the offset of the round's first message in brainstorm_sessions.messages
+CREATE TABLE IF NOT EXISTS brainstorm_digests (
+    session_id TEXT NOT NULL,
+    first_message INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (session_id, first_message)
+) WITHOUT ROWID;
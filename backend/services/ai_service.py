@@ -1,40 +1,98 @@
+import base64
+import hashlib
 import json
-from openai import OpenAI
+import threading
+import time
 import config
+from services import cache, metrics, usage
+from utils import chunker
 
-client = OpenAI(
-    api_key=config.DASHSCOPE_API_KEY,
-    base_url=config.DASHSCOPE_BASE_URL,
-)
+JSON_PROMPT_SUFFIX = '\n请以JSON格式返回结果，不要包含markdown代码块标记。'
 
+_client = None
+_client_lock = threading.Lock()
 
-def chat_completion(messages, temperature=0.7):
-    response = client.chat.completions.create(
-        model=config.TEXT_MODEL,
-        messages=messages,
-        temperature=temperature,
-    )
-    return response.choices[0].message.content
 
+def get_client():
+    """The shared OpenAI client, created on first use (importing openai takes ~0.6s)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=config.DASHSCOPE_API_KEY,
+                    base_url=config.DASHSCOPE_BASE_URL,
+                )
+    return _client
+
+
+def chat_completion(messages, temperature=0.7, cache_ttl=None):
+    """Run a chat completion and return the reply text.
+
+    With cache_ttl, identical prompts share one answer for that many seconds
+    (across workers when the cache backend is shared); use it only where the
+    reply depends on nothing but the prompt.
+    """
+    return _completion(messages, temperature, cache_ttl, 'llm', lambda text: text)
+
+
+def _completion(messages, temperature, cache_ttl, prefix, parse):
+    """parse(reply), shared through the cache under prefix with cache_ttl.
+
+    Only what parsed is cached, so a malformed reply fails its own request
+    and is asked again next time, and only answers of TEXT_MODEL are: a
+    budget-degraded answer goes to its caller but is not served to others.
+    """
+    if not cache_ttl:
+        return parse(_chat_completion(messages, temperature))
+    key = f'{prefix}:' + hashlib.sha256(
+        json.dumps([config.TEXT_MODEL, temperature, messages], ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+    degraded = []
+
+    def produce():
+        text, model = _chat_completion(messages, temperature, with_model=True)
+        value = parse(text)
+        if model != config.TEXT_MODEL:
+            degraded.append(value)
+            return None  # not cached
+        return value
+
+    value = cache.get_or_set(key, produce, cache_ttl)
+    return degraded[0] if degraded else value
 
-def translate_long_text(text, chunk_size=2000):
-    """Split long text into chunks and translate each one."""
-    if not text:
-        return ''
 
-    paragraphs = text.split('\n')
-    chunks = []
-    current = ''
+def _chat_completion(messages, temperature, primary=None, fallback=None, with_model=False):
+    """The reply text, or (text, model that answered) with with_model."""
+    primary = primary or config.TEXT_MODEL
+    user_id, blueprint, feature = usage.current_tags()
+    model = usage.select_model(user_id, primary, fallback)
 
-    for para in paragraphs:
-        if len(current) + len(para) + 1 > chunk_size and current:
-            chunks.append(current)
-            current = para
-        else:
-            current = current + '\n' + para if current else para
-    if current:
-        chunks.append(current)
+    start = time.perf_counter()
+    try:
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+    except Exception as e:
+        if metrics.enabled():
+            metrics.record_llm_call(model, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    if metrics.enabled():
+        metrics.record_llm_call(model, time.perf_counter() - start, response.usage)
+    usage.record(user_id, blueprint, feature, model, response.usage, degraded=model != primary)
+    text = response.choices[0].message.content
+    return (text, model) if with_model else text
 
+
+def translate_long_text(text, max_tokens=None):
+    """Translate text in sentence-aligned chunks of about max_tokens (TRANSLATE_CHUNK_TOKENS) each."""
+    if not text:
+        return ''
+
+    chunks = list(chunker.iter_chunks(text, max_tokens or config.TRANSLATE_CHUNK_TOKENS))
     translated_parts = []
     for i, chunk in enumerate(chunks):
         result = chat_completion([
@@ -46,12 +104,31 @@ def translate_long_text(text, chunk_size=2000):
     return '\n\n'.join(translated_parts)
 
 
-def chat_completion_json(messages, temperature=0.7):
-    prompt_suffix = '\n请以JSON格式返回结果，不要包含markdown代码块标记。'
+def vision_completion_json(image, prompt, system, mime='image/jpeg', temperature=0.2):
+    """Ask VISION_MODEL about an image (bytes) and return its reply parsed as JSON.
+
+    Over budget this degrades to VISION_FALLBACK_MODEL, which can still see.
+    """
+    url = f'data:{mime};base64,' + base64.b64encode(image).decode('ascii')
+    messages = [
+        {'role': 'system', 'content': system},
+        {'role': 'user', 'content': [
+            {'type': 'image_url', 'image_url': {'url': url}},
+            {'type': 'text', 'text': prompt + JSON_PROMPT_SUFFIX},
+        ]},
+    ]
+    return _parse_json(_chat_completion(messages, temperature, config.VISION_MODEL, config.VISION_FALLBACK_MODEL))
+
+
+def chat_completion_json(messages, temperature=0.7, cache_ttl=None):
     if messages and messages[-1]['role'] == 'user':
-        messages[-1]['content'] += prompt_suffix
+        messages[-1]['content'] += JSON_PROMPT_SUFFIX
+
+    # Parsed replies are cached under their own prefix, apart from raw text
+    return _completion(messages, temperature, cache_ttl, 'llm-json', _parse_json)
+
 
-    text = chat_completion(messages, temperature)##‘’‘
+def _parse_json(text):
     text = text.strip()
     if text.startswith('```'):
         text = text.split('\n', 1)[1] if '\n' in text else text[3:]
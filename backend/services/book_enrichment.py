@@ -0,0 +1,169 @@
+"""Upload-time enrichment for books.
+
+When a book is added its chapter index is built, and a background job
+precomputes the default summary, SQ3R guide and author introduction, so the
+reader endpoints can answer instantly instead of paying a cold LLM call.
+Artifacts are versioned per book; PIPELINE_VERSION records which prompts
+produced them.
+"""
+import json
+import threading
+import config
+from database import get_db_for
+from utils.helpers import row_to_dict, now_iso
+from utils.chapters import detect_chapters
+from utils.chunker import head
+from services import tasks, usage
+from services.ai_service import chat_completion, chat_completion_json
+
+PIPELINE_VERSION = 2
+
+_book_jobs = {}
+_book_jobs_lock = threading.Lock()
+
+
+# --- Prompts shared with the on-demand endpoints -----------------------------
+
+def summarize(book, style='concise', max_len=500, chapter=None):
+    """Summarize the book, or one chapter of it (a dict with 'title' and 'content')."""
+    if chapter:
+        target = f'书籍《{book["title"]}》的章节"{chapter["title"]}"'
+        content_preview = head(chapter['content'], config.EXCERPT_TOKENS)
+    else:
+        target = '以下书籍'
+        content_preview = head(book['content'], config.EXCERPT_TOKENS)
+    return chat_completion([
+        {'role': 'system', 'content': '你是一个专业的书籍摘要助手。'},
+        {'role': 'user', 'content': f'请为{target}生成{style}风格的摘要，不超过{max_len}字：\n\n书名：{book["title"]}\n作者：{book["author"]}\n\n内容节选：\n{content_preview}'}
+    ])
+
+
+def sq3r_guide(book, chapter_title, chapter_content=None):
+    if chapter_content is not None:
+        content_preview = head(chapter_content, config.EXCERPT_TOKENS)
+    else:
+        content_preview = head(book['content'], config.EXCERPT_TOKENS)
+    return chat_completion_json([
+        {'role': 'system', 'content': '你是SQ3R阅读法专家。返回JSON格式：{"steps": [{"step": "survey|question|read|recite|review", "title": "步骤标题", "content": "具体指导内容", "completed": false}]}'},
+        {'role': 'user', 'content': f'为书籍《{book["title"]}》的章节"{chapter_title}"生成SQ3R阅读指导。\n\n内容节选：\n{content_preview}'}
+    ])
+
+
+def author_intro(book):
+    content_preview = head(book['content'], config.EXCERPT_TOKENS)
+    return chat_completion([
+        {'role': 'system', 'content': f'你现在扮演《{book["title"]}》的作者{book["author"]}。基于书籍内容回答读者的问题，保持作者的语气和风格。'},
+        {'role': 'user', 'content': f'书籍内容节选：\n{content_preview}\n\n请以作者身份做一个简短的自我介绍，并欢迎读者提问。'}
+    ])
+
+
+# --- Pipeline ------------------------------------------------------------------
+
+def enqueue(book_id):
+    """Start enrichment for book_id in the background; returns the job id or None."""
+    if not config.BOOK_ENRICHMENT_ENABLED:
+        return None
+    job_id = tasks.submit('book_enrichment', enrich_book, book_id)
+    with _book_jobs_lock:
+        _book_jobs[book_id] = job_id
+    return job_id
+
+
+def enrich_book(job_id, book_id):
+    db = get_db_for('books', book_id)
+    book = row_to_dict(db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone())
+    if not book:
+        db.close()
+        return
+
+    if not db.execute('SELECT 1 FROM book_chapters WHERE book_id = ? LIMIT 1', (book_id,)).fetchone():
+        build_index(db, book_id, book['content'] or '')
+        db.commit()
+    db.close()
+
+    steps = [
+        ('summary', lambda: summarize(book)),
+        ('sq3r', lambda: sq3r_guide(book, book['title'])),
+        ('author_intro', lambda: author_intro(book)),
+    ]
+    tasks.update(job_id, total=len(steps) + 1, done=1)
+
+    failed = []
+    for kind, produce in steps:
+        try:
+            with usage.attribute(book['user_id'], 'books', f'enrich_{kind}'):
+                result = produce()
+        except usage.BudgetExceeded:
+            failed.append(kind)
+            break
+        except Exception:
+            failed.append(kind)
+            tasks.advance(job_id)
+            continue
+        db = get_db_for('books', book_id)
+        save_artifact(db, book_id, kind, result)
+        if kind == 'summary':
+            db.execute('UPDATE books SET summary = ?, updated_at = ? WHERE id = ?', (result, now_iso(), book_id))
+        db.commit()
+        db.close()
+        tasks.advance(job_id)
+
+    if failed:
+        raise RuntimeError(f'Enrichment steps failed: {", ".join(failed)}')
+
+
+def build_index(db, book_id, content):
+    """Detect chapters in content and store their offsets (caller commits)."""
+    save_chapters(db, book_id, detect_chapters(content))
+
+
+def save_chapters(db, book_id, chapters):
+    db.execute('DELETE FROM book_chapters WHERE book_id = ?', (book_id,))
+    db.executemany(
+        'INSERT INTO book_chapters (book_id, idx, title, start_offset, end_offset) VALUES (?,?,?,?,?)',
+        [(book_id, c['index'], c['title'], c['start'], c['end']) for c in chapters]
+    )
+    db.execute('UPDATE reading_progress SET total_chapters = ? WHERE book_id = ?', (len(chapters), book_id))
+
+
+def save_artifact(db, book_id, kind, content):
+    db.execute(
+        'INSERT INTO book_artifacts (book_id, kind, version, pipeline_version, content, created_at) '
+        'SELECT ?, ?, COALESCE(MAX(version), 0) + 1, ?, ?, ? FROM book_artifacts WHERE book_id = ? AND kind = ?',
+        (book_id, kind, PIPELINE_VERSION, json.dumps(content, ensure_ascii=False), now_iso(), book_id, kind)
+    )
+
+
+def latest_artifact(db, book_id, kind):
+    row = db.execute(
+        'SELECT content FROM book_artifacts WHERE book_id = ? AND kind = ? ORDER BY version DESC LIMIT 1',
+        (book_id, kind)
+    ).fetchone()
+    return json.loads(row['content']) if row else None
+
+
+def status(book_id):
+    db = get_db_for('books', book_id)
+    rows = db.execute(
+        'SELECT kind, MAX(version) AS version, pipeline_version, created_at FROM book_artifacts WHERE book_id = ? GROUP BY kind',
+        (book_id,)
+    ).fetchall()
+    chapters = db.execute('SELECT COUNT(*) AS n FROM book_chapters WHERE book_id = ?', (book_id,)).fetchone()['n']
+    db.close()
+    with _book_jobs_lock:
+        job_id = _book_jobs.get(book_id)
+    return {
+        'bookId': book_id,
+        'pipelineVersion': PIPELINE_VERSION,
+        'totalChapters': chapters,
+        'artifacts': {
+            r['kind']: {'version': r['version'], 'pipelineVersion': r['pipeline_version'], 'createdAt': r['created_at']}
+            for r in rows
+        },
+        'job': tasks.get(job_id) if job_id else None,
+    }
+
+
+def delete_book_data(db, book_id):
+    db.execute('DELETE FROM book_chapters WHERE book_id = ?', (book_id,))
+    db.execute('DELETE FROM book_artifacts WHERE book_id = ?', (book_id,))
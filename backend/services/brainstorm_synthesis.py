@@ -0,0 +1,100 @@
+"""Incremental synthesis of brainstorm discussions.
+
+Each discussion round (start-discussion, deep-dive) appends one message per
+expert. Once a round is stored, a background job condenses it into a short
+digest in brainstorm_digests, keyed by the offset of the round's first
+message.
+
+The session's synthesis is a running one: brainstorm_sessions.synthesized_count
+records how many messages it covers. synthesize() folds only the messages after
+those into it, using a round's digest where it is ready and the round's
+messages where it is not, so a re-synthesis costs the rounds added since the
+last one rather than the whole discussion, and with nothing new it returns
+the stored synthesis without an LLM call. A first synthesis after several
+rounds starts from their digests.
+"""
+from database import get_db_for
+from services import tasks, usage
+from services.ai_service import chat_completion
+from utils.helpers import parse_json_field, row_to_dict
+
+
+def round_added(session, first, count):
+    """Queue the digest of messages [first, first + count) of session; returns the job id."""
+    return tasks.submit('brainstorm_digest', _digest_round, session['id'], session['user_id'], first, count)
+
+
+def _digest_round(job_id, session_id, user_id, first, count):
+    db = get_db_for('brainstorm_sessions', session_id)
+    try:
+        session = row_to_dict(db.execute('SELECT * FROM brainstorm_sessions WHERE id = ?', (session_id,)).fetchone())
+        if not session:
+            return
+        messages = parse_json_field(session['messages'], [])[first:first + count]
+        if not messages:
+            return
+        with usage.attribute(user_id, 'brainstorm', 'digest'):
+            digest = chat_completion([
+                {'role': 'system', 'content': '你是讨论记录员，负责提炼头脑风暴每一轮的要点。'},
+                {'role': 'user', 'content': f'话题：{session["topic"]}\n\n本轮讨论：\n{_transcript(messages)}\n\n'
+                                            '请按角色列出本轮的核心观点和关键论据，保留分歧，不超过300字。'}
+            ], temperature=0.3)
+        db.execute(
+            'INSERT OR REPLACE INTO brainstorm_digests (session_id, first_message, message_count, digest) VALUES (?,?,?,?)',
+            (session_id, first, len(messages), digest)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def synthesize(db, session):
+    """Bring the session's running synthesis up to date and store it (the caller commits); returns it."""
+    messages = parse_json_field(session['messages'], [])
+    previous = session['synthesis']
+    covered = min(session['synthesized_count'] or 0, len(messages)) if previous else 0
+    if previous and covered == len(messages):
+        return previous
+
+    digests = db.execute(
+        'SELECT first_message, message_count, digest FROM brainstorm_digests '
+        'WHERE session_id = ? AND first_message >= ? ORDER BY first_message',
+        (session['id'], covered)
+    ).fetchall()
+    parts = []
+    position = covered
+    for d in digests:
+        end = d['first_message'] + d['message_count']
+        if d['first_message'] < position or end > len(messages):
+            continue
+        if d['first_message'] > position:
+            parts.append(_transcript(messages[position:d['first_message']]))
+        parts.append(f'[本轮要点]: {d["digest"]}')
+        position = end
+    if position < len(messages):
+        parts.append(_transcript(messages[position:]))
+    discussion = '\n'.join(parts)
+
+    if previous:
+        prompt = (f'话题：{session["topic"]}\n\n已有的综合结论：\n{previous}\n\n此后新增的讨论：\n{discussion}\n\n'
+                  '请在已有结论的基础上吸收新增观点，给出更新后的完整总结和建议。')
+    else:
+        prompt = f'话题：{session["topic"]}\n\n讨论内容：\n{discussion}\n\n请综合以上观点，给出总结和建议。'
+    synthesis = chat_completion([
+        {'role': 'system', 'content': '你是讨论总结专家，综合各方观点给出结论。'},
+        {'role': 'user', 'content': prompt}
+    ])
+
+    db.execute(
+        'UPDATE brainstorm_sessions SET synthesis = ?, synthesized_count = ?, status = "completed" WHERE id = ?',
+        (synthesis, len(messages), session['id'])
+    )
+    return synthesis
+
+
+def delete_session_data(db, session_id):
+    db.execute('DELETE FROM brainstorm_digests WHERE session_id = ?', (session_id,))
+
+
+def _transcript(messages):
+    return '\n'.join(f"[{m['role']}]: {m['content']}" for m in messages)
@@ -0,0 +1,191 @@
+"""Shared handling for the bulk import endpoints (error questions, notes, quotes).
+
+A request carries either
+
+    JSON   [{...}, ...]  or  {"userId": "...", "items": [{...}, ...]}
+    CSV    Content-Type: text/csv (or a multipart "file"), one item per row,
+           headers named like the JSON fields
+
+with userId in the body, the query string or the form. Every item is
+validated on its own; the valid ones are inserted with executemany in
+transactions of IMPORT_BATCH_ROWS, and the response lists the rows that were
+rejected (row 1 is the first item / the first CSV line after the header):
+
+    {"imported": 2998, "failed": 2, "errors": [{"row": 17, "errors": ["question is required"]}]}
+
+?dryRun=1 validates without inserting.
+"""
+import csv
+import io
+import json
+import sqlite3
+from flask import jsonify
+import config
+from database import get_db
+from utils.helpers import gen_id, error_response
+
+
+class Field:
+    """One importable field: JSON/CSV name, target column and validation."""
+
+    def __init__(self, name, column=None, required=False, default='', choices=None, max_length=20000, kind='text'):
+        self.name = name
+        self.column = column or name
+        self.required = required
+        self.default = default
+        self.choices = choices
+        self.max_length = max_length
+        self.kind = kind  # 'text', or 'list': a JSON array (CSV: "a;b;c") stored as JSON text
+
+    def clean(self, item, errors):
+        value = item.get(self.name)
+        if value is None or value == '':
+            if self.required:
+                errors.append(f'{self.name} is required')
+            return json.dumps(self.default, ensure_ascii=False) if self.kind == 'list' else self.default
+        if self.kind == 'list':
+            return self._clean_list(value, errors)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            errors.append(f'{self.name} must be a string')
+            return None
+        value = value.strip()
+        if self.required and not value:
+            errors.append(f'{self.name} is required')
+        if len(value) > self.max_length:
+            errors.append(f'{self.name} is longer than {self.max_length} characters')
+        if self.choices and value not in self.choices:
+            errors.append(f'{self.name} must be one of {", ".join(self.choices)}')
+        return value
+
+    def _clean_list(self, value, errors):
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith('['):
+                try:
+                    value = json.loads(text)
+                except json.JSONDecodeError:
+                    errors.append(f'{self.name} is not a valid JSON array')
+                    return None
+            else:
+                value = [part.strip() for part in text.split(';') if part.strip()]
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            errors.append(f'{self.name} must be a list of strings')
+            return None
+        return json.dumps(value, ensure_ascii=False)
+
+
+class BulkImportError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def read_items(req):
+    """(user_id, items) from a JSON or CSV request."""
+    user_id = req.args.get('userId') or req.form.get('userId')
+    upload = req.files.get('file')
+    if upload is not None or (req.mimetype or '').startswith(('text/csv', 'text/plain')):
+        raw = upload.read() if upload is not None else req.get_data()
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BulkImportError('CSV must be UTF-8 encoded')
+        items = list(csv.DictReader(io.StringIO(text)))
+    else:
+        data = req.get_json(silent=True)
+        if isinstance(data, dict):
+            user_id = data.get('userId') or user_id
+            data = data.get('items')
+        if not isinstance(data, list):
+            raise BulkImportError('Expected a JSON array of items, {"items": [...]} or a CSV body')
+        items = data
+
+    if not user_id:
+        raise BulkImportError('userId is required')
+    if not items:
+        raise BulkImportError('No items to import')
+    if len(items) > config.IMPORT_MAX_ROWS:
+        raise BulkImportError(f'At most {config.IMPORT_MAX_ROWS} items per import', 413)
+    return user_id, items
+
+
+def validate(items, fields):
+    """Split items into ([(row, values)], [error]) with values in `fields` order."""
+    valid, errors = [], []
+    for row, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            errors.append({'row': row, 'errors': ['item must be an object']})
+            continue
+        problems = []
+        values = [field.clean(item, problems) for field in fields]
+        if problems:
+            errors.append({'row': row, 'errors': problems})
+        else:
+            valid.append((row, values))
+    return valid, errors
+
+
+def insert_batches(db, sql, rows, batch_rows=None):
+    """executemany rows ((row, params) pairs) in transactions of batch_rows; returns (inserted, errors).
+
+    A batch the database rejects is retried row by row, so one bad row only
+    costs its own insert. Any other database error (locked, disk I/O) stops
+    the import: earlier batches stay committed, and the rows of this batch
+    and the ones after it are reported as failed, so the client knows
+    exactly which rows made it.
+    """
+    batch_rows = batch_rows or config.IMPORT_BATCH_ROWS
+    inserted, errors = 0, []
+    done = 0  # rows inserted or rejected so far
+    try:
+        for start in range(0, len(rows), batch_rows):
+            batch = rows[start:start + batch_rows]
+            try:
+                with db:
+                    db.executemany(sql, [params for _, params in batch])
+                inserted += len(batch)
+                done += len(batch)
+            except sqlite3.IntegrityError:
+                for row, params in batch:
+                    try:
+                        with db:
+                            db.execute(sql, params)
+                        inserted += 1
+                    except sqlite3.IntegrityError as e:
+                        errors.append({'row': row, 'errors': [str(e)]})
+                    done += 1
+    except sqlite3.Error as e:
+        errors += [{'row': row, 'errors': [f'not imported: {e}']} for row, _ in rows[done:]]
+    return inserted, errors
+
+
+def import_rows(req, table, fields, fixed=None, after_insert=None):
+    """Handle a bulk import request into table; fixed maps extra columns to constant values.
+
+    after_insert(user_id) runs once rows have been committed, e.g. to bring
+    derived data up to date.
+    """
+    try:
+        user_id, items = read_items(req)
+    except BulkImportError as e:
+        return error_response(e.message, e.status_code)
+
+    valid, errors = validate(items, fields)
+    if req.args.get('dryRun') == '1':
+        return jsonify({'imported': 0, 'valid': len(valid), 'failed': len(errors), 'errors': errors})
+
+    fixed = fixed or {}
+    columns = ['id', 'user_id'] + [f.column for f in fields] + list(fixed)
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    rows = [(row, [gen_id(user_id), user_id] + values + list(fixed.values())) for row, values in valid]
+
+    db = get_db(user_id)
+    inserted, insert_errors = insert_batches(db, sql, rows)
+    db.close()
+    if inserted and after_insert:
+        after_insert(user_id)
+    errors = sorted(errors + insert_errors, key=lambda e: e['row'])
+    return jsonify({'imported': inserted, 'failed': len(errors), 'errors': errors})
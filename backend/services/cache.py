@@ -0,0 +1,322 @@
+"""Small cache / key-value store with pluggable backends.
+
+config.CACHE_URL picks the backend:
+
+    memory://                 in-process LRU (default; per worker, lost on restart)
+    sqlite:///path/cache.db   a SQLite file shared by every worker on the host
+                              ("sqlite://" alone puts cache.db next to the database)
+    redis://host:6379/0       any server speaking the Redis protocol; for tests
+                              and local runs tools/fake_redis_server.py serves it
+
+Values are anything JSON can encode; treat what get() returns as read-only.
+ttl is in seconds (None = no expiry). incr() and add() are atomic on every
+backend, so they can back cross-worker counters and single-flight locks.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+import config
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = make_cache(config.CACHE_URL)
+    return _cache
+
+
+def make_cache(url):
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        return MemoryCache(config.CACHE_MAX_ENTRIES)
+    if parsed.scheme == 'sqlite':
+        path = parsed.path or os.path.join(os.path.dirname(config.DATABASE_PATH), 'cache.db')
+        return SQLiteCache(path)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisCache(parsed.hostname or '127.0.0.1', parsed.port or 6379, db, parsed.password)
+    raise ValueError(f'Unsupported CACHE_URL: {url}')
+
+
+# Module-level shortcuts for the configured backend
+
+def get(key):
+    return get_cache().get(key)
+
+
+def set(key, value, ttl=None):
+    get_cache().set(key, value, ttl)
+
+
+def add(key, value, ttl=None):
+    return get_cache().add(key, value, ttl)
+
+
+def delete(key):
+    get_cache().delete(key)
+
+
+def incr(key, amount=1, ttl=None):
+    return get_cache().incr(key, amount, ttl)
+
+
+def get_or_set(key, produce, ttl=None, wait=30):
+    """Return the cached value for key, computing it with produce() on a miss.
+
+    Single-flight: while one caller (in any worker, with a shared backend)
+    computes the value, others wait up to `wait` seconds for it instead of
+    repeating the work. None results are not cached.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, ttl=wait):
+        try:
+            value = produce()
+            if value is not None:
+                cache.set(key, value, ttl)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+    return produce()
+
+
+# --- Backends ---------------------------------------------------------------------
+
+class MemoryCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def _store(self, key, value, ttl):
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+        return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key, time.time()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            item = self._live(key, time.time())
+            if item is None:
+                self._store(key, amount, ttl)
+                return amount
+            value = int(item[0]) + amount
+            self._data[key] = (value, item[1])
+            return value
+
+
+class SQLiteCache:
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement below is atomic on its own (incr uses a transaction)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn().execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+
+    def get(self, key):
+        row = self._conn().execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value, ensure_ascii=False), time.time() + ttl if ttl else None)
+        )
+        self._wrote()
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        cursor = self._conn().execute(
+            'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at '
+            'WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?',
+            (key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now)
+        )
+        self._wrote()
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        expired = 'cache.expires_at IS NOT NULL AND cache.expires_at <= ?'
+        conn = self._conn()
+        # UPDATE ... RETURNING needs SQLite 3.35; read the new value in the same write transaction
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) '
+                f'ON CONFLICT (key) DO UPDATE SET '
+                f'value = CASE WHEN {expired} THEN excluded.value ELSE CAST(cache.value AS INTEGER) + ? END, '
+                f'expires_at = CASE WHEN {expired} THEN excluded.expires_at ELSE cache.expires_at END',
+                (key, str(amount), now + ttl if ttl else None, now, amount, now)
+            )
+            row = conn.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._wrote()
+        return int(row[0])
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache:
+    """Minimal RESP client (GET/SET/DEL/INCRBY) with one connection per thread."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5):
+        self.host, self.port, self.db, self.password, self.timeout = host, port, db, password, timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._send('AUTH', self.password)
+        if self.db:
+            self._send('SELECT', self.db)
+
+    def _command(self, *args):
+        # One retry on a fresh connection covers servers that dropped an idle socket
+        for attempt in (0, 1):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (OSError, EOFError):
+                self._local.sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+
+    def _send(self, *args):
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise EOFError('connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read() for _ in range(count)]
+        raise RedisError(f'Unexpected reply: {line!r}')
+
+    def get(self, key):
+        data = self._command('GET', key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key, value, ttl=None):
+        args = ['SET', key, json.dumps(value, ensure_ascii=False)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self._command(*args)
+
+    def add(self, key, value, ttl=None):
+        args = ['SET', key, json.dumps(value, ensure_ascii=False), 'NX']
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        return self._command(*args) is not None
+
+    def delete(self, key):
+        self._command('DEL', key)
+
+    def incr(self, key, amount=1, ttl=None):
+        if ttl:
+            # Creates the key with its expiry only if it does not exist yet
+            self._command('SET', key, 0, 'PX', int(ttl * 1000), 'NX')
+        return self._command('INCRBY', key, amount)
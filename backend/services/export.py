@@ -0,0 +1,191 @@
+"""Streaming NDJSON export of everything a user owns.
+
+The export is a sequence of JSON lines read straight from database cursors,
+so memory stays flat however much the user has:
+
+    {"type": "export", "version": 1, "userId": ..., "createdAt": ..., "after": null}
+    {"type": "row", "table": "notes", "row": {...}, "cursor": "notes:17"}
+    {"type": "row", "table": "books", "row": {..., "content": null}, "chunked": {"content": 52428800}}
+    {"type": "chunk", "table": "books", "id": ..., "field": "content", "offset": 0, "data": "..."}
+    ...
+    {"type": "chunk", ..., "offset": 51380224, "data": "...", "cursor": "books:3"}
+    {"type": "end", "records": 1234}
+
+Rows are raw table rows (snake_case columns). Text values longer than
+EXPORT_CHUNK_BYTES are left null in the row and follow as chunk records,
+read with incremental blob I/O (Connection.blobopen, Python 3.11+; older
+versions read the same byte ranges with substr()); "offset" counts characters. The last line
+of each record carries a cursor: passing it back as `after` continues with
+the next record, so an interrupted download resumes where it stopped. A
+stream without the "end" line is incomplete. Cursors use SQLite rowids,
+which tools/reshard.py does not preserve; they are valid for one layout.
+"""
+import codecs
+import json
+import config
+from database import get_db
+from utils.helpers import now_iso
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+FORMAT_VERSION = 1
+# Everything a user owns, in export order
+TABLES = [
+    'notes', 'documents', 'books', 'reading_progress', 'papers', 'essays', 'error_questions', 'quotes',
+    'problem_sessions', 'brainstorm_sessions', 'relaxation_sessions', 'pomodoro_sessions', 'resource_searches',
+]
+BLOCK_BYTES = 64 * 1024
+
+
+class CursorError(ValueError):
+    pass
+
+
+def parse_cursor(cursor):
+    """(table index, rowid) to continue after; (0, 0) for None."""
+    if not cursor:
+        return 0, 0
+    table, _, rowid = cursor.partition(':')
+    if table not in TABLES or not rowid.isdigit():
+        raise CursorError(f'Invalid export cursor: {cursor}')
+    return TABLES.index(table), int(rowid)
+
+
+def export_user(user_id, after=None):
+    """Yield the user's export as NDJSON lines (bytes); raises CursorError up front for a bad cursor."""
+    start_table, start_rowid = parse_cursor(after)
+    return _records(user_id, after, start_table, start_rowid)
+
+
+def _records(user_id, after, start_table, start_rowid):
+    yield _line({'type': 'export', 'version': FORMAT_VERSION, 'userId': user_id, 'createdAt': now_iso(), 'after': after})
+    records = 0
+    db = get_db(user_id)
+    try:
+        for index in range(start_table, len(TABLES)):
+            table = TABLES[index]
+            for line in _table_records(db, table, user_id, start_rowid if index == start_table else 0):
+                if line is None:
+                    records += 1
+                else:
+                    yield line
+    finally:
+        db.close()
+    yield _line({'type': 'end', 'records': records})
+
+
+def _table_records(db, table, user_id, after_rowid):
+    """Lines of one table; yields None after each complete record, for counting."""
+    text_columns, other_columns = [], []
+    for column in db.execute(f'PRAGMA table_info({table})'):
+        (text_columns if column['type'].upper() == 'TEXT' else other_columns).append(column['name'])
+    # typeof() does not read the value, so no text is loaded until it is streamed below
+    select = ', '.join(['rowid AS "_rowid"'] + other_columns + [f'typeof({c}) AS "{c}"' for c in text_columns])
+    rows = db.execute(
+        f'SELECT {select} FROM {table} WHERE user_id = ? AND rowid > ? ORDER BY rowid',
+        (user_id, after_rowid)
+    )
+    for r in rows:
+        rowid = r['_rowid']
+        cursor = f'{table}:{rowid}'
+        row = {c: r[c] for c in other_columns}
+        chunked = {}
+        for c in text_columns:
+            if r[c] == 'null':
+                row[c] = None
+                continue
+            if r[c] != 'text':
+                row[c] = db.execute(f'SELECT {c} FROM {table} WHERE rowid = ?', (rowid,)).fetchone()[0]
+                continue
+            blob = _open_blob(db, table, c, rowid)
+            if len(blob) <= config.EXPORT_CHUNK_BYTES:
+                row[c] = blob.read().decode('utf-8')
+                blob.close()
+            else:
+                row[c] = None
+                chunked[c] = blob
+        if not chunked:
+            yield _line({'type': 'row', 'table': table, 'row': row, 'cursor': cursor})
+            yield None
+            continue
+
+        yield _line({'type': 'row', 'table': table, 'row': row, 'chunked': {c: len(b) for c, b in chunked.items()}})
+        fields = list(chunked.items())
+        for i, (column, blob) in enumerate(fields):
+            last_field = i == len(fields) - 1
+            for offset, data, last in _read_chunks(blob):
+                record = {'type': 'chunk', 'table': table, 'id': row.get('id'), 'field': column,
+                          'offset': offset, 'data': data}
+                if last and last_field:
+                    record['cursor'] = cursor
+                yield _line(record)
+            blob.close()
+        yield None
+
+
+def _open_blob(db, table, column, rowid):
+    if hasattr(db, 'blobopen'):
+        return db.blobopen(table, column, rowid, readonly=True)
+    return _SubstrBlob(db, table, column, rowid)
+
+
+class _SubstrBlob:
+    """The part of sqlite3.Blob that export reads, for Pythons without Connection.blobopen."""
+
+    def __init__(self, db, table, column, rowid):
+        self._db = db
+        self._select = f'SELECT substr(CAST({column} AS BLOB), ?, ?) FROM {table} WHERE rowid = ?'
+        self._rowid = rowid
+        self._length = db.execute(
+            f'SELECT length(CAST({column} AS BLOB)) FROM {table} WHERE rowid = ?', (rowid,)
+        ).fetchone()[0]
+        self._position = 0
+
+    def __len__(self):
+        return self._length
+
+    def read(self, length=-1):
+        if length < 0:
+            length = self._length - self._position
+        data = self._db.execute(self._select, (self._position + 1, length, self._rowid)).fetchone()[0] or b''
+        self._position += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def _read_chunks(blob):
+    """(character offset, text, is_last) for a UTF-8 blob, EXPORT_CHUNK_BYTES at a time."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remaining = len(blob)
+    offset = 0
+    while remaining > 0:
+        data = blob.read(min(config.EXPORT_CHUNK_BYTES, remaining))
+        remaining -= len(data)
+        # The decoder holds back a character split across reads until the next one
+        text = decoder.decode(data, final=remaining == 0)
+        yield offset, text, remaining == 0
+        offset += len(text)
+
+
+def blocks(lines, size=BLOCK_BYTES):
+    """Group lines into blocks of about `size` bytes, so compression and sockets see few large writes."""
+    buffer, buffered = [], 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _line(record):
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
@@ -0,0 +1,84 @@
+"""Extracted text cached by upload content hash (sha256 of the file + extension).
+
+Identical files uploaded again (by anyone) reuse the stored text instead of
+being parsed. Books hold a reference to the entry they were created from;
+entries nobody references are evicted once unused for
+EXTRACTION_CACHE_TTL_DAYS.
+
+The cache is shared by all users and lives on shard 0; book_sources rows live
+with their book, so the reference counts of books on other shards are updated
+through a separate connection.
+"""
+from datetime import datetime, timedelta
+import config
+from database import get_db, is_home
+from utils.helpers import now_iso
+from utils.file_parser import EXTRACTOR_VERSION
+
+
+def lookup(content_hash):
+    db = get_db()
+    row = db.execute(
+        'SELECT content FROM extraction_cache WHERE content_hash = ? AND extractor_version = ?',
+        (content_hash, EXTRACTOR_VERSION)
+    ).fetchone()
+    if row:
+        db.execute(
+            'UPDATE extraction_cache SET last_used_at = ? WHERE content_hash = ? AND extractor_version = ?',
+            (now_iso(), content_hash, EXTRACTOR_VERSION)
+        )
+        db.commit()
+    db.close()
+    return row['content'] if row else None
+
+
+def store(content_hash, content):
+    now = now_iso()
+    db = get_db()
+    db.execute(
+        'INSERT OR IGNORE INTO extraction_cache (content_hash, extractor_version, content, size, ref_count, created_at, last_used_at) VALUES (?,?,?,?,0,?,?)',
+        (content_hash, EXTRACTOR_VERSION, content, len(content or ''), now, now)
+    )
+    _prune(db)
+    db.commit()
+    db.close()
+
+
+def acquire(db, book_id, content_hash):
+    """Record that book_id was created from content_hash; call inside the book's insert transaction."""
+    db.execute(
+        'INSERT INTO book_sources (book_id, content_hash, extractor_version) VALUES (?,?,?)',
+        (book_id, content_hash, EXTRACTOR_VERSION)
+    )
+    _update_cache(
+        db, 'UPDATE extraction_cache SET ref_count = ref_count + 1 WHERE content_hash = ? AND extractor_version = ?',
+        (content_hash, EXTRACTOR_VERSION)
+    )
+
+
+def release(db, book_id):
+    """Drop book_id's reference; call inside the book's delete transaction."""
+    source = db.execute('SELECT content_hash, extractor_version FROM book_sources WHERE book_id = ?', (book_id,)).fetchone()
+    if not source:
+        return
+    db.execute('DELETE FROM book_sources WHERE book_id = ?', (book_id,))
+    _update_cache(
+        db, 'UPDATE extraction_cache SET ref_count = MAX(ref_count - 1, 0), last_used_at = ? WHERE content_hash = ? AND extractor_version = ?',
+        (now_iso(), source['content_hash'], source['extractor_version'])
+    )
+
+
+def _update_cache(db, sql, params):
+    if is_home(db):
+        db.execute(sql, params)
+        return
+    home = get_db()
+    home.execute(sql, params)
+    home.commit()
+    home.close()
+
+
+def _prune(db):
+    cutoff = (datetime.utcnow() - timedelta(days=config.EXTRACTION_CACHE_TTL_DAYS)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    db.execute('DELETE FROM extraction_cache WHERE ref_count = 0 AND last_used_at < ?', (cutoff,))
+    db.execute('DELETE FROM extraction_cache WHERE ref_count = 0 AND extractor_version != ?', (EXTRACTOR_VERSION,))
@@ -0,0 +1,284 @@
+"""Prometheus-style metrics.
+
+Every thread writes to its own shard of counters, so recording a sample never
+takes a lock; shards are only summed when /metrics is scraped.  Disable with
+METRICS_ENABLED=0, in which case the Flask hooks, the SQLite connection wrapper
+and the LLM instrumentation are not installed at all.  /metrics is served only
+when METRICS_TOKEN is set, to requests carrying it as a bearer token; the
+app usually sits behind a proxy on the same host, so the client address
+cannot tell local scrapers from the internet.
+"""
+import hmac
+import threading
+import time
+from flask import Response, g, has_request_context, request
+import config
+from utils.helpers import error_response
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+_local = threading.local()
+_shards = []  # (owning thread, shard dict)
+_retired = {}  # merged shards of threads that have exited
+_shards_lock = threading.Lock()
+
+
+def enabled():
+    return config.METRICS_ENABLED
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = {}
+        _local.shard = shard
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+            # Thread-per-request servers create a shard per request; fold dead ones in
+            if len(_shards) % 256 == 0:
+                _compact()
+    return shard
+
+
+def _merge(into, shard):
+    for key, value in shard.items():
+        if isinstance(value, list):
+            acc = into.setdefault(key, [0] * len(value))
+            for i, v in enumerate(value):
+                acc[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _compact():
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            _merge(_retired, shard)
+    _shards[:] = alive
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        shard = _shard()
+        key = (self.name, label_values)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self, snapshots):
+        totals = {}
+        for snap in snapshots:
+            for (name, label_values), value in snap.items():
+                if name == self.name:
+                    totals[label_values] = totals.get(label_values, 0) + value
+        kind = 'gauge' if isinstance(self, Gauge) else 'counter'
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {kind}']
+        for label_values, value in sorted(totals.items()):
+            lines.append(f'{self.name}{_fmt_labels(self.labels, label_values)} {_fmt_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        shard = _shard()
+        key = (self.name, label_values)
+        state = shard.get(key)
+        if state is None:
+            state = shard[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def collect(self, snapshots):
+        totals = {}
+        for snap in snapshots:
+            for (name, label_values), state in snap.items():
+                if name == self.name:
+                    acc = totals.setdefault(label_values, [0] * len(state))
+                    for i, v in enumerate(state):
+                        acc[i] += v
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, state in sorted(totals.items()):
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                labels = _fmt_labels(self.labels + ('le',), label_values + (_fmt_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            cumulative += state[len(self.buckets)]
+            labels = _fmt_labels(self.labels + ('le',), label_values + ('+Inf',))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            base = _fmt_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{base} {_fmt_value(state[-1])}')
+            lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+def _fmt_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _fmt_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+_registry = []
+
+http_requests = Counter('http_requests_total', 'HTTP requests handled', ('blueprint', 'endpoint', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency', ('blueprint', 'endpoint', 'method'))
+http_in_flight = Gauge('http_requests_in_flight', 'HTTP requests currently being served')
+sql_queries = Counter('sqlite_queries_total', 'SQLite statements executed', ('operation',))
+sql_latency = Histogram('sqlite_query_duration_seconds', 'SQLite statement latency', ('operation',), SQL_BUCKETS)
+llm_calls = Counter('llm_calls_total', 'LLM API calls', ('model', 'endpoint', 'error'))
+llm_latency = Histogram('llm_call_duration_seconds', 'LLM API call latency', ('model', 'endpoint'))
+llm_tokens = Counter('llm_tokens_total', 'LLM tokens consumed', ('model', 'endpoint', 'kind'))
+
+
+def render():
+    with _shards_lock:
+        _compact()
+        snapshot = {}
+        _merge(snapshot, _retired)
+        shards = [shard for _, shard in _shards]
+    for shard in shards:
+        # Live shards may gain keys while we copy; retry instead of locking writers
+        while True:
+            try:
+                items = list(shard.items())
+                break
+            except RuntimeError:
+                continue
+        _merge(snapshot, dict(items))
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect([snapshot]))
+    return '\n'.join(lines) + '\n'
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+# --- SQLite -----------------------------------------------------------------
+
+def _sql_operation(sql):
+    head = sql.lstrip()[:10].split(None, 1)
+    return head[0].upper() if head else 'OTHER'
+
+
+class InstrumentedConnection:
+    """Mixed into sqlite3.Connection by database.get_db when metrics are on."""
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _record_sql('SCRIPT', time.perf_counter() - start)
+
+
+def _record_sql(sql, elapsed):
+    op = _sql_operation(sql)
+    sql_queries.inc(op)
+    sql_latency.observe(elapsed, op)
+
+
+# --- LLM ----------------------------------------------------------------------
+
+def record_llm_call(model, elapsed, usage=None, error=None):
+    endpoint = current_endpoint()
+    llm_calls.inc(model, endpoint, error or '')
+    llm_latency.observe(elapsed, model, endpoint)
+    if usage is not None:
+        llm_tokens.inc(model, endpoint, 'prompt', amount=getattr(usage, 'prompt_tokens', 0) or 0)
+        llm_tokens.inc(model, endpoint, 'completion', amount=getattr(usage, 'completion_tokens', 0) or 0)
+
+
+# --- Flask --------------------------------------------------------------------
+
+def init_app(app):
+    if not enabled():
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        http_in_flight.inc()
+
+    @app.after_request
+    def _capture_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _observe_request(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        http_in_flight.dec()
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        blueprint = request.blueprint or ''
+        status = g.pop('_metrics_status', 500)
+        http_requests.inc(blueprint, endpoint, request.method, str(status))
+        http_latency.observe(elapsed, blueprint, endpoint, request.method)
+
+    @app.route('/metrics')
+    def metrics():
+        if not config.METRICS_TOKEN:
+            return error_response('Not found', 404)
+        if not _scrape_allowed():
+            return error_response('Forbidden', 403)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def _scrape_allowed():
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    return hmac.compare_digest(supplied, f'Bearer {config.METRICS_TOKEN}'.encode('utf-8'))
@@ -0,0 +1,208 @@
+"""Active pomodoro sessions, stored in pomodoro_sessions.
+
+Each user has at most one active session. Nothing is kept in memory: every
+lookup reads the table through a partial index over uncompleted rows, so
+every worker sees sessions started or completed by the others. Every change
+is pushed to the user's subscribers, which the SSE endpoint turns into
+start/complete/expire/tick events so other devices need not poll.
+
+A session nobody completes expires POMODORO_GRACE_MINUTES after its planned
+end: when it is next looked up, or when the sweeper checks the active rows
+every POMODORO_SWEEP_SECONDS. Only one process sweeps, the one holding an
+exclusive lock on a file next to the database; when it exits, another
+worker's sweeper takes the lock over at its next round.
+
+Subscriptions are per process. Under several gunicorn workers a user's
+devices only get each other's events when they reach the same worker (the
+next snapshot or tick corrects the others), so route /api/pomodoro with
+sticky sessions or serve it from a single worker.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import config
+from database import get_db, get_db_for, all_shards, shard_path
+from utils.helpers import gen_id, now_iso, row_to_dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process sweeps, fine for the single dev server
+    fcntl = None
+
+STATUS_ACTIVE = 0
+STATUS_COMPLETED = 1
+STATUS_EXPIRED = 2
+
+_log = logging.getLogger(__name__)
+_sweeper_lock = threading.Lock()
+_subscribers = defaultdict(list)  # user_id -> [queue.Queue]
+_subscribers_lock = threading.Lock()
+_sweeper = None
+
+
+def active(user_id):
+    """The user's active session row, or None."""
+    _ensure_sweeper()
+    db = get_db(user_id)
+    session = row_to_dict(db.execute(
+        'SELECT * FROM pomodoro_sessions WHERE user_id = ? AND completed = 0 ORDER BY created_at DESC LIMIT 1',
+        (user_id,)
+    ).fetchone())
+    db.close()
+    if session and deadline(session) < datetime.utcnow():
+        _expire([session])
+        return None
+    return session
+
+
+def start(user_id, task, duration):
+    """Start a session, expiring any session the user left running."""
+    previous = active(user_id)
+    if previous:
+        _expire([previous], at=datetime.utcnow())
+
+    session_id = gen_id(user_id)
+    db = get_db(user_id)
+    db.execute(
+        'INSERT INTO pomodoro_sessions (id, user_id, task, duration, start_time) VALUES (?, ?, ?, ?, ?)',
+        (session_id, user_id, task, duration, now_iso())
+    )
+    db.commit()
+    session = row_to_dict(db.execute('SELECT * FROM pomodoro_sessions WHERE id = ?', (session_id,)).fetchone())
+    db.close()
+    publish(user_id, 'start', session)
+    return session
+
+
+def complete(session_id):
+    """Mark a session completed; returns the updated row or None if it does not exist."""
+    db = get_db_for('pomodoro_sessions', session_id)
+    db.execute(
+        'UPDATE pomodoro_sessions SET completed = ?, end_time = ? WHERE id = ?',
+        (STATUS_COMPLETED, now_iso(), session_id)
+    )
+    db.commit()
+    session = row_to_dict(db.execute('SELECT * FROM pomodoro_sessions WHERE id = ?', (session_id,)).fetchone())
+    db.close()
+    if not session:
+        return None
+    publish(session['user_id'], 'complete', session)
+    return session
+
+
+def deadline(session):
+    """When an uncompleted session expires."""
+    started = datetime.strptime(session['start_time'], '%Y-%m-%dT%H:%M:%S.%fZ')
+    return started + timedelta(minutes=session['duration'] + config.POMODORO_GRACE_MINUTES)
+
+
+def remaining_seconds(session):
+    started = datetime.strptime(session['start_time'], '%Y-%m-%dT%H:%M:%S.%fZ')
+    end = started + timedelta(minutes=session['duration'])
+    return max(0, int((end - datetime.utcnow()).total_seconds()))
+
+
+def sweep():
+    """Expire every active session past its deadline; returns how many were expired.
+
+    A row that cannot be read or expired is logged and skipped, so it does not
+    keep the others from expiring.
+    """
+    now = datetime.utcnow()
+    expired = 0
+    for db in all_shards():
+        try:
+            rows = db.execute('SELECT * FROM pomodoro_sessions WHERE completed = 0').fetchall()
+        finally:
+            db.close()
+        for row in rows:
+            try:
+                if deadline(row) < now:
+                    _expire([row_to_dict(row)])
+                    expired += 1
+            except Exception:
+                _log.exception('Could not expire pomodoro session %s', row['id'])
+    return expired
+
+
+def _expire(sessions, at=None):
+    for session in sessions:
+        end = (at or deadline(session)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        db = get_db(session['user_id'])
+        db.execute(
+            'UPDATE pomodoro_sessions SET completed = ?, end_time = ? WHERE id = ? AND completed = ?',
+            (STATUS_EXPIRED, end, session['id'], STATUS_ACTIVE)
+        )
+        db.commit()
+        db.close()
+        session.update(completed=STATUS_EXPIRED, end_time=end)
+        publish(session['user_id'], 'expire', session)
+
+
+# --- Subscriptions ----------------------------------------------------------------
+
+def subscribe(user_id):
+    q = queue.Queue(maxsize=100)
+    with _subscribers_lock:
+        _subscribers[user_id].append(q)
+    return q
+
+
+def unsubscribe(user_id, q):
+    with _subscribers_lock:
+        subscribers = _subscribers.get(user_id, [])
+        if q in subscribers:
+            subscribers.remove(q)
+        if not subscribers:
+            _subscribers.pop(user_id, None)
+
+
+def publish(user_id, event, session):
+    with _subscribers_lock:
+        subscribers = list(_subscribers.get(user_id, []))
+    for q in subscribers:
+        try:
+            q.put_nowait((event, session))
+        except queue.Full:
+            pass  # a stalled client just misses events; it gets a fresh snapshot on reconnect
+
+
+# --- Expiry sweeper ---------------------------------------------------------------
+
+def _ensure_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            # Started lazily so a preloading gunicorn master does not own it
+            _sweeper = threading.Thread(target=_sweep_forever, name='pomodoro-sweeper', daemon=True)
+            _sweeper.start()
+
+
+def _sweep_forever():
+    lock = None
+    while True:
+        if lock is None:
+            lock = _claim_sweeping()
+        if lock is not None:
+            try:
+                sweep()
+            except Exception:
+                _log.exception('Pomodoro sweep failed')
+        time.sleep(config.POMODORO_SWEEP_SECONDS)
+
+
+def _claim_sweeping():
+    """The open lock file if this process is now the one that sweeps, else None; kept open while it lives."""
+    f = open(shard_path(0) + '.sweep.lock', 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+    return f
@@ -0,0 +1,304 @@
+"""On-demand sampling profiler for single requests.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked at random with probability PROFILE_SAMPLE_RATE (at most one sampled
+request at a time per process; header requests always run). While it runs,
+a sampler thread reads the request thread's Python stack every
+PROFILE_INTERVAL_MS and charges the time since its previous look to that
+stack and to one category, from the innermost frame that decides it:
+
+    llm     ai_service._chat_completion or the openai / httpx client under it
+    sql     a sqlite3 call: execute, executemany, fetch*, commit
+    json    json / flask.json / utils.json_provider encoding or decoding
+    wait    blocked on another thread (futures, locks, queues)
+    python  everything else
+
+When the request is torn down, PROFILE_DIR gets <id>.collapsed, one
+"frame;frame;... microseconds" line per stack (flamegraph.pl, speedscope and
+inferno read it), and <id>.json, a summary with the time per category and the
+hottest functions; the response carries `X-Profile-Id: <id>`. Streamed
+bodies are produced after teardown and are not in the profile.
+
+sqlite3 runs statements in C, where a sampler only sees the Python line that
+called it, so while the profiler is configured database.connect() makes
+connections whose execute / fetch methods are Python frames (iterating a
+cursor directly is still charged to the loop). With neither PROFILE_TOKEN nor
+PROFILE_SAMPLE_RATE set nothing is installed: no request hooks, no connection
+class, no sampler thread.
+"""
+import concurrent.futures
+import hmac
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import g, request
+import config
+from utils.helpers import now_iso
+
+HEADER = 'X-Profile'
+CATEGORIES = ('sql', 'json', 'llm', 'wait', 'python')
+TOP_FUNCTIONS = 25
+
+_sampled_lock = threading.Lock()
+_sampled_running = False
+
+
+def enabled():
+    return bool(config.PROFILE_TOKEN) or config.PROFILE_SAMPLE_RATE > 0
+
+
+# --- SQLite -----------------------------------------------------------------------
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return super().executemany(sql, *args)
+
+    def fetchone(self):
+        return super().fetchone()
+
+    def fetchmany(self, *args):
+        return super().fetchmany(*args)
+
+    def fetchall(self):
+        return super().fetchall()
+
+
+class ProfiledConnection:
+    """Mixed into sqlite3.Connection by database.connect when the profiler is on."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute does not go through cursor(), so route it there
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, script):
+        return super().executescript(script)
+
+    def commit(self):
+        return super().commit()
+
+
+# --- Sampling -----------------------------------------------------------------------
+
+def _classify(code):
+    """Category a frame running `code` decides, or None."""
+    try:
+        return _categories[code]
+    except KeyError:
+        pass
+    filename = code.co_filename
+    category = None
+    if code.co_name == '_chat_completion' and filename.endswith('ai_service.py') or \
+            any(f'{os.sep}{lib}{os.sep}' in filename for lib in ('openai', 'httpx', 'httpcore')):
+        category = 'llm'
+    elif code in _SQL_CODES or filename.startswith(_SQLITE_DIR):
+        category = 'sql'
+    elif filename.startswith(_JSON_DIR) or filename.endswith(os.path.join('utils', 'json_provider.py')) or \
+            f'{os.sep}flask{os.sep}json{os.sep}' in filename:
+        category = 'json'
+    elif filename.startswith(_FUTURES_DIR) or os.path.basename(filename) in ('threading.py', 'queue.py'):
+        category = 'wait'
+    _categories[code] = category
+    return category
+
+
+def _stack(frame):
+    """(codes root first, category) of the stack ending in frame."""
+    codes = []
+    category = None
+    leaf = True
+    while frame is not None:
+        code = frame.f_code
+        codes.append(code)
+        if category is None:
+            found = _classify(code)
+            # "wait" only counts where the thread is actually blocked, not for the
+            # threading frames every worker thread starts from
+            if found and (found != 'wait' or leaf):
+                category = found
+        leaf = False
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes), category or 'python'
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # (codes, category) -> microseconds
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            self.stacks[_stack(frame)] += int((now - last) * 1e6)
+            self.samples += 1
+            last = now
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# --- Output ---------------------------------------------------------------------------
+
+def _frame_name(code):
+    return f'{getattr(code, "co_qualname", code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _trim(codes):
+    """Drop the server and thread frames below Flask.wsgi_app."""
+    for i, code in enumerate(codes):
+        if code.co_name == 'wsgi_app' and f'{os.sep}flask{os.sep}' in code.co_filename:
+            return codes[i:]
+    return codes
+
+
+def _collapsed(root, stacks):
+    lines = Counter()
+    for (codes, _), micros in stacks.items():
+        lines[';'.join([root] + [_frame_name(c) for c in _trim(codes)])] += micros
+    return ''.join(f'{stack} {micros}\n' for stack, micros in sorted(lines.items()))
+
+
+def _summary(stacks, wall):
+    sampled = sum(stacks.values())
+    by_category = Counter()
+    self_time = Counter()
+    total_time = Counter()
+    for (codes, category), micros in stacks.items():
+        by_category[category] += micros
+        if codes:
+            self_time[codes[-1]] += micros
+        for code in set(codes):
+            total_time[code] += micros
+    return {
+        'wallMs': round(wall * 1000, 2),
+        'sampledMs': round(sampled / 1000, 2),
+        'categories': {
+            c: {'ms': round(by_category[c] / 1000, 2), 'share': round(by_category[c] / sampled, 3) if sampled else 0}
+            for c in CATEGORIES
+        },
+        'topFunctions': [
+            {'function': _frame_name(code), 'selfMs': round(micros / 1000, 2),
+             'totalMs': round(total_time[code] / 1000, 2)}
+            for code, micros in self_time.most_common(TOP_FUNCTIONS)
+        ],
+    }
+
+
+def _write(profile_id, collapsed, summary):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    base = os.path.join(config.PROFILE_DIR, profile_id)
+    with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+        f.write(collapsed)
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    _prune()
+
+
+def _prune():
+    # Ids start with a timestamp, so name order is age order
+    names = sorted(n[:-len('.json')] for n in os.listdir(config.PROFILE_DIR) if n.endswith('.json'))
+    for name in names[:max(0, len(names) - config.PROFILE_KEEP)]:
+        for ext in ('.json', '.collapsed'):
+            try:
+                os.remove(os.path.join(config.PROFILE_DIR, name + ext))
+            except FileNotFoundError:
+                pass
+
+
+# --- Flask --------------------------------------------------------------------------
+
+def _trigger():
+    global _sampled_running
+    token = request.headers.get(HEADER)
+    if token and config.PROFILE_TOKEN and hmac.compare_digest(token, config.PROFILE_TOKEN):
+        return 'header'
+    if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        with _sampled_lock:
+            if not _sampled_running:
+                _sampled_running = True
+                return 'sample'
+    return None
+
+
+def init_app(app):
+    if not enabled():
+        return
+
+    @app.before_request
+    def _start_profile():
+        trigger = _trigger()
+        if trigger is None:
+            return
+        sampler = _Sampler(threading.get_ident(), config.PROFILE_INTERVAL_MS / 1000)
+        endpoint = request.endpoint or 'unmatched'
+        g._profile = {
+            'id': f'{time.strftime("%Y%m%dT%H%M%S")}-{endpoint}-{uuid.uuid4().hex[:6]}',
+            'trigger': trigger, 'endpoint': endpoint, 'startedAt': now_iso(),
+            'start': time.perf_counter(), 'sampler': sampler,
+        }
+        sampler.start()
+
+    @app.after_request
+    def _profile_header(response):
+        profile = g.get('_profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+            response.headers['X-Profile-Id'] = profile['id']
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        global _sampled_running
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        sampler = profile['sampler']
+        sampler.stop()
+        wall = time.perf_counter() - profile['start']
+        if profile['trigger'] == 'sample':
+            with _sampled_lock:
+                _sampled_running = False
+        summary = {
+            'id': profile['id'], 'method': request.method, 'path': request.path,
+            'endpoint': profile['endpoint'], 'status': profile.get('status', 500),
+            'trigger': profile['trigger'], 'startedAt': profile['startedAt'],
+            'intervalMs': config.PROFILE_INTERVAL_MS, 'samples': sampler.samples,
+            **_summary(sampler.stacks, wall),
+        }
+        try:
+            _write(profile['id'], _collapsed(f'{request.method} {profile["endpoint"]}', sampler.stacks), summary)
+        except OSError as e:
+            app.logger.warning('Could not write profile %s: %s', profile['id'], e)
+
+
+_categories = {}
+_SQL_CODES = {
+    f.__code__ for cls in (ProfiledCursor, ProfiledConnection) for f in vars(cls).values() if callable(f)
+}
+_SQLITE_DIR = os.path.dirname(sqlite3.__file__) + os.sep
+_JSON_DIR = os.path.dirname(json.__file__) + os.sep
+_FUTURES_DIR = os.path.dirname(concurrent.futures.__file__) + os.sep
@@ -0,0 +1,159 @@
+"""Near-duplicate index and clusters over each user's error questions.
+
+Every error question gets a MinHash signature (utils/similarity.py) in
+error_question_index and its LSH band keys in error_question_bands, both on
+the user's shard next to the question. A new question looks up the user's
+questions sharing a band key, keeps those with estimated similarity of at
+least ERROR_CLUSTER_SIMILARITY, and joins their cluster; when they belong to
+several clusters those are merged into the largest (single-link
+clustering). A question with no such neighbour starts a cluster of its own.
+Lookups go through the (user_id, band, value) primary key and compare at
+most MAX_CANDIDATES questions, so their cost does not grow with the table.
+
+Single inserts index their question in the same transaction; bulk imports
+schedule() it in the background, because at about 0.3ms per question the
+index would cost many times the import itself. The index is derived data:
+ensure_indexed() adds whatever is missing (bulk imports still in progress,
+rows from before the index existed, rows written by tools) and runs before
+clusters are read. Deleting a question never splits its cluster.
+"""
+import config
+from database import get_db
+from services import tasks
+from utils import similarity
+
+# Questions compared per lookup. Members of one cluster are near-copies of each
+# other, so a sample finds the clusters; this keeps a lookup's cost bounded when
+# a user has thousands of questions of one kind.
+MAX_CANDIDATES = 50
+
+
+def add(db, questions):
+    """Index [(question_id, user_id, question text)]; call inside the transaction that inserts them."""
+    for question_id, user_id, text in questions:
+        sig = similarity.signature(text)
+        cluster = question_id
+        if sig is not None:
+            keys = similarity.band_keys(sig)
+            neighbours = _similar_clusters(db, user_id, sig, keys)
+            if neighbours:
+                cluster = _merge(db, user_id, neighbours)
+        db.execute(
+            'INSERT OR REPLACE INTO error_question_index (question_id, user_id, signature, cluster_id) VALUES (?,?,?,?)',
+            (question_id, user_id, similarity.pack(sig) if sig else None, cluster)
+        )
+        if sig is not None:
+            db.executemany(
+                'INSERT OR IGNORE INTO error_question_bands (user_id, band, value, question_id) VALUES (?,?,?,?)',
+                [(user_id, band, value, question_id) for band, value in keys]
+            )
+
+
+def remove(db, question_id):
+    """Drop question_id from the index; call inside the transaction that deletes it."""
+    row = db.execute('SELECT user_id, signature FROM error_question_index WHERE question_id = ?', (question_id,)).fetchone()
+    if not row:
+        return
+    db.execute('DELETE FROM error_question_index WHERE question_id = ?', (question_id,))
+    if row['signature']:
+        db.executemany(
+            'DELETE FROM error_question_bands WHERE user_id = ? AND band = ? AND value = ? AND question_id = ?',
+            [(row['user_id'], band, value, question_id)
+             for band, value in similarity.band_keys(similarity.unpack(row['signature']))]
+        )
+
+
+def ensure_indexed(db, user_id):
+    """Index the user's questions that are not in the index yet; returns how many were added."""
+    missing = db.execute(
+        'SELECT e.id, e.question FROM error_questions e LEFT JOIN error_question_index i ON i.question_id = e.id '
+        'WHERE e.user_id = ? AND i.question_id IS NULL ORDER BY e.created_at',
+        (user_id,)
+    ).fetchall()
+    if missing:
+        with db:
+            add(db, [(r['id'], user_id, r['question']) for r in missing])
+    return len(missing)
+
+
+def schedule(user_id):
+    """Index the user's new questions in the background (after a bulk import); returns the job id."""
+    return tasks.submit('error_question_index', _index_user, user_id)
+
+
+def _index_user(job_id, user_id):
+    db = get_db(user_id)
+    try:
+        tasks.update(job_id, total=ensure_indexed(db, user_id))
+    finally:
+        db.close()
+
+
+def clusters(db, user_id, order='largest', limit=None, offset=0):
+    """The user's clusters, largest first or weakest (lowest average mastery) first.
+
+    Each is {'cluster_id', 'size', 'average_mastery', 'last_error_at', 'representative'};
+    the representative is the error_questions row the user has mastered least, newest first.
+    One query: window functions size up each cluster and rank its members.
+    """
+    if order == 'weakest':
+        order_by = 'c_avg_mastery ASC, c_size DESC, c_last_error_at DESC, c_cluster_id'
+    else:
+        order_by = 'c_size DESC, c_avg_mastery ASC, c_last_error_at DESC, c_cluster_id'
+    sql = (
+        'SELECT * FROM (SELECT e.*, i.cluster_id AS c_cluster_id, COUNT(*) OVER w AS c_size, '
+        'AVG(COALESCE(e.mastery_level, 0)) OVER w AS c_avg_mastery, MAX(e.created_at) OVER w AS c_last_error_at, '
+        'ROW_NUMBER() OVER (w ORDER BY COALESCE(e.mastery_level, 0), e.created_at DESC) AS c_rank '
+        'FROM error_question_index i JOIN error_questions e ON e.id = i.question_id WHERE i.user_id = ? '
+        f'WINDOW w AS (PARTITION BY i.cluster_id)) WHERE c_rank = 1 ORDER BY {order_by}'
+    )
+    params = [user_id]
+    if limit:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [limit, offset]
+    result = []
+    for r in db.execute(sql, params).fetchall():
+        representative = {k: r[k] for k in r.keys() if not k.startswith('c_')}
+        result.append({
+            'cluster_id': r['c_cluster_id'],
+            'size': r['c_size'],
+            'average_mastery': r['c_avg_mastery'] or 0,
+            'last_error_at': r['c_last_error_at'],
+            'representative': representative,
+        })
+    return result
+
+
+def _similar_clusters(db, user_id, sig, keys):
+    candidates = db.execute(
+        'SELECT DISTINCT i.question_id, i.signature, i.cluster_id FROM error_question_bands b '
+        'JOIN error_question_index i ON i.question_id = b.question_id WHERE '
+        # user_id repeated in every term, so each one is a primary key lookup
+        + ' OR '.join(['(b.user_id = ? AND b.band = ? AND b.value = ?)'] * len(keys)) + ' LIMIT ?',
+        [v for band, value in keys for v in (user_id, band, value)] + [MAX_CANDIDATES]
+    ).fetchall()
+    found = set()
+    for c in candidates:
+        # One similar member is enough to join a cluster
+        if c['cluster_id'] not in found and \
+                similarity.similarity(sig, similarity.unpack(c['signature'])) >= config.ERROR_CLUSTER_SIMILARITY:
+            found.add(c['cluster_id'])
+    return found
+
+
+def _merge(db, user_id, cluster_ids):
+    """Fold cluster_ids into the largest of them and return its id."""
+    if len(cluster_ids) == 1:
+        return next(iter(cluster_ids))
+    marks = ','.join('?' * len(cluster_ids))
+    sizes = db.execute(
+        f'SELECT cluster_id, COUNT(*) AS size FROM error_question_index WHERE user_id = ? AND cluster_id IN ({marks}) '
+        'GROUP BY cluster_id ORDER BY size DESC, cluster_id',
+        [user_id, *cluster_ids]
+    ).fetchall()
+    target = sizes[0]['cluster_id']
+    db.execute(
+        f'UPDATE error_question_index SET cluster_id = ? WHERE user_id = ? AND cluster_id IN ({marks})',
+        [target, user_id, *cluster_ids]
+    )
+    return target
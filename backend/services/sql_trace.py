@@ -0,0 +1,273 @@
+"""SQL tracing: slow-query log, per-request query count and time, query budgets.
+
+With SQL_TRACE on, database.connect() hands every connection to install().
+sqlite3's trace callback reports each statement as SQLite starts it (the
+BEGIN / COMMIT of `with db:`, every row of an executemany and every
+statement of a script included), and the progress handler, called every
+SQL_TRACE_PROGRESS_OPS virtual machine instructions, stamps the time the
+statement was last seen running; TracedConnection adds a stamp when
+execute() and commit() return. A statement lasts from its start to its last
+stamp, which includes the rows fetchall() and iteration step through, lock
+waits and commits.
+
+- Statements running SLOW_QUERY_MS or longer are appended to SLOW_QUERY_LOG
+  as JSON lines with their normalized SQL (literals replaced by ?, IN lists
+  and repeated OR terms folded), the endpoint and EXPLAIN QUERY PLAN, which
+  runs on a separate read-only connection once per normalized statement.
+- A request's queries (statements other than transaction control and
+  PRAGMA) and their time are sent back in a Server-Timing header and, with
+  metrics on, observed per endpoint.
+- @query_budget(n) declares how many queries a route may run. A request over
+  budget raises QueryBudgetExceeded in testing apps (app.testing) and is
+  logged as a warning elsewhere. Queries run inside bookkeeping() (LLM usage
+  accounting) are reported but not charged to the budget.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+import config
+from services import metrics
+from utils.helpers import now_iso
+
+_NOT_QUERIES = ('BEGIN', 'COMMIT', 'END', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA')
+_PLANS_MAX = 1000
+
+_plans = {}  # normalized SQL -> plan lines
+_log_lock = threading.Lock()
+
+sql_queries_per_request = metrics.Histogram(
+    'http_request_sql_queries', 'SQLite queries per HTTP request', ('blueprint', 'endpoint'),
+    (1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250, 1000)
+)
+sql_seconds_per_request = metrics.Histogram(
+    'http_request_sql_seconds', 'SQLite time per HTTP request', ('blueprint', 'endpoint'), metrics.SQL_BUCKETS
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def enabled():
+    return config.SQL_TRACE
+
+
+def query_budget(limit):
+    """Declare that a view runs at most `limit` queries; put it below @bp.route."""
+    def decorate(view):
+        view.query_budget = limit
+        return view
+    return decorate
+
+
+@contextmanager
+def bookkeeping():
+    """Leave the queries run inside out of the request's query budget."""
+    state = g.get('_sql_trace') if has_request_context() else None
+    if state is not None:
+        state['bookkeeping_depth'] += 1
+    try:
+        yield
+    finally:
+        if state is not None:
+            state['bookkeeping_depth'] -= 1
+
+
+# --- Normalizing --------------------------------------------------------------------
+
+_BLOB = re.compile(r"\b[xX]'[0-9a-fA-F]*'")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_SPACE = re.compile(r'\s+')
+_LIST = re.compile(r'\(\?(?:, ?\?)+\)')
+_ROWS = re.compile(r'(\(\?(?:, \.\.\.)?\))(?:, ?\(\?(?:, \.\.\.)?\))+')
+_REPEATED = re.compile(r'(\([^()]*\))(?: OR \1)+')
+
+
+def normalize(sql):
+    """sql with its literals replaced by ? and lists of them folded, so runs of one statement group together."""
+    sql = _BLOB.sub('?', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip().rstrip(';')
+    sql = _LIST.sub('(?, ...)', sql)
+    sql = _ROWS.sub(r'\1, ...', sql)
+    return _REPEATED.sub(r'\1 OR ...', sql)
+
+
+def is_query(sql):
+    head = sql.lstrip()[:10].split(None, 1)
+    return bool(head) and head[0].upper() not in _NOT_QUERIES
+
+
+# --- Tracing ---------------------------------------------------------------------------
+
+class _Trace:
+    """The statement a connection is running, fed by its trace and progress callbacks."""
+
+    __slots__ = ('path', 'sql', 'start', 'last', 'request', 'many', '__weakref__')
+
+    def __init__(self, path):
+        self.path = path
+        self.sql = None
+        self.start = self.last = 0.0
+        self.request = None
+        self.many = False  # inside executemany(), where a statement legitimately repeats
+
+    def statement(self, sql):
+        # Trigger bodies are part of the statement that fired them. SQLite reports
+        # them as '-- TRIGGER ...', Python's sqlite3 with the firing statement's text
+        if sql.startswith('--') or (sql == self.sql and not self.many):
+            return
+        now = time.perf_counter()
+        self.finish()
+        self.sql = sql
+        self.start = self.last = now
+        self.request = g.get('_sql_trace') if has_request_context() else None
+        if self.request is not None and is_query(sql):
+            self.request['queries'] += 1
+            if self.request['bookkeeping_depth']:
+                self.request['bookkeeping'] += 1
+
+    def progress(self):
+        self.last = time.perf_counter()
+        return 0
+
+    def finish(self):
+        if self.sql is None:
+            return
+        sql, elapsed, req = self.sql, self.last - self.start, self.request
+        self.sql = self.request = None
+        if req is not None:
+            req['seconds'] += elapsed
+        if elapsed * 1000 >= config.SLOW_QUERY_MS:
+            _log_slow(self.path, sql, elapsed, req['endpoint'] if req else 'background')
+
+
+class TracedConnection:
+    """Mixed into sqlite3.Connection by database.connect when tracing is on.
+
+    Stamps the end of execute() and friends, which covers what the progress
+    handler cannot see: statements too short to reach a stamp, and time spent
+    waiting for a lock or syncing a commit.
+    """
+
+    def execute(self, sql, *args):
+        # The previous statement is over; the same text run again is a new query
+        self._trace.finish()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            self._trace.last = time.perf_counter()
+
+    def executemany(self, sql, *args):
+        self._trace.finish()
+        self._trace.many = True
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            self._trace.many = False
+            self._trace.last = time.perf_counter()
+
+    def executescript(self, script):
+        try:
+            return super().executescript(script)
+        finally:
+            self._trace.last = time.perf_counter()
+
+    def commit(self):
+        try:
+            return super().commit()
+        finally:
+            self._trace.last = time.perf_counter()
+
+    def __exit__(self, *exc):
+        try:
+            return super().__exit__(*exc)
+        finally:
+            self._trace.last = time.perf_counter()
+
+
+def install(conn, path):
+    """Trace conn's statements; path is the database file, for query plans."""
+    trace = conn._trace = _Trace(path)
+    conn.set_trace_callback(trace.statement)
+    conn.set_progress_handler(trace.progress, config.SQL_TRACE_PROGRESS_OPS)
+    if has_request_context() and '_sql_trace' in g:
+        g._sql_trace['traces'].append(weakref.ref(trace))
+    # The last statement of a connection ends when the connection goes away
+    weakref.finalize(conn, trace.finish)
+
+
+def _plan(path, sql, normalized):
+    if normalized not in _plans:
+        if len(_plans) >= _PLANS_MAX:
+            _plans.clear()
+        try:
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                _plans[normalized] = [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            _plans[normalized] = [f'unavailable: {e}']
+    return _plans[normalized]
+
+
+def _log_slow(path, sql, elapsed, endpoint):
+    normalized = normalize(sql)
+    entry = {
+        'at': now_iso(), 'ms': round(elapsed * 1000, 2), 'endpoint': endpoint,
+        'sql': normalized, 'plan': _plan(path, sql, normalized) if is_query(sql) else [],
+    }
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    try:
+        with _log_lock:
+            with open(config.SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError:
+        pass  # the log is best effort; a full disk must not fail the request
+
+
+# --- Flask --------------------------------------------------------------------------
+
+def init_app(app):
+    if not enabled():
+        return
+
+    @app.before_request
+    def _start_request_trace():
+        g._sql_trace = {
+            'queries': 0, 'bookkeeping': 0, 'bookkeeping_depth': 0, 'seconds': 0.0, 'traces': [],
+            'endpoint': request.endpoint or 'unmatched',
+        }
+
+    @app.after_request
+    def _report_request_trace(response):
+        state = g.pop('_sql_trace', None)
+        if state is None:
+            return response
+        for ref in state['traces']:
+            trace = ref()
+            if trace is not None:
+                trace.finish()
+        queries, seconds = state['queries'], state['seconds']
+        response.headers.add('Server-Timing', f'sql;dur={seconds * 1000:.2f};desc="{queries} queries"')
+        if metrics.enabled():
+            sql_queries_per_request.observe(queries, request.blueprint or '', state['endpoint'])
+            sql_seconds_per_request.observe(seconds, request.blueprint or '', state['endpoint'])
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        charged = queries - state['bookkeeping']
+        if budget is not None and charged > budget:
+            message = f'{state["endpoint"]} ran {charged} queries, budget {budget}'
+            if current_app.testing:
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+        return response
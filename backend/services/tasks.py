@@ -0,0 +1,94 @@
+"""Background jobs that run off the request path.
+
+A small shared thread pool plus an in-process registry of job status, so
+endpoints can enqueue work (book enrichment, batch grading, ...) and expose
+its progress.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import config
+from utils.helpers import gen_id, now_iso
+
+JOB_RETENTION_SECONDS = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.BACKGROUND_WORKERS, thread_name_prefix='task')
+    return _executor
+
+
+def submit(kind, fn, *args, **kwargs):
+    """Run fn(job_id, *args, **kwargs) in the background and return the job id."""
+    job_id = _register(kind, gen_id(), 'queued')
+    _get_executor().submit(_run, job_id, fn, args, kwargs)
+    return job_id
+
+
+def track(kind, job_id=None):
+    """Register a job that the caller runs itself (e.g. inside a request) so its progress can be polled."""
+    return _register(kind, job_id or gen_id(), 'running')
+
+
+def _register(kind, job_id, status):
+    with _jobs_lock:
+        _prune()
+        _jobs[job_id] = {
+            'id': job_id, 'kind': kind, 'status': status,
+            'done': 0, 'total': 0, 'error': None,
+            'createdAt': now_iso(), 'finishedAt': None, '_finished': None,
+        }
+    return job_id
+
+
+def finish(job_id, error=None):
+    update(job_id, status='failed' if error else 'completed', error=error, finishedAt=now_iso(), _finished=time.time())
+
+
+def _run(job_id, fn, args, kwargs):
+    update(job_id, status='running')
+    try:
+        fn(job_id, *args, **kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        finish(job_id, f'{type(e).__name__}: {e}')
+    else:
+        finish(job_id)
+
+
+def update(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def advance(job_id, amount=1):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job['done'] += amount
+
+
+def get(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+
+def _prune():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job['_finished'] and job['_finished'] < cutoff]:
+        del _jobs[job_id]
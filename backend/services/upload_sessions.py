@@ -0,0 +1,269 @@
+"""Resumable chunked uploads.
+
+A client creates a session with the file's name and size, PUTs the bytes in
+chunks (any order, any size up to UPLOAD_CHUNK_MAX_BYTES, retried freely),
+asks which ranges have arrived, and completes the session once everything is
+there. Chunks are streamed straight into a preallocated .part file, so memory
+use does not depend on the file size; the completed file is then handed to
+the normal upload flow of the owning blueprint.
+
+Completing claims the session first, so of two concurrent completes only one
+assembles and ingests the file, and the session is removed only once the
+ingest succeeded. Chunk writes hold a shared lock on the .part file and
+completing an exclusive one, so a chunk is either fully written and recorded
+before the file is hashed or refused without touching it.
+"""
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import config
+from database import get_db
+from utils.helpers import gen_id, now_iso, row_to_dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, fine for the single dev server
+    fcntl = None
+
+PARTIAL_FOLDER = os.path.join(config.UPLOAD_FOLDER, 'partial')
+COPY_BLOCK = 1 << 20
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def create(kind, filename, size, sha256=None, meta=None):
+    if not isinstance(size, int) or size < 0:
+        raise UploadError('size must be a non-negative integer')
+    if size > config.UPLOAD_MAX_BYTES:
+        raise UploadError(f'File too large (max {config.UPLOAD_MAX_BYTES} bytes)', 413)
+
+    upload_id = gen_id()
+    os.makedirs(PARTIAL_FOLDER, exist_ok=True)
+    with open(_part_path(upload_id), 'wb') as f:
+        f.truncate(size)  # sparse; chunks are written in place
+
+    now = now_iso()
+    db = get_db()
+    _prune(db)
+    db.execute(
+        'INSERT INTO upload_sessions (id, kind, filename, size, sha256, meta, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?)',
+        (upload_id, kind, filename, size, (sha256 or '').lower() or None, json.dumps(meta or {}, ensure_ascii=False), now, now)
+    )
+    db.commit()
+    db.close()
+    return get(upload_id, kind)
+
+
+def get(upload_id, kind):
+    """Return the session with its received ranges, or None."""
+    db = get_db()
+    session = row_to_dict(db.execute('SELECT * FROM upload_sessions WHERE id = ? AND kind = ?', (upload_id, kind)).fetchone())
+    chunks = db.execute(
+        'SELECT start_offset, end_offset FROM upload_chunks WHERE upload_id = ? ORDER BY start_offset', (upload_id,)
+    ).fetchall() if session else []
+    db.close()
+    if not session:
+        return None
+    session['meta'] = json.loads(session['meta'] or '{}')
+    session['ranges'] = _merge([(c['start_offset'], c['end_offset']) for c in chunks])
+    return session
+
+
+def write_chunk(session, offset, length, stream, checksum):
+    """Write length bytes from stream at offset, verifying their sha256 against checksum."""
+    if not checksum:
+        raise UploadError('Missing X-Chunk-Sha256 header')
+    if length is None or length <= 0:
+        raise UploadError('Missing chunk body or Content-Length')
+    if length > config.UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(f'Chunk too large (max {config.UPLOAD_CHUNK_MAX_BYTES} bytes)', 413)
+    if offset < 0 or offset + length > session['size']:
+        raise UploadError('Chunk lies outside the file', 416)
+
+    # A bad or short chunk may leave garbage in the file; it is simply not
+    # recorded as received, so the client's retry overwrites it.
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        f = open(_part_path(session['id']), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload is being completed', 409)
+    with f:
+        _lock(f, shared=True)
+        # Checked under the lock: once completing holds it, the status is no longer open
+        if _status(session['id']) != 'open':
+            raise UploadError('Upload is being completed', 409)
+        f.seek(offset)
+        while written < length:
+            block = stream.read(min(COPY_BLOCK, length - written))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            written += len(block)
+        if written != length:
+            raise UploadError('Chunk body shorter than Content-Length')
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError('Chunk checksum mismatch', 422)
+
+        db = get_db()
+        recorded = db.execute(
+            'INSERT OR REPLACE INTO upload_chunks (upload_id, start_offset, end_offset) '
+            "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM upload_sessions WHERE id = ? AND status = 'open')",
+            (session['id'], offset, offset + length, session['id'])
+        ).rowcount
+        db.execute('UPDATE upload_sessions SET updated_at = ? WHERE id = ?', (now_iso(), session['id']))
+        db.commit()
+        db.close()
+    if not recorded:
+        raise UploadError('Upload is being completed', 409)
+    return get(session['id'], session['kind'])
+
+
+def missing(session):
+    """Byte ranges [start, end) not yet received."""
+    gaps = []
+    pos = 0
+    for start, end in session['ranges']:
+        if start > pos:
+            gaps.append([pos, start])
+        pos = max(pos, end)
+    if pos < session['size']:
+        gaps.append([pos, session['size']])
+    return gaps
+
+
+@contextmanager
+def completing(session):
+    """Claim a complete session and yield (path, sha256 hex) of its file, named with the upload's extension.
+
+    When the block succeeds the session and the file are removed. When it
+    raises, the file goes back and the session is reopened, so the client can
+    complete it again or discard it.
+    """
+    gaps = missing(session)
+    if gaps:
+        raise UploadError(f'Upload incomplete: {len(gaps)} missing range(s)', 409)
+
+    path = _part_path(session['id'])
+    ext = os.path.splitext(session['filename'])[1].lower()
+    final_path = os.path.join(config.UPLOAD_FOLDER, session['id'] + ext)
+    try:
+        with open(path, 'rb') as f:
+            # Waits for chunk writes in progress; later ones see the claim and stop
+            _lock(f, shared=False)
+            if not _set_status(session['id'], 'open', 'assembling'):
+                raise UploadError('Upload is already being completed', 409)
+            try:
+                digest = hashlib.sha256()
+                while True:
+                    block = f.read(COPY_BLOCK)
+                    if not block:
+                        break
+                    digest.update(block)
+                digest = digest.hexdigest()
+                if session['sha256'] and digest != session['sha256']:
+                    discard(session['id'])
+                    raise UploadError('File checksum mismatch; upload discarded', 422)
+                os.replace(path, final_path)
+            except OSError:
+                _set_status(session['id'], 'assembling', 'open')
+                raise
+    except FileNotFoundError:
+        raise UploadError('Upload is already being completed', 409)
+
+    try:
+        yield final_path, digest
+    except BaseException:
+        if os.path.exists(final_path):
+            os.replace(final_path, path)
+        _set_status(session['id'], 'assembling', 'open')
+        raise
+    if os.path.exists(final_path):
+        os.remove(final_path)
+    _delete(session['id'])
+
+
+def discard(upload_id):
+    _delete(upload_id)
+    if os.path.exists(_part_path(upload_id)):
+        os.remove(_part_path(upload_id))
+
+
+def format_session(session):
+    return {
+        'uploadId': session['id'],
+        'filename': session['filename'],
+        'size': session['size'],
+        'received': sum(end - start for start, end in session['ranges']),
+        'ranges': session['ranges'],
+        'missing': missing(session),
+        'maxChunkSize': config.UPLOAD_CHUNK_MAX_BYTES,
+        'createdAt': session['created_at'],
+        'updatedAt': session['updated_at'],
+    }
+
+
+def _merge(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _lock(f, shared):
+    # Released when f is closed
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def _status(upload_id):
+    db = get_db()
+    row = db.execute('SELECT status FROM upload_sessions WHERE id = ?', (upload_id,)).fetchone()
+    db.close()
+    return row['status'] if row else None
+
+
+def _set_status(upload_id, current, status):
+    """Move the session from current to status; False if it was not in current."""
+    db = get_db()
+    changed = db.execute(
+        'UPDATE upload_sessions SET status = ?, updated_at = ? WHERE id = ? AND status = ?',
+        (status, now_iso(), upload_id, current)
+    ).rowcount
+    db.commit()
+    db.close()
+    return changed == 1
+
+
+def _delete(upload_id):
+    db = get_db()
+    db.execute('DELETE FROM upload_chunks WHERE upload_id = ?', (upload_id,))
+    db.execute('DELETE FROM upload_sessions WHERE id = ?', (upload_id,))
+    db.commit()
+    db.close()
+
+
+def _prune(db):
+    """Drop sessions untouched for UPLOAD_SESSION_TTL_HOURS along with their partial files."""
+    cutoff = (datetime.utcnow() - timedelta(hours=config.UPLOAD_SESSION_TTL_HOURS)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    stale = [r['id'] for r in db.execute('SELECT id FROM upload_sessions WHERE updated_at < ?', (cutoff,)).fetchall()]
+    for upload_id in stale:
+        db.execute('DELETE FROM upload_chunks WHERE upload_id = ?', (upload_id,))
+        db.execute('DELETE FROM upload_sessions WHERE id = ?', (upload_id,))
+        if os.path.exists(_part_path(upload_id)):
+            os.remove(_part_path(upload_id))
+
+
+def _part_path(upload_id):
+    return os.path.join(PARTIAL_FOLDER, upload_id + '.part')
@@ -0,0 +1,146 @@
+"""LLM token accounting and per-user daily budgets.
+
+Each call is logged to llm_usage and rolled up into hourly and daily rows of
+llm_usage_buckets.  Calls are attributed to the user id found on the request
+(or set explicitly with tag_user() once a handler has loaded the owning row)
+and to the blueprint/view function that made them.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import g, has_request_context, request
+import config
+from database import get_db
+from services import cache
+from services.sql_trace import bookkeeping
+from utils.helpers import gen_id, now_iso
+
+ANONYMOUS = 'anonymous'
+# Seconds a user's budget setting is reused before re-reading llm_budgets
+LIMIT_CACHE_TTL = 60
+
+_background = threading.local()
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, user_id, used, limit):
+        super().__init__(f'Daily token budget exceeded for user {user_id}: {used}/{limit}')
+        self.user_id = user_id
+        self.used = used
+        self.limit = limit
+
+
+def tag_user(user_id):
+    """Attribute LLM calls in the current request to user_id."""
+    if has_request_context() and user_id:
+        g.usage_user_id = user_id
+
+
+@contextmanager
+def attribute(user_id, blueprint, feature):
+    """Attribute LLM calls made by this (non-request) thread, e.g. background jobs."""
+    previous = getattr(_background, 'tags', None)
+    _background.tags = (user_id or ANONYMOUS, blueprint, feature)
+    try:
+        yield
+    finally:
+        _background.tags = previous
+
+
+def current_tags():
+    if not has_request_context():
+        return getattr(_background, 'tags', None) or (ANONYMOUS, 'background', 'background')
+    user_id = g.get('usage_user_id') or (request.view_args or {}).get('user_id')
+    if not user_id:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            user_id = data.get('userId')
+    if not user_id:
+        user_id = request.form.get('userId') or request.args.get('userId')
+    endpoint = request.endpoint or 'unknown'
+    feature = endpoint.rsplit('.', 1)[-1]
+    return user_id or ANONYMOUS, request.blueprint or '', feature
+
+
+def daily_limit(db, user_id):
+    # Checked before every LLM call; budget edits call forget_limit()
+    key = f'budget:{user_id}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    row = db.execute('SELECT daily_tokens FROM llm_budgets WHERE user_id = ?', (user_id,)).fetchone()
+    limit = row['daily_tokens'] if row else config.DAILY_TOKEN_BUDGET
+    cache.set(key, limit, ttl=LIMIT_CACHE_TTL)
+    return limit
+
+
+def forget_limit(user_id):
+    cache.delete(f'budget:{user_id}')
+
+
+def tokens_today(db, user_id):
+    row = db.execute(
+        "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) AS used FROM llm_usage_buckets "
+        "WHERE granularity = 'day' AND bucket = ? AND user_id = ?",
+        (_day_bucket(datetime.utcnow()), user_id)
+    ).fetchone()
+    return row['used']
+
+
+def select_model(user_id, model, fallback=None):
+    """Return the model to use for user_id, degrading (to fallback or BUDGET_FALLBACK_MODEL) or refusing once over budget."""
+    if user_id == ANONYMOUS:
+        return model
+    with bookkeeping():
+        db = get_db(user_id)
+        try:
+            limit = daily_limit(db, user_id)
+            if not limit:
+                return model
+            used = tokens_today(db, user_id)
+        finally:
+            db.close()
+    if used >= limit * config.BUDGET_HARD_LIMIT_RATIO:
+        raise BudgetExceeded(user_id, used, limit)
+    if used >= limit:
+        return fallback or config.BUDGET_FALLBACK_MODEL
+    return model
+
+
+def record(user_id, blueprint, feature, model, usage, degraded=False):
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    now = datetime.utcnow()
+    with bookkeeping():
+        db = get_db(user_id)
+        db.execute(
+            'INSERT INTO llm_usage (id, user_id, blueprint, feature, model, prompt_tokens, completion_tokens, degraded, created_at) VALUES (?,?,?,?,?,?,?,?,?)',
+            (gen_id(user_id), user_id, blueprint, feature, model, prompt_tokens, completion_tokens, int(degraded), now_iso())
+        )
+        db.executemany(
+            'INSERT INTO llm_usage_buckets (granularity, bucket, user_id, blueprint, feature, model, calls, prompt_tokens, completion_tokens) '
+            'VALUES (?,?,?,?,?,?,1,?,?) '
+            'ON CONFLICT (granularity, bucket, user_id, blueprint, feature, model) DO UPDATE SET '
+            'calls = calls + 1, prompt_tokens = prompt_tokens + excluded.prompt_tokens, '
+            'completion_tokens = completion_tokens + excluded.completion_tokens',
+            [
+                ('hour', _hour_bucket(now), user_id, blueprint, feature, model, prompt_tokens, completion_tokens),
+                ('day', _day_bucket(now), user_id, blueprint, feature, model, prompt_tokens, completion_tokens),
+            ]
+        )
+        db.commit()
+        db.close()
+
+
+def seconds_until_reset():
+    now = datetime.utcnow()
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((tomorrow - now).total_seconds()) + 1
+
+
+def _hour_bucket(dt):
+    return dt.strftime('%Y-%m-%dT%H')
+
+
+def _day_bucket(dt):
+    return dt.strftime('%Y-%m-%d')
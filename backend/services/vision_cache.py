@@ -0,0 +1,97 @@
+"""Vision model answers for uploaded photos, keyed by image hash.
+
+A photo sent again, or a re-compressed / resized copy of it, is answered
+from here instead of going back to the model. Keys are
+utils.images.image_hash() values, or "sha256:<hex>" for uploads that were
+not preprocessed (those only match exactly). Entries live on shard 0 and are
+dropped after VISION_CACHE_TTL_DAYS unused; answers from an older
+prompt_version count as misses.
+
+Copies of one worksheet with different handwritten answers hash only a few
+bits apart, so an entry remembers the user who uploaded it: near matches
+only come from that user's own entries, and an exact match from another
+user's entry is served without its PRIVATE_FIELDS (the transcribed answer).
+
+A lookup accepts the closest stored hash within VISION_HASH_DISTANCE bits.
+To find it without comparing against every entry, each hash is also stored
+as BANDS pieces: two hashes at most BANDS - 1 bits apart agree exactly on at
+least one piece, so the candidates come straight from the primary key.
+"""
+import json
+from datetime import datetime, timedelta
+import config
+from database import get_db
+from utils.helpers import now_iso
+from utils.images import hash_distance
+
+BANDS = 16
+# Parts of an answer that describe the uploader's own writing, not the question
+PRIVATE_FIELDS = ('userAnswer',)
+
+
+def lookup(image_hash, prompt_version, user_id):
+    """The cached answer for image_hash, or a near copy of it uploaded by user_id, or None."""
+    db = get_db()
+    row = db.execute(
+        'SELECT image_hash, user_id, result FROM vision_cache WHERE image_hash = ? AND prompt_version = ?',
+        (image_hash, prompt_version)
+    ).fetchone()
+    limit = min(config.VISION_HASH_DISTANCE, BANDS - 1)
+    if not row and limit > 0 and not image_hash.startswith('sha256:'):
+        pieces = _pieces(image_hash)
+        candidates = db.execute(
+            'SELECT DISTINCT c.image_hash, c.user_id, c.result FROM vision_cache_bands b '
+            'JOIN vision_cache c ON c.image_hash = b.image_hash AND c.prompt_version = ? AND c.user_id = ? WHERE ('
+            + ' OR '.join(['(b.band = ? AND b.value = ?)'] * len(pieces)) + ')',
+            [prompt_version, user_id] + [v for piece in pieces for v in piece]
+        ).fetchall()
+        scored = [(hash_distance(image_hash, c['image_hash']), c) for c in candidates]
+        distance, row = min(scored, key=lambda s: s[0], default=(None, None))
+        if row and distance > limit:
+            row = None
+    if row:
+        db.execute('UPDATE vision_cache SET last_used_at = ? WHERE image_hash = ?', (now_iso(), row['image_hash']))
+        db.commit()
+    db.close()
+    if not row:
+        return None
+    result = json.loads(row['result'])
+    if row['user_id'] != user_id and isinstance(result, dict):
+        for field in PRIVATE_FIELDS:
+            result.pop(field, None)
+    return result
+
+
+def store(image_hash, prompt_version, result, user_id):
+    now = now_iso()
+    db = get_db()
+    db.execute(
+        'INSERT OR REPLACE INTO vision_cache (image_hash, prompt_version, user_id, result, created_at, last_used_at) '
+        'VALUES (?,?,?,?,?,?)',
+        (image_hash, prompt_version, user_id, json.dumps(result, ensure_ascii=False), now, now)
+    )
+    if not image_hash.startswith('sha256:'):
+        db.executemany(
+            'INSERT OR IGNORE INTO vision_cache_bands (band, value, image_hash) VALUES (?,?,?)',
+            [(band, value, image_hash) for band, value in _pieces(image_hash)]
+        )
+    _prune(db)
+    db.commit()
+    db.close()
+
+
+def _pieces(image_hash):
+    size = len(image_hash) // BANDS
+    return [(i, image_hash[i * size:(i + 1) * size]) for i in range(BANDS)]
+
+
+def _prune(db):
+    cutoff = (datetime.utcnow() - timedelta(days=config.VISION_CACHE_TTL_DAYS)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    expired = [r['image_hash'] for r in db.execute('SELECT image_hash FROM vision_cache WHERE last_used_at < ?', (cutoff,))]
+    if not expired:
+        return
+    db.execute('DELETE FROM vision_cache WHERE last_used_at < ?', (cutoff,))
+    db.executemany(
+        'DELETE FROM vision_cache_bands WHERE band = ? AND value = ? AND image_hash = ?',
+        [(band, value, h) for h in expired if not h.startswith('sha256:') for band, value in _pieces(h)]
+    )
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# config reads the environment once, at import
+_scratch = tempfile.mkdtemp(prefix='learning-tests-')
+os.environ['DATABASE_PATH'] = os.path.join(_scratch, 'learning.db')
+os.environ['METRICS_ENABLED'] = '0'
+os.environ['BOOK_ENRICHMENT_ENABLED'] = '0'
+os.environ['SQL_TRACE'] = '1'
+os.environ['SLOW_QUERY_LOG'] = os.path.join(_scratch, 'slow_queries.log')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A fresh database location for the test (one shard)."""
+    path = str(tmp_path / 'learning.db')
+    monkeypatch.setattr(config, 'DATABASE_PATH', path)
+    monkeypatch.setattr(config, 'DB_SHARDS', 1)
+    return path
+
+
+@pytest.fixture
+def app(db_path, tmp_path, monkeypatch):
+    from app import create_app
+    from services import upload_sessions
+    monkeypatch.setattr(config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(upload_sessions, 'PARTIAL_FOLDER', str(tmp_path / 'uploads' / 'partial'))
+    return create_app({'TESTING': True})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Point the LLM client at tools.fake_llm_server for the test."""
+    import threading
+    from services import ai_service
+    from tools.fake_llm_server import make_server
+    server = make_server(port=0, latency='fixed:0')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, 'DASHSCOPE_BASE_URL', f'http://127.0.0.1:{server.server_address[1]}/v1')
+    monkeypatch.setattr(ai_service, '_client', None)
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,26 @@
+import threading
+import time
+from services.cache import SQLiteCache
+
+
+def test_sqlite_incr_is_atomic_across_threads(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'))
+
+    def bump():
+        for _ in range(100):
+            cache.incr('hits')
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.get('hits') == 400
+    assert cache.incr('hits', 5) == 405
+
+
+def test_sqlite_incr_restarts_expired_counter(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'))
+    assert cache.incr('window', 2, ttl=0.05) == 2
+    time.sleep(0.1)
+    assert cache.incr('window', 3, ttl=60) == 3
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import database
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(__file__), 'fixtures', 'baseline_schema.sql')
+
+
+def _columns(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+    finally:
+        conn.close()
+
+
+def test_fresh_database_gets_current_schema(db_path):
+    database.init_db()
+    assert database._schema_version(db_path) == database.SCHEMA_VERSION
+
+
+def test_upgrade_from_baseline_schema(db_path):
+    conn = sqlite3.connect(db_path)
+    with open(BASELINE_SCHEMA, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO notes (id, user_id, title) VALUES ('n1', 'u1', 'kept')")
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+
+    assert database._schema_version(db_path) == database.SCHEMA_VERSION
+    for version, columns in database.MIGRATIONS.items():
+        for table, column, _ in columns:
+            assert column in _columns(db_path, table), (version, table, column)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT title FROM notes WHERE id = 'n1'").fetchone() == ('kept',)
+    conn.close()
+
+
+def test_migration_skips_existing_column(db_path):
+    database.init_db()
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA user_version = 4')
+    conn.close()
+
+    database.init_db()
+
+    assert database._schema_version(db_path) == database.SCHEMA_VERSION
@@ -0,0 +1,40 @@
+import time
+from database import get_db
+from services import tasks
+
+
+def _essays(client, n, user_id='u1'):
+    return [client.post('/api/v1/essays', json={'userId': user_id, 'title': f'e{i}', 'content': '今天天气很好。'}).get_json()['id']
+            for i in range(n)]
+
+
+def _wait(client, job_id):
+    for _ in range(200):
+        job = client.get(f'/api/v1/essays/grade-batch/{job_id}').get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job still {job["status"]}')
+
+
+def test_grade_batch_runs_outside_background_workers(client, fake_llm):
+    ids = _essays(client, 6)
+    r = client.post('/api/v1/essays/grade-batch', json={'essayIds': ids})
+    assert r.status_code == 202
+    job = _wait(client, r.get_json()['jobId'])
+    assert job['status'] == 'completed'
+    assert (job['graded'], job['failed'], job['cancelled'], job['done']) == (6, 0, 0, 6)
+    assert tasks._executor is None or not tasks._executor._work_queue.qsize()
+    assert all(client.get(f'/api/v1/essays/{i}/feedback').status_code == 200 for i in ids)
+
+
+def test_grade_batch_stops_when_out_of_budget(client, fake_llm):
+    ids = _essays(client, 8, user_id='u2')
+    db = get_db('u2')
+    db.execute("INSERT INTO llm_budgets (user_id, daily_tokens, updated_at) VALUES ('u2', 1, '')")
+    db.commit()
+    db.close()
+    job = _wait(client, client.post('/api/v1/essays/grade-batch', json={'essayIds': ids}).get_json()['jobId'])
+    assert job['status'] == 'failed'
+    assert job['graded'] + job['failed'] + job['cancelled'] == 8
+    assert job['failed'] >= 1
@@ -0,0 +1,25 @@
+import pytest
+import config
+
+
+@pytest.fixture
+def metrics_client(db_path, monkeypatch):
+    from app import create_app
+    monkeypatch.setattr(config, 'METRICS_ENABLED', True)
+    return create_app({'TESTING': True}).test_client()
+
+
+def test_metrics_off_without_token(metrics_client, monkeypatch):
+    monkeypatch.setattr(config, 'METRICS_TOKEN', '')
+    # Behind a same-host proxy every client looks local
+    assert metrics_client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 404
+
+
+def test_metrics_require_bearer_token(metrics_client, monkeypatch):
+    monkeypatch.setattr(config, 'METRICS_TOKEN', 's3cret')
+    assert metrics_client.get('/metrics').status_code == 403
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer 密钥'}).status_code == 403
+    r = metrics_client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert r.status_code == 200
+    assert b'http_requests' in r.data
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from database import get_db
+from services import pomodoro_sessions
+
+
+def test_only_one_process_claims_sweeping(db_path):
+    first = pomodoro_sessions._claim_sweeping()
+    second = pomodoro_sessions._claim_sweeping()
+    try:
+        assert first is not None
+        assert second is None
+    finally:
+        first.close()
+    # The holder went away; the next claim succeeds
+    third = pomodoro_sessions._claim_sweeping()
+    assert third is not None
+    third.close()
+
+
+def test_sweep_expires_overdue_sessions(app):
+    session = pomodoro_sessions.start('u1', 'read', 25)
+    started = (datetime.utcnow() - timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    db = get_db('u1')
+    db.execute('UPDATE pomodoro_sessions SET start_time = ? WHERE id = ?', (started, session['id']))
+    db.commit()
+    db.close()
+
+    assert pomodoro_sessions.sweep() == 1
+    assert pomodoro_sessions.active('u1') is None
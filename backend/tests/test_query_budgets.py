@@ -0,0 +1,48 @@
+"""Every @query_budget route, run in a testing app so going over budget fails the test."""
+import pytest
+from database import get_db
+from services.sql_trace import QueryBudgetExceeded
+from utils.helpers import gen_id
+
+
+def _insert(table, **row):
+    db = get_db(row['user_id'])
+    db.execute(f'INSERT INTO {table} ({", ".join(row)}) VALUES ({", ".join("?" * len(row))})', tuple(row.values()))
+    db.commit()
+    db.close()
+    return row['id']
+
+
+def test_problem_history(client):
+    for i in range(3):
+        _insert('problem_sessions', id=gen_id('u1'), user_id='u1', question=f'q{i}')
+    r = client.get('/api/v1/problems/history/u1')
+    assert r.status_code == 200
+
+
+def test_note_review_done(client):
+    note = client.post('/api/v1/notes', json={'userId': 'u1', 'title': 't', 'content': 'c'}).get_json()
+    r = client.post(f'/api/v1/notes/{note["id"]}/review-done')
+    assert r.status_code == 200
+    assert r.get_json()['reviewCount'] == 1
+
+
+def test_book_complete_step(client):
+    book_id = _insert('books', id=gen_id('u1'), user_id='u1', title='t', content='第一章\n内容。')
+    for _ in range(2):  # first call inserts the progress row, the second updates it
+        r = client.post(f'/api/v1/books/{book_id}/progress/u1/complete', json={'stepType': 'preview'})
+        assert r.status_code == 200
+
+
+def test_brainstorm_start_discussion(client, fake_llm):
+    session = client.post('/api/v1/brainstorm/sessions', json={'userId': 'u1', 'topic': '远程办公'}).get_json()
+    r = client.post(f'/api/v1/brainstorm/sessions/{session["id"]}/start-discussion')
+    assert r.status_code == 200
+    assert len(r.get_json()['messages']) == 4
+
+
+def test_budget_is_enforced(client, app, monkeypatch):
+    note = client.post('/api/v1/notes', json={'userId': 'u1', 'title': 't', 'content': 'c'}).get_json()
+    monkeypatch.setattr(app.view_functions['notes.mark_reviewed'], 'query_budget', 1)
+    with pytest.raises(QueryBudgetExceeded):
+        client.post(f'/api/v1/notes/{note["id"]}/review-done')
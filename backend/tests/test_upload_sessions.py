@@ -0,0 +1,73 @@
+import hashlib
+import io
+import threading
+import pytest
+from services import upload_sessions
+
+
+def _upload(client, data, filename='book.txt'):
+    r = client.post('/api/v1/books/upload/sessions', json={'filename': filename, 'size': len(data), 'userId': 'u1'})
+    upload_id = r.get_json()['uploadId']
+    r = client.put(f'/api/v1/books/upload/sessions/{upload_id}/chunks?offset=0', data=data,
+                   headers={'X-Chunk-Sha256': hashlib.sha256(data).hexdigest()})
+    assert r.status_code == 200
+    return upload_id
+
+
+def test_complete_ingests_once_and_removes_session(client):
+    upload_id = _upload(client, '第一章 开始。'.encode('utf-8') * 1000)
+    r = client.post(f'/api/v1/books/upload/sessions/{upload_id}/complete')
+    assert r.status_code == 200
+    assert r.get_json()['title'] == 'book.txt'
+    assert client.get(f'/api/v1/books/upload/sessions/{upload_id}').status_code == 404
+
+
+def test_concurrent_completes_claim_the_session_once(app):
+    with app.test_client() as client:
+        upload_id = _upload(client, b'x' * 2_000_000)
+    session = upload_sessions.get(upload_id, 'book')
+    results = []
+    barrier = threading.Barrier(4)
+
+    def complete():
+        barrier.wait()
+        try:
+            with upload_sessions.completing(session):
+                results.append('ok')
+        except upload_sessions.UploadError as e:
+            results.append(e.status_code)
+
+    threads = [threading.Thread(target=complete) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results, key=str) == [409, 409, 409, 'ok']
+
+
+def test_chunk_after_claim_is_refused(app):
+    with app.test_client() as client:
+        upload_id = _upload(client, b'abc')
+        session = upload_sessions.get(upload_id, 'book')
+        with upload_sessions.completing(session):
+            r = client.put(f'/api/v1/books/upload/sessions/{upload_id}/chunks?offset=0', data=b'xyz',
+                           headers={'X-Chunk-Sha256': hashlib.sha256(b'xyz').hexdigest()})
+            assert r.status_code == 409
+        # The file was moved out and the session removed
+        r = client.put(f'/api/v1/books/upload/sessions/{upload_id}/chunks?offset=0', data=b'xyz',
+                       headers={'X-Chunk-Sha256': hashlib.sha256(b'xyz').hexdigest()})
+        assert r.status_code == 404
+        # A request that loaded the session before completing gets a 409, not a 500
+        with pytest.raises(upload_sessions.UploadError) as raised:
+            upload_sessions.write_chunk(session, 0, 3, io.BytesIO(b'xyz'), hashlib.sha256(b'xyz').hexdigest())
+        assert raised.value.status_code == 409
+
+
+def test_failed_parse_keeps_the_upload(client):
+    upload_id = _upload(client, b'not a pdf at all', filename='broken.pdf')
+    r = client.post(f'/api/v1/books/upload/sessions/{upload_id}/complete')
+    assert r.status_code == 400
+    session = upload_sessions.get(upload_id, 'book')
+    assert session['status'] == 'open'
+    assert upload_sessions.missing(session) == []
+    assert client.delete(f'/api/v1/books/upload/sessions/{upload_id}').status_code == 200
@@ -0,0 +1,30 @@
+import pytest
+import config
+
+ADMIN = {'Authorization': 'Bearer admin-secret'}
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(config, 'BUDGET_ADMIN_TOKEN', 'admin-secret')
+
+
+def test_budget_writes_need_admin_token(client, admin_token):
+    assert client.put('/api/v1/usage/budgets/u1', json={'dailyTokens': 10 ** 9}).status_code == 403
+    assert client.put('/api/v1/usage/budgets/u1', json={'dailyTokens': 10 ** 9},
+                      headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.delete('/api/v1/usage/budgets/u1').status_code == 403
+
+    assert client.put('/api/v1/usage/budgets/u1', json={'dailyTokens': 5000}, headers=ADMIN).status_code == 200
+    assert client.get('/api/v1/usage/budgets/u1').get_json()['dailyTokens'] == 5000
+    assert client.delete('/api/v1/usage/budgets/u1', headers=ADMIN).status_code == 200
+
+
+def test_budget_writes_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(config, 'BUDGET_ADMIN_TOKEN', '')
+    assert client.put('/api/v1/usage/budgets/u1', json={'dailyTokens': 1}, headers={'Authorization': 'Bearer '}).status_code == 403
+
+
+@pytest.mark.parametrize('value', [True, False, -1, 1.5, '100', None])
+def test_budget_rejects_non_integers(client, admin_token, value):
+    assert client.put('/api/v1/usage/budgets/u1', json={'dailyTokens': value}, headers=ADMIN).status_code == 400
@@ -0,0 +1,231 @@
+"""Latency and memory of the data-dependent endpoints as the database grows.
+
+For each --sizes row count, fills a database with tools/gen_data (cached in
+--data-dir when given, generating 10M rows takes a while) and requests every
+endpoint in ENDPOINTS through the Flask test client for two users: the
+heaviest one and a median one. Reports per endpoint and user:
+
+    - p50 / p95 latency over --repeat requests (after one warm-up request)
+    - peak Python memory allocated during one request (tracemalloc)
+    - response size
+
+    python -m tools.bench_endpoints --sizes 1000,100000,10000000 --data-dir /var/tmp/bench-data
+    python -m tools.bench_endpoints --sizes 1000,100000 --check
+
+Baselines live in tools/baselines/bench_endpoints.json, keyed by size,
+endpoint and user. Every run first times calibrate(), a fixed SQLite and JSON
+workload, and latencies are compared in units of that calibration time, so a
+baseline recorded on one machine still means something on a slower or faster
+one. --check exits with status 1 when an endpoint got slower or hungrier than
+--tolerance times its baseline (plus a little slack for noise);
+--update-baseline stores this run's numbers for the sizes measured. When the
+calibration is more than CALIBRATION_DRIFT times off the baseline's, the
+machines are too different for the ratio to hold and --check is skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'bench_endpoints.json')
+SLACK_MS = 2
+SLACK_KB = 256
+# Skip --check when this run's calibration is this many times off the baseline's
+CALIBRATION_DRIFT = 4
+# Stop repeating an endpoint once its samples took this long
+TIME_BUDGET_SECONDS = 10
+
+ENDPOINTS = [
+    ('pomodoro.get_stats', '/api/pomodoro/user/{user}/stats'),
+    ('pomodoro.get_sessions', '/api/pomodoro/user/{user}'),
+    ('error_questions.get_analysis', '/api/v1/error-questions/user/{user}/analysis'),
+    ('error_questions.get_weak_subjects', '/api/v1/error-questions/user/{user}/weak-subjects'),
+    ('error_questions.list', '/api/v1/error-questions/user/{user}'),
+    ('problems.get_history', '/api/v1/problems/history/{user}'),
+    ('notes.get_review_notes', '/api/v1/notes/user/{user}/review'),
+    ('notes.list', '/api/v1/notes/user/{user}'),
+    ('quotes.list', '/api/v1/quotes/user/{user}'),
+    ('quotes.statistics', '/api/v1/quotes/user/{user}/statistics'),
+    ('essays.list', '/api/v1/essays/user/{user}'),
+    ('documents.list', '/api/v1/documents/user/{user}'),
+    ('books.list', '/api/v1/books/user/{user}'),
+    ('papers.list', '/api/v1/papers?userId={user}'),
+    ('brainstorm.list', '/api/v1/brainstorm/sessions?userId={user}'),
+]
+
+
+def calibrate(rounds=5):
+    """Fastest of `rounds` timings, in ms, of a fixed workload shaped like an endpoint: insert, aggregate, serialize."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, user_id TEXT, subject TEXT, score REAL, body TEXT)')
+        conn.executemany('INSERT INTO t (user_id, subject, score, body) VALUES (?, ?, ?, ?)',
+                         ((f'u{i % 50}', f's{i % 7}', i % 100 / 3, 'x' * (i % 200)) for i in range(20000)))
+        conn.execute('CREATE INDEX idx_t_user ON t(user_id)')
+        for user in range(50):
+            rows = conn.execute('SELECT * FROM t WHERE user_id = ? ORDER BY score DESC', (f'u{user}',)).fetchall()
+            json.dumps([list(r) for r in rows])
+            conn.execute('SELECT subject, COUNT(*), AVG(score) FROM t WHERE user_id = ? GROUP BY subject',
+                         (f'u{user}',)).fetchall()
+        conn.close()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(min(samples), 2)
+
+
+def machine():
+    return {
+        'calibrationMs': calibrate(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(terse=True),
+        'processor': platform.machine(),
+    }
+
+
+def prepare(rows, users, data_dir, tmp):
+    """Point config at a database holding `rows` generated rows; returns the generation summary."""
+    import config
+    import database
+    from tools import gen_data
+    directory = data_dir or tmp
+    os.makedirs(directory, exist_ok=True)
+    config.DATABASE_PATH = os.path.join(directory, f'gen-{rows}-{users}.db')
+    config.DB_SHARDS = 1
+    summary_path = config.DATABASE_PATH + '.json'
+    if os.path.exists(summary_path):
+        with open(summary_path, encoding='utf-8') as f:
+            return json.load(f)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(config.DATABASE_PATH + suffix):
+            os.remove(config.DATABASE_PATH + suffix)
+    database.init_db()
+    summary = gen_data.populate(rows, users)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+    return summary
+
+
+def bench_users(rows, users):
+    """{'heavy': user id, 'median': user id} by planned row count."""
+    from tools import gen_data
+    planned = sorted(gen_data.plan(rows, users), key=lambda p: sum(p[1].values()), reverse=True)
+    return {'heavy': planned[0][0], 'median': planned[len(planned) // 2][0]}
+
+
+def measure(client, url, repeat):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    size = len(response.get_data())
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url).get_data()
+        samples.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() - started > TIME_BUDGET_SECONDS:
+            break
+    samples.sort()
+    tracemalloc.start()
+    client.get(url).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'p50Ms': round(statistics.median(samples), 2),
+        'p95Ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        'samples': len(samples),
+        'peakKb': round(peak / 1024),
+        'responseKb': round(size / 1024, 1),
+    }
+
+
+def regressions(results, baseline, tolerance, scale):
+    """Endpoints worse than the baseline; baseline latencies are multiplied by `scale` first."""
+    found = []
+    for size, rows in results.items():
+        for key, now in rows.items():
+            before = baseline.get(size, {}).get(key)
+            if not before:
+                continue
+            expected = before['p50Ms'] * scale
+            if now['p50Ms'] > expected * tolerance + SLACK_MS * scale:
+                found.append(f'{size} rows {key}: p50 {now["p50Ms"]} ms, baseline {before["p50Ms"]} ms '
+                             f'({expected:.2f} ms on this machine)')
+            if now['peakKb'] > before['peakKb'] * tolerance + SLACK_KB:
+                found.append(f'{size} rows {key}: peak {now["peakKb"]} KB, baseline {before["peakKb"]} KB')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure endpoint latency and memory as the database grows')
+    parser.add_argument('--sizes', default='1000,100000', help='comma-separated row counts (e.g. 1000,100000,10000000)')
+    parser.add_argument('--users', type=int, help='users to spread the rows over (default rows / 100, at least 10)')
+    parser.add_argument('--repeat', type=int, default=20, help='timed requests per endpoint and user')
+    parser.add_argument('--data-dir', help='keep generated databases here and reuse them')
+    parser.add_argument('--check', action='store_true', help='exit 1 when an endpoint regressed against the baseline')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed ratio to the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    os.environ.setdefault('BOOK_ENRICHMENT_ENABLED', '0')
+    os.environ.setdefault('SLOW_QUERY_LOG', os.path.join(tempfile.gettempdir(), 'bench_endpoints_slow_queries.log'))
+    from app import create_app
+
+    current = machine()
+    print(f'calibration {current["calibrationMs"]} ms (python {current["python"]}, sqlite {current["sqlite"]})')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(s) for s in args.sizes.split(',')]:
+            users = args.users or max(10, rows // 100)
+            summary = prepare(rows, users, args.data_dir, tmp)
+            print(f'{rows} rows / {users} users: heaviest user {summary["heaviestUserRows"]} rows')
+            client = create_app().test_client()
+            measured = results[str(rows)] = {}
+            for kind, user in bench_users(rows, users).items():
+                for name, url in ENDPOINTS:
+                    row = measured[f'{name}|{kind}'] = measure(client, url.format(user=user), args.repeat)
+                    print(f'  {name:<36} {kind:<6} p50 {row["p50Ms"]:>9} ms  p95 {row["p95Ms"]:>9} ms  '
+                          f'peak {row["peakKb"]:>8} KB  response {row["responseKb"]:>9} KB')
+
+    baseline = {'machine': current, 'sizes': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    scale = current['calibrationMs'] / baseline['machine']['calibrationMs']
+    found = []
+    if 1 / CALIBRATION_DRIFT <= scale <= CALIBRATION_DRIFT:
+        found = regressions(results, baseline['sizes'], args.tolerance, scale)
+        for line in found:
+            print('REGRESSION', line)
+    else:
+        print(f'calibration is {scale:.1f}x the baseline machine\'s ({baseline["machine"]}); not comparing')
+
+    if args.update_baseline:
+        # Timings of sizes not measured now were taken against the old calibration
+        rescaled = {size: {key: dict(row, p50Ms=round(row['p50Ms'] * scale, 2), p95Ms=round(row['p95Ms'] * scale, 2))
+                           for key, row in rows.items()}
+                    for size, rows in baseline['sizes'].items()}
+        rescaled.update(results)
+        baseline = {'machine': current, 'sizes': rescaled}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.check and found:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
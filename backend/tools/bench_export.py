@@ -0,0 +1,150 @@
+"""Measure export time and peak RSS for a user with a lot of data.
+
+Fills a throwaway database with one user holding about --mb megabytes (large
+books and papers plus many small notes, essays and error questions), then
+runs tools/export_user in a fresh process, plain and gzipped:
+
+    python -m tools.bench_export --mb 1024
+
+--naive also runs the SELECT * + json.dumps way for comparison (it holds
+everything in memory, so keep --mb within RAM).
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import config
+import database
+from utils.helpers import gen_id, now_iso
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = 'bench-user'
+
+NAIVE = '''
+import json, resource, sqlite3, sys, time
+start = time.perf_counter()
+db = sqlite3.connect(sys.argv[1]); db.row_factory = sqlite3.Row
+data = {t: [dict(r) for r in db.execute(f'SELECT * FROM {t} WHERE user_id = ?', (sys.argv[2],))]
+        for t in ('notes', 'books', 'papers', 'essays', 'error_questions')}
+body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+with open(sys.argv[3], 'wb') as f:
+    f.write(body)
+hwm = [l for l in open('/proc/self/status') if l.startswith('VmHWM:')]
+rss = int(hwm[0].split()[1]) if hwm else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'bytes': len(body), 'seconds': round(time.perf_counter() - start, 2), 'maxRssMb': round(rss / 1024, 1)}))
+'''
+
+
+def random_block(rng, size):
+    words = ['学习', '方程', '函数', '记忆', '复习', '概念', '练习', '理解', '章节', '总结',
+             'theory', 'model', 'data', 'memory', 'review', 'practice']
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words) + rng.choice(' ，。\n')
+        parts.append(word)
+        length += len(word.encode('utf-8'))
+    return ''.join(parts)
+
+
+def populate(path, megabytes, seed=1):
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    now = now_iso()
+    block = random_block(rng, 1024 * 1024)
+    target = megabytes * 1024 * 1024
+    written = 0
+    # 90% of the volume in 8MB books / 4MB papers, the rest in small rows
+    large = int(target * 0.9)
+    i = 0
+    while written < large:
+        size = 8 if i % 3 else 4
+        text = ''.join(block[j:] + block[:j] for j in rng.sample(range(len(block)), size))
+        if size == 8:
+            db.execute('INSERT INTO books (id, title, author, content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?,?)',
+                       (gen_id(USER), f'Book {i}', 'Bench', text, USER, now, now))
+        else:
+            db.execute('INSERT INTO papers (id, title, authors, abstract, content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?)',
+                       (gen_id(USER), f'Paper {i}', '[]', text[:500], text, USER, now, now))
+        written += len(text.encode('utf-8'))
+        i += 1
+        db.commit()
+    small = 0
+    while written < target:
+        start = rng.randrange(len(block) - 3000)
+        text = block[start:start + rng.randrange(200, 3000)]
+        table = small % 3
+        if table == 0:
+            db.execute('INSERT INTO notes (id, user_id, title, content, created_at, updated_at) VALUES (?,?,?,?,?,?)',
+                       (gen_id(USER), USER, f'Note {small}', text, now, now))
+        elif table == 1:
+            db.execute('INSERT INTO essays (id, user_id, title, content, created_at) VALUES (?,?,?,?,?)',
+                       (gen_id(USER), USER, f'Essay {small}', text, now))
+        else:
+            db.execute('INSERT INTO error_questions (id, user_id, question, explanation, created_at) VALUES (?,?,?,?,?)',
+                       (gen_id(USER), USER, text[:200], text, now))
+        written += len(text.encode('utf-8'))
+        small += 1
+        if small % 1000 == 0:
+            db.commit()
+    db.commit()
+    db.close()
+    return {'megabytes': megabytes, 'largeRows': i, 'smallRows': small}
+
+
+def run_export(tmp, gzip):
+    out = os.path.join(tmp, 'export.ndjson' + ('.gz' if gzip else ''))
+    stats_path = os.path.join(tmp, 'stats.json')
+    subprocess.run([sys.executable, '-m', 'tools.export_user', USER, '-o', out, '--stats', stats_path],
+                   cwd=BACKEND_DIR, env=dict(os.environ, DATABASE_PATH=config.DATABASE_PATH, DB_SHARDS='1'),
+                   check=True, stderr=subprocess.DEVNULL)
+    with open(stats_path) as f:
+        stats = json.load(f)
+    os.remove(out)
+    return {'gzip': gzip, 'bytes': stats['bytes'], 'seconds': stats['seconds'],
+            'mbPerSec': round(stats['bytes'] / 1024 / 1024 / max(stats['seconds'], 0.001), 1),
+            'maxRssMb': stats['maxRssMb']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure streaming export time and memory')
+    parser.add_argument('--mb', type=int, default=256, help='approximate size of the user data in MB')
+    parser.add_argument('--naive', action='store_true', help='also run the load-everything export')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+        config.DB_SHARDS = 1
+        database.init_db()
+        start = time.perf_counter()
+        results = {'data': populate(config.DATABASE_PATH, args.mb)}
+        results['data']['populateSeconds'] = round(time.perf_counter() - start, 1)
+        results['data']['dbMb'] = round(os.path.getsize(config.DATABASE_PATH) / 1024 / 1024, 1)
+        print(f'{args.mb} MB user: {results["data"]["largeRows"]} books/papers, {results["data"]["smallRows"]} small rows '
+              f'(db {results["data"]["dbMb"]} MB)')
+
+        results['export'] = [run_export(tmp, False), run_export(tmp, True)]
+        for row in results['export']:
+            label = 'ndjson.gz' if row['gzip'] else 'ndjson'
+            print(f'{label:<10} {row["bytes"] / 1024 / 1024:>8.1f} MB in {row["seconds"]:>6} s '
+                  f'({row["mbPerSec"]} MB/s)  peak RSS {row["maxRssMb"]} MB')
+
+        if args.naive:
+            out = subprocess.run([sys.executable, '-c', NAIVE, config.DATABASE_PATH, USER, os.path.join(tmp, 'naive.json')],
+                                 capture_output=True, text=True, check=True).stdout
+            results['naive'] = json.loads(out)
+            print(f'{"naive":<10} {results["naive"]["bytes"] / 1024 / 1024:>8.1f} MB in {results["naive"]["seconds"]:>6} s  '
+                  f'peak RSS {results["naive"]["maxRssMb"]} MB')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
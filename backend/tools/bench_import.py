@@ -0,0 +1,82 @@
+"""Measure bulk import throughput of the import endpoints.
+
+Posts generated error questions, notes and quotes (as JSON and as CSV) to
+the app in-process, against a throwaway database:
+
+    python -m tools.bench_import --rows 10000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+ENDPOINTS = {
+    'error-questions': ('/api/v1/error-questions/import', lambda i, rng: {
+        'question': f'第{i}题：已知函数 f(x) = {rng.randint(1, 9)}x + {rng.randint(1, 99)}，求 f({rng.randint(1, 9)})',
+        'userAnswer': str(rng.randint(1, 99)), 'correctAnswer': str(rng.randint(1, 99)),
+        'explanation': '代入计算即可。' * rng.randint(1, 20), 'subject': rng.choice(['数学', '物理', '英语']),
+        'difficulty': rng.choice(['easy', 'medium', 'hard']),
+    }),
+    'notes': ('/api/v1/notes/import', lambda i, rng: {
+        'title': f'笔记 {i}', 'content': '复习要点：' + 'theory 概念 练习 ' * rng.randint(5, 100),
+        'tags': ['导入', rng.choice(['数学', '语文'])],
+    }),
+    'quotes': ('/api/v1/quotes/import', lambda i, rng: {
+        'content': f'学而不思则罔，思而不学则殆。#{i}', 'author': '孔子', 'category': '学习',
+    }),
+}
+
+
+def to_csv(items):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(items[0]))
+    writer.writeheader()
+    for item in items:
+        writer.writerow({k: ';'.join(v) if isinstance(v, list) else v for k, v in item.items()})
+    return out.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure bulk import throughput')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+    os.environ['IMPORT_MAX_ROWS'] = str(max(args.rows, 20000))
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    from app import create_app
+    client = create_app().test_client()
+    rng = random.Random(1)
+
+    results = []
+    for name, (path, make) in ENDPOINTS.items():
+        items = [make(i, rng) for i in range(args.rows)]
+        for fmt in ('json', 'csv'):
+            if fmt == 'json':
+                body, content_type = json.dumps(items, ensure_ascii=False).encode('utf-8'), 'application/json'
+            else:
+                body, content_type = to_csv(items), 'text/csv'
+            start = time.perf_counter()
+            response = client.post(f'{path}?userId=bench-{fmt}', data=body, content_type=content_type)
+            seconds = time.perf_counter() - start
+            result = response.get_json()
+            row = {'endpoint': name, 'format': fmt, 'rows': args.rows, 'imported': result['imported'],
+                   'failed': result['failed'], 'seconds': round(seconds, 3),
+                   'rowsPerSec': round(result['imported'] / seconds)}
+            results.append(row)
+            print(f'{name:<16} {fmt:<5} {row["imported"]:>7} rows in {row["seconds"]:>6} s  '
+                  f'{row["rowsPerSec"]:>8} rows/s  ({row["failed"]} failed)')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Measure the error-question near-duplicate index: insert cost, lookup cost, clusters.
+
+Generates error questions from a few hundred templates (numbers changed,
+now and then a word swapped or dropped, the way repeated mistakes of one
+kind look) plus one-off questions, indexes them into a throwaway database,
+and reports for each size:
+
+    - index throughput, inserting in bulk-import sized transactions
+    - lookup time for a new question: the LSH index against comparing
+      with every signature of the user (what a linear scan would cost)
+    - cluster quality against the templates: purity (share of questions in
+      a cluster whose majority template is theirs) and completeness (share
+      of a template's questions in its largest cluster)
+
+    python -m tools.bench_question_index --sizes 1000,10000,100000 --users 100
+
+--users spreads the questions over that many users; with --users 1 every
+question belongs to one user, the worst case for a lookup.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+WORDS = ('已知 求 函数 方程 解 三角形 速度 时间 路程 面积 周长 半径 圆 正方形 长方形 概率 抽取 小球 '
+         '红色 白色 电阻 电压 电流 功率 质量 密度 浓度 溶液 反应 化学式 单词 句子 翻译 填空 选择 '
+         '最大值 最小值 取值范围 不等式 数列 公差 公比 第 项 和 的 是 多少 为 若 则 且 在 中 与').split()
+
+
+def make_templates(rng, count):
+    templates = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+        for _ in range(rng.randint(2, 4)):
+            words.insert(rng.randrange(len(words)), '{n}')
+        templates.append(words)
+    return templates
+
+
+def instantiate(rng, template):
+    words = []
+    for word in template:
+        if word == '{n}':
+            words.append(str(rng.randint(1, 999)))
+        elif rng.random() < 0.05:
+            continue
+        elif rng.random() < 0.05:
+            words.append(rng.choice(WORDS))
+        else:
+            words.append(word)
+    return ''.join(words) + '。'
+
+
+def generate(rng, total, users, templates):
+    """[(question_id, user_id, text, label)]; a user draws from a subset of templates, 20% one-offs."""
+    questions = []
+    per_user = {u: rng.sample(range(len(templates)), min(len(templates), rng.randint(5, 40))) for u in range(users)}
+    for i in range(total):
+        user = i % users
+        if rng.random() < 0.2:
+            label = f'one-off-{i}'
+            text = instantiate(rng, make_templates(rng, 1)[0])
+        else:
+            t = rng.choice(per_user[user])
+            label = f't{t}'
+            text = instantiate(rng, templates[t])
+        questions.append((f'q{i}', f'user-{user}', text, label))
+    return questions
+
+
+def run(total, users, seed=1):
+    import database
+    from services import question_index
+    from utils import similarity
+    rng = random.Random(seed)
+    templates = make_templates(rng, 300)
+    questions = generate(rng, total, users, templates)
+
+    db = database.get_db()
+    start = time.perf_counter()
+    for offset in range(0, total, 1000):
+        with db:
+            question_index.add(db, [(q, u, text) for q, u, text, _ in questions[offset:offset + 1000]])
+    index_seconds = time.perf_counter() - start
+
+    probes = [(f'user-{rng.randrange(users)}', instantiate(rng, rng.choice(templates))) for _ in range(200)]
+    start = time.perf_counter()
+    for user, text in probes:
+        sig = similarity.signature(text)
+        question_index._similar_clusters(db, user, sig, similarity.band_keys(sig))
+    lsh_ms = (time.perf_counter() - start) / len(probes) * 1000
+
+    start = time.perf_counter()
+    for user, text in probes[:50]:
+        sig = similarity.signature(text)
+        {r['cluster_id'] for r in db.execute(
+            'SELECT signature, cluster_id FROM error_question_index WHERE user_id = ?', (user,))
+         if r['signature'] and similarity.similarity(sig, similarity.unpack(r['signature'])) >= 0.5}
+    scan_ms = (time.perf_counter() - start) / 50 * 1000
+
+    cluster_of = {r['question_id']: r['cluster_id'] for r in db.execute('SELECT question_id, cluster_id FROM error_question_index')}
+    db.close()
+    members = defaultdict(list)
+    by_label = defaultdict(list)
+    for q, user, _, label in questions:
+        members[(user, cluster_of[q])].append(label)
+        by_label[(user, label)].append(cluster_of[q])
+    purity = sum(Counter(labels).most_common(1)[0][1] for labels in members.values()) / total
+    repeated = {k: v for k, v in by_label.items() if not k[1].startswith('one-off')}
+    completeness = (sum(Counter(clusters).most_common(1)[0][1] for clusters in repeated.values())
+                    / sum(len(v) for v in repeated.values()))
+    return {
+        'questions': total, 'users': users,
+        'indexPerSec': round(total / index_seconds),
+        'lookupMs': round(lsh_ms, 3), 'scanMs': round(scan_ms, 3),
+        'clusters': len(members), 'kinds': len(by_label),
+        'purity': round(purity, 3), 'completeness': round(completeness, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the error-question near-duplicate index')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated question counts')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    import config
+    import database
+    results = []
+    for total in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            config.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+            config.DB_SHARDS = 1
+            database.init_db()
+            row = run(total, args.users)
+        results.append(row)
+        print(f'{total:>8} questions / {args.users} users: index {row["indexPerSec"]:>6}/s  '
+              f'lookup {row["lookupMs"]:>7} ms (scan {row["scanMs"]:>8} ms)  '
+              f'{row["clusters"]} clusters for {row["kinds"]} kinds, purity {row["purity"]}, completeness {row["completeness"]}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
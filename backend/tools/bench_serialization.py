@@ -0,0 +1,123 @@
+"""Measure JSON serialization CPU and bytes on the wire for book/paper payloads.
+
+Builds synthetic rows of the given sizes, formats them with the real
+_format_book/_format_paper, and compares the stdlib and orjson encoders and
+the gzip/brotli encodings the app would negotiate:
+
+    python -m tools.bench_serialization --sizes 10k,1m,5m --repeat 20
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from utils import compression  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Common characters and words; random draws keep the text about as compressible as real prose
+CJK = '的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持取设始版双历越史商千片容研像找友孩站广改议形委早房音火际则首单据导影失拿网香似斯专石若兵弟谁校读志飞观争究包组造落视济喜离虽坐集编宝谈府拉黑且随格尽剑讲布杀微怕母调局根曾准团段终乐切级克精哪官示冷域读'
+LATIN = ['learning', 'review', 'memory', 'function', 'derivative', 'model', 'theory', 'interval', 'practice', 'data']
+
+
+def make_text(chars):
+    rng = random.Random(chars)
+    parts = []
+    length = 0
+    while length < chars:
+        if rng.random() < 0.15:
+            piece = ' '.join(rng.choice(LATIN) for _ in range(rng.randint(3, 8))) + '. '
+        else:
+            piece = ''.join(rng.choice(CJK) for _ in range(rng.randint(8, 30))) + rng.choice('，。；\n')
+        parts.append(piece)
+        length += len(piece)
+    return ''.join(parts)[:chars]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000 * 1000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def payloads(chars):
+    from blueprints.books import _format_book
+    from blueprints.papers import _format_paper
+    now = '2026-01-01T00:00:00.000Z'
+    book = {'id': 'b1', 'title': '示例书籍', 'author': '作者', 'content': make_text(chars),
+            'summary': make_text(400), 'user_id': 'u1', 'created_at': now, 'updated_at': now}
+    paper = {'id': 'p1', 'title': 'Sample paper', 'authors': json.dumps(['A', 'B']), 'abstract': make_text(500),
+             'content': make_text(chars), 'translated_content': make_text(chars // 2),
+             'user_id': 'u1', 'created_at': now, 'updated_at': now}
+    return [('book', lambda: _format_book(book)), ('paper', lambda: _format_paper(paper))]
+
+
+def cpu_ms(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = fn()
+    return (time.process_time() - start) * 1000 / repeat, result
+
+
+def encoders():
+    # Mirrors what Flask's default provider and utils.json_provider emit
+    result = [('stdlib', lambda obj: json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8'))]
+    if orjson is not None:
+        result.append(('orjson', lambda obj: orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)))
+    return result
+
+
+def run(sizes, repeat):
+    rows = []
+    for chars in sizes:
+        for name, build in payloads(chars):
+            format_ms, obj = cpu_ms(build, repeat)
+            for encoder, dumps in encoders():
+                encode_ms, body = cpu_ms(lambda: dumps(obj), repeat)
+                row = {'payload': name, 'chars': chars, 'encoder': encoder,
+                       'formatMs': round(format_ms, 3), 'encodeMs': round(encode_ms, 3), 'bytes': len(body)}
+                gzip_ms, gz = cpu_ms(lambda: gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0), max(1, repeat // 4))
+                row.update(gzipMs=round(gzip_ms, 3), gzipBytes=len(gz))
+                if 'br' in compression.available_encodings():
+                    br_ms, br = cpu_ms(lambda: compression.compress(body, 'br'), max(1, repeat // 4))
+                    row.update(brMs=round(br_ms, 3), brBytes=len(br))
+                rows.append(row)
+    return rows
+
+
+def print_table(rows):
+    headers = ['payload', 'chars', 'encoder', 'formatMs', 'encodeMs', 'bytes', 'gzipMs', 'gzipBytes', 'brMs', 'brBytes']
+    print(' '.join(f'{h:>10}' for h in headers))
+    for row in rows:
+        print(' '.join(f'{row.get(h, "-"):>10}' for h in headers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON encoding and compression of book/paper payloads')
+    parser.add_argument('--sizes', default='10k,1m,5m', help='content sizes in characters, comma separated')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    rows = run([parse_size(s) for s in args.sizes.split(',')], args.repeat)
+    print_table(rows)
+    if orjson is None:
+        print('\norjson is not installed; only the stdlib encoder was measured')
+    if 'br' not in compression.available_encodings():
+        print('brotli is not installed; only gzip was measured')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Measure write throughput against 1, 2, 4, ... SQLite shards.
+
+Writer processes insert notes for random users the way POST /api/v1/notes
+does (connection per request, one INSERT, commit) into a throwaway database
+split DB_SHARDS ways, for a fixed time per shard count:
+
+    python -m tools.bench_shards --shards 1,2,4,8 --writers 8 --seconds 5
+
+--txn-ms keeps each transaction open that long before committing, standing in
+for handlers that do work between their first write and the commit (book
+upload builds the chapter index inside its transaction).
+
+SQLite lets one writer at a time into each file, so with several writers the
+single-file setup spends its time waiting on the write lock; more shards mean
+fewer writers per lock. The gain stops once the disk (fsync) or the CPUs are
+the limit, which the numbers make visible on a given machine.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import config
+import database
+from utils.helpers import gen_id, now_iso
+
+
+def writer(path, shards, seconds, users, txn_ms, seed, results):
+    config.DATABASE_PATH = path
+    config.DB_SHARDS = shards
+    rng = random.Random(seed)
+    body = '复习笔记 ' * 40
+    done = busy = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = f'user-{rng.randrange(users)}'
+        start = time.perf_counter()
+        try:
+            db = database.get_db(user_id)
+            now = now_iso()
+            db.execute(
+                'INSERT INTO notes (id, user_id, title, content, method, cornell_data, feynman_result, tags, next_review_at, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                (gen_id(user_id), user_id, 'bench', body, 'free', '{}', '{}', '[]', now, now, now)
+            )
+            if txn_ms:
+                time.sleep(txn_ms / 1000)
+            db.commit()
+            db.close()
+        except sqlite3.OperationalError:
+            busy += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        done += 1
+    results.put((done, busy, latencies))
+
+
+def run(shards, writers, seconds, users, txn_ms=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        config.DATABASE_PATH = path
+        config.DB_SHARDS = shards
+        database.init_db()
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(path, shards, seconds, users, txn_ms, i, results))
+                 for i in range(writers)]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        per_shard = []
+        for shard in range(shards):
+            conn = sqlite3.connect(database.shard_path(shard))
+            per_shard.append(conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0])
+            conn.close()
+
+    done = sum(c[0] for c in collected)
+    latencies = sorted(x for c in collected for x in c[2])
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    return {
+        'shards': shards,
+        'writers': writers,
+        'writes': done,
+        'busyErrors': sum(c[1] for c in collected),
+        'writesPerSec': round(done / seconds, 1),
+        'p50Ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0,
+        'p99Ms': round(p99 * 1000, 2),
+        'rowsPerShard': per_shard,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure write throughput across SQLite shard counts')
+    parser.add_argument('--shards', default='1,2,4,8', help='comma-separated shard counts')
+    parser.add_argument('--writers', type=int, default=8, help='concurrent writer processes')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--txn-ms', type=float, default=0, help='extra time each write transaction stays open')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for shards in [int(s) for s in args.shards.split(',')]:
+        row = run(shards, args.writers, args.seconds, args.users, args.txn_ms)
+        results.append(row)
+        base = results[0]['writesPerSec'] or 1
+        print(f'{shards:>3} shard(s): {row["writesPerSec"]:>9} writes/s  x{row["writesPerSec"] / base:.2f}  '
+              f'p50 {row["p50Ms"]} ms  p99 {row["p99Ms"]} ms  busy {row["busyErrors"]}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'cpus': os.cpu_count(), 'txnMs': args.txn_ms, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Measure cold start time and memory of the app.
+
+Cold start: fresh interpreters import the app and call create_app(), with and
+without the LLM client loaded, against a throwaway database:
+
+    python -m tools.bench_startup --runs 5
+
+Per-worker memory under gunicorn (reads /proc/<pid>/smaps_rollup, Linux only):
+
+    python -m tools.bench_startup --gunicorn --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import resource, time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+if {load_client}:
+    from services.ai_service import get_client
+    get_client()
+done = time.perf_counter()
+print(created - start, done - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def cold_start(runs, load_client):
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'))
+        # First run creates the schema; it is measured separately
+        for i in range(runs + 1):
+            out = subprocess.run(
+                [sys.executable, '-c', PROBE.format(load_client=load_client)],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+            ).stdout.split()
+            samples.append((float(out[-3]), float(out[-2]), int(out[-1])))
+    first, rest = samples[0], samples[1:]
+    return {
+        'loadClient': load_client,
+        'firstRunMs': round(first[1] * 1000, 1),
+        'createAppMs': round(statistics.median(s[0] for s in rest) * 1000, 1),
+        'totalMs': round(statistics.median(s[1] for s in rest) * 1000, 1),
+        'maxRssMb': round(statistics.median(s[2] for s in rest) / 1024, 1),
+    }
+
+
+def smaps(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {'rssMb': round(fields.get('Rss', 0) / 1024, 1), 'pssMb': round(fields.get('Pss', 0) / 1024, 1),
+            'privateMb': round(private / 1024, 1)}
+
+
+def children(pid):
+    path = f'/proc/{pid}/task/{pid}/children'
+    with open(path) as f:
+        return [int(p) for p in f.read().split()]
+
+
+def gunicorn_memory(workers, port, requests_per_worker):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'), WEB_CONCURRENCY=str(workers),
+                   BIND=f'127.0.0.1:{port}', GUNICORN_ACCESS_LOG='/dev/null')
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f'http://127.0.0.1:{port}/api/health'
+            while True:
+                try:
+                    urllib.request.urlopen(url, timeout=1).read()
+                    break
+                except OSError:
+                    if proc.poll() is not None or time.perf_counter() - start > 60:
+                        raise RuntimeError('gunicorn did not start')
+                    time.sleep(0.05)
+            ready_ms = (time.perf_counter() - start) * 1000
+            # Touch every worker a little so the numbers include first-request allocations
+            for _ in range(workers * requests_per_worker):
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/api/v1/notes/user/bench', timeout=5).read()
+            time.sleep(0.5)
+            worker_pids = children(proc.pid)
+            return {
+                'workers': workers,
+                'readyMs': round(ready_ms, 1),
+                'master': smaps(proc.pid),
+                'workersMem': [smaps(pid) for pid in worker_pids],
+            }
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app cold start time and memory')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help='also start gunicorn and report per-worker memory')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    results = {'coldStart': [cold_start(args.runs, False), cold_start(args.runs, True)]}
+    for row in results['coldStart']:
+        label = 'create_app() + LLM client' if row['loadClient'] else 'create_app()'
+        print(f'{label:<28} total {row["totalMs"]:>7} ms  (create_app {row["createAppMs"]} ms, '
+              f'first run with schema {row["firstRunMs"]} ms)  max RSS {row["maxRssMb"]} MB')
+
+    if args.gunicorn:
+        mem = gunicorn_memory(args.workers, args.port, 5)
+        results['gunicorn'] = mem
+        print(f'\ngunicorn ready in {mem["readyMs"]} ms; master RSS {mem["master"]["rssMb"]} MB')
+        for i, w in enumerate(mem['workersMem']):
+            print(f'  worker {i}: RSS {w["rssMb"]} MB  PSS {w["pssMb"]} MB  private {w["privateMb"]} MB')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
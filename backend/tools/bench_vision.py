@@ -0,0 +1,202 @@
+"""Measure photo preprocessing for error-question capture against sending raw photos.
+
+Renders synthetic 12-megapixel phone photos of worksheets (page on a desk,
+sensor noise, stored sideways with an EXIF rotation, JPEG quality 92) and
+reports:
+
+    - bytes and pixels before / after preprocessing (utils/images.py), and its cost
+    - image hash distances between copies of the same photo (re-sent,
+      re-compressed by a chat app), of the same page shot again, and of
+      different pages, to check VISION_HASH_DISTANCE
+    - POST /api/v1/error-questions/from-image end to end against
+      tools/fake_llm_server.py, with VISION_PREPROCESS off and on: bytes sent
+      to the model, latency, and latency when the photo is sent again
+
+    python -m tools.bench_vision --photos 6 --uplink-mbps 10
+
+The fake model answers instantly, so the latency is local work only; the
+upload estimate adds what moving the request to the model would take at
+--uplink-mbps.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+
+def render_page(seed, angle=None, offset=None, size=(4032, 3024)):
+    """JPEG bytes of a phone photo of worksheet page `seed`, as the camera stores it."""
+    from PIL import Image, ImageDraw, ImageFont
+    rng = random.Random(seed)
+    # The page is shot upright, the landscape sensor stores it sideways
+    scene = Image.new('RGB', (size[1], size[0]), (118, 92, 64))
+
+    paper = Image.new('RGB', (int(scene.width * 0.82), int(scene.height * 0.78)), (246, 244, 238))
+    draw = ImageDraw.Draw(paper)
+    font = ImageFont.load_default(size=46)
+    small = ImageFont.load_default(size=38)
+    y = 140
+    draw.text((120, y), f'Unit {rng.randint(1, 12)} review  -  worksheet {seed}', fill=(20, 20, 20), font=font)
+    y += 120
+    for n in range(1, rng.randint(4, 7)):
+        a, b, x = rng.randint(2, 9), rng.randint(1, 30), rng.randint(1, 12)
+        draw.text((120, y), f'{n}. Solve {a}x + {b} = {a * x + b} and check the answer.', fill=(25, 25, 25), font=font)
+        y += 70
+        for _ in range(rng.randint(1, 3)):
+            words = ' '.join(rng.choice(['so', 'then', 'x', '=', 'move', 'divide', 'both', 'sides', str(rng.randint(1, 99))])
+                             for _ in range(rng.randint(6, 12)))
+            draw.text((170, y), words, fill=(40, 40, 90), font=small)
+            y += 58
+        draw.text((170, y), f'x = {x + rng.choice([-1, 1])}', fill=(200, 30, 30), font=font)
+        y += 110
+    if rng.random() < 0.5:
+        draw.rectangle((paper.width - 700, 300, paper.width - 140, 800), outline=(30, 30, 30), width=5)
+
+    tilt = angle if angle is not None else rng.uniform(-2, 2)
+    paper = paper.rotate(tilt, expand=True, resample=Image.BICUBIC, fillcolor=(118, 92, 64))
+    dx, dy = offset or (0, 0)
+    scene.paste(paper, ((scene.width - paper.width) // 2 + dx, (scene.height - paper.height) // 2 + dy))
+
+    noise = Image.effect_noise(scene.size, 40).convert('RGB')
+    scene = Image.blend(scene, noise, 0.06)
+
+    stored = scene.transpose(Image.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # display rotated 90 degrees clockwise
+    out = io.BytesIO()
+    stored.save(out, 'JPEG', quality=92, exif=exif)
+    return out.getvalue()
+
+
+def recompress(data):
+    """What a chat app does to a forwarded photo: half size, quality 70."""
+    from PIL import Image, ImageOps
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image = image.resize((image.width // 2, image.height // 2))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=70)
+    return out.getvalue()
+
+
+def measure_preprocess(photos):
+    from PIL import Image
+    from utils import images
+    rows = []
+    for data in photos:
+        original = Image.open(io.BytesIO(data)).size
+        start = time.perf_counter()
+        image = images.load(data)
+        images.image_hash(image)
+        jpeg = images.encode(image)
+        seconds = time.perf_counter() - start
+        width, height = Image.open(io.BytesIO(jpeg)).size
+        rows.append({'bytes': len(data), 'pixels': original[0] * original[1], 'outBytes': len(jpeg),
+                     'outPixels': width * height, 'ms': round(seconds * 1000, 1)})
+    return {
+        'photos': len(rows),
+        'meanBytes': round(statistics.mean(r['bytes'] for r in rows)),
+        'meanOutBytes': round(statistics.mean(r['outBytes'] for r in rows)),
+        'meanPixels': round(statistics.mean(r['pixels'] for r in rows)),
+        'meanOutPixels': round(statistics.mean(r['outPixels'] for r in rows)),
+        'meanMs': round(statistics.mean(r['ms'] for r in rows), 1),
+        'maxMs': max(r['ms'] for r in rows),
+    }
+
+
+def measure_hashes(pages, photos):
+    from utils import images
+
+    def hash_of(data):
+        return images.image_hash(images.load(data))
+
+    hashes = [hash_of(p) for p in photos]
+    recompressed, reshot = [], []
+    for page, data, h in zip(pages, photos, hashes):
+        recompressed.append(images.hash_distance(h, hash_of(recompress(data))))
+        again = render_page(page, angle=random.Random(page).uniform(-2, 2) + 0.7, offset=(25, -30))
+        reshot.append(images.hash_distance(h, hash_of(again)))
+    different = [images.hash_distance(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    return {'recompressed': recompressed, 'reshot': reshot,
+            'differentMin': min(different) if different else None,
+            'differentMean': round(statistics.mean(different), 1) if different else None}
+
+
+def measure_endpoint(client, llm, photos, preprocess, uplink_mbps):
+    import config
+    config.VISION_PREPROCESS = preprocess
+    rows = []
+    for repeat in (False, True):
+        for i, data in enumerate(photos):
+            before = llm.RequestHandlerClass.stats['requestBytes']
+            start = time.perf_counter()
+            response = client.post('/api/v1/error-questions/from-image', content_type='multipart/form-data', data={
+                'userId': 'bench-user', 'image': (io.BytesIO(data), f'photo{i}.jpg', 'image/jpeg'),
+            })
+            seconds = time.perf_counter() - start
+            assert response.status_code == 200, response.get_json()
+            sent = llm.RequestHandlerClass.stats['requestBytes'] - before
+            rows.append({'repeat': repeat, 'cached': response.get_json()['fromCache'], 'sentBytes': sent,
+                         'ms': seconds * 1000, 'uploadMs': sent * 8 / (uplink_mbps * 1e6) * 1000})
+    first = [r for r in rows if not r['repeat']]
+    again = [r for r in rows if r['repeat']]
+    return {
+        'preprocess': preprocess,
+        'meanSentBytes': round(statistics.mean(r['sentBytes'] for r in first)),
+        'meanMs': round(statistics.mean(r['ms'] for r in first), 1),
+        'meanUploadMs': round(statistics.mean(r['uploadMs'] for r in first), 1),
+        'repeatCacheHits': sum(r['cached'] for r in again),
+        'repeatMeanMs': round(statistics.mean(r['ms'] for r in again), 1),
+        'repeatSentBytes': sum(r['sentBytes'] for r in again),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure photo preprocessing for error-question capture')
+    parser.add_argument('--photos', type=int, default=6, help='number of different worksheet photos')
+    parser.add_argument('--uplink-mbps', type=float, default=10, help='bandwidth to the model API for the upload estimate')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    from tools.fake_llm_server import make_server
+    llm = make_server(port=0)
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+    os.environ['DASHSCOPE_BASE_URL'] = f'http://127.0.0.1:{llm.server_address[1]}/v1'
+    import config
+    from app import create_app
+    client = create_app().test_client()
+
+    pages = list(range(1, args.photos + 1))
+    photos = [render_page(page) for page in pages]
+    results = {'preprocess': measure_preprocess(photos), 'hashes': measure_hashes(pages, photos)}
+    pre = results['preprocess']
+    print(f'photos: {pre["meanBytes"] / 1024:.0f} KB, {pre["meanPixels"] / 1e6:.1f} MP -> '
+          f'{pre["meanOutBytes"] / 1024:.0f} KB, {pre["meanOutPixels"] / 1e6:.2f} MP '
+          f'in {pre["meanMs"]} ms (max {pre["maxMs"]} ms)')
+    hashes = results['hashes']
+    print(f'hash distance (bits, VISION_HASH_DISTANCE={config.VISION_HASH_DISTANCE}): '
+          f'recompressed copy {hashes["recompressed"]}, same page shot again {hashes["reshot"]}, '
+          f'different pages >= {hashes["differentMin"]} (mean {hashes["differentMean"]})')
+
+    results['endpoint'] = [measure_endpoint(client, llm, photos, preprocess, args.uplink_mbps) for preprocess in (False, True)]
+    for row in results['endpoint']:
+        label = 'preprocessed' if row['preprocess'] else 'raw'
+        print(f'{label:<13} sent {row["meanSentBytes"] / 1024:>7.0f} KB/request  {row["meanMs"]:>7} ms local '
+              f'+ ~{row["meanUploadMs"]} ms upload at {args.uplink_mbps:g} Mbps;  '
+              f'again: {row["repeatCacheHits"]}/{len(photos)} cached, {row["repeatMeanMs"]} ms, {row["repeatSentBytes"]} bytes sent')
+
+    llm.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
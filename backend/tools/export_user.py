@@ -0,0 +1,95 @@
+"""Export all of a user's data as NDJSON from the command line.
+
+Same format as GET /api/v1/export/user/<id> (see services/export.py), read
+straight from the database:
+
+    python -m tools.export_user alice -o alice.ndjson.gz      # gzip by extension
+    python -m tools.export_user alice --after books:42 >> alice.ndjson
+
+When an export is interrupted, the last cursor written is printed so the run
+can be continued with --after (gzip members can be appended to one file).
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+from services import export
+from utils.compression import compress_stream
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec on Linux, so a child of a big process would report
+    # its parent's peak; VmHWM belongs to this process image only
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run(user_id, out, after=None, gzip=False):
+    """Write the export to the binary file out; returns stats."""
+    start = time.perf_counter()
+    written = 0
+    last_cursor = after
+    lines = export.export_user(user_id, after)
+
+    def tracked():
+        nonlocal last_cursor
+        for line in lines:
+            # Cheap check before parsing: only a record's last line has a cursor
+            if b'"cursor"' in line[-200:]:
+                last_cursor = json.loads(line).get('cursor', last_cursor)
+            yield line
+
+    body = export.blocks(tracked())
+    if gzip:
+        body = compress_stream(body, 'gzip')
+    try:
+        for block in body:
+            out.write(block)
+            written += len(block)
+    except BaseException:
+        print(f'Export interrupted; continue with --after {last_cursor}', file=sys.stderr)
+        raise
+    return {
+        'userId': user_id,
+        'bytes': written,
+        'seconds': round(time.perf_counter() - start, 2),
+        'maxRssMb': peak_rss_mb(),
+        'lastCursor': last_cursor,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a user's data as NDJSON")
+    parser.add_argument('user_id')
+    parser.add_argument('-o', '--output', help='output file (default stdout); a .gz name enables gzip')
+    parser.add_argument('--after', help='resume after this cursor')
+    parser.add_argument('--gzip', action='store_true', help='gzip the output')
+    parser.add_argument('--append', action='store_true', help='append to the output file instead of replacing it')
+    parser.add_argument('--stats', metavar='PATH', help='write time / size / peak RSS as JSON')
+    args = parser.parse_args()
+
+    gzip = args.gzip or (args.output or '').endswith('.gz')
+    try:
+        if args.output:
+            with open(args.output, 'ab' if args.append else 'wb') as out:
+                stats = run(args.user_id, out, args.after, gzip)
+        else:
+            stats = run(args.user_id, sys.stdout.buffer, args.after, gzip)
+    except export.CursorError as e:
+        parser.error(str(e))
+
+    print(f'{stats["bytes"]} bytes in {stats["seconds"]} s, peak RSS {stats["maxRssMb"]} MB', file=sys.stderr)
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
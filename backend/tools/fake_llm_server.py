@@ -0,0 +1,261 @@
+"""Local stand-in for the DashScope OpenAI-compatible API.
+
+Serves POST /chat/completions (and /v1/chat/completions) with canned replies
+shaped like what each blueprint's prompt asks for, so the app can be load
+tested without spending quota:
+
+    python -m tools.fake_llm_server --port 8001 --latency lognormal:-0.7,0.5
+    DASHSCOPE_BASE_URL=http://127.0.0.1:8001/v1 python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JSON_SUFFIX = '请以JSON格式返回结果'
+
+PROBLEM_ANALYSIS = {
+    'problemType': '计算题', 'difficulty': 'medium',
+    'requiredConcepts': ['一元二次方程', '因式分解'], 'estimatedTime': 15,
+    'solutionApproach': ['审题', '列方程', '求解', '检验'],
+}
+
+
+def _batch_analysis(messages):
+    count = len(re.findall(r'^\d+\. ', messages[-1].get('content', ''), re.M))
+    return {'results': [dict(PROBLEM_ANALYSIS, index=i + 1) for i in range(count)]}
+
+
+# (system prompt keyword, canned JSON reply or callable(messages)) — first match wins
+CANNED_JSON = [
+    ('逐题分析', _batch_analysis),
+    ('题目分析专家', PROBLEM_ANALYSIS),
+    ('解题提示专家', {
+        'stepNumber': 1, 'hintLevel': 'gentle',
+        'content': '先想想题目中哪些量是已知的。', 'revealsSolution': False,
+    }),
+    ('出题专家', [
+        {'question': '解方程 x^2 - 5x + 6 = 0', 'correctAnswer': 'x=2 或 x=3',
+         'explanation': '因式分解为 (x-2)(x-3)=0', 'hints': ['尝试因式分解'],
+         'subject': '数学', 'difficulty': 'medium', 'problemType': '计算题',
+         'basedOnErrorId': ''},
+    ] * 3),
+    ('SQ3R', {'steps': [
+        {'step': s, 'title': s.capitalize(), 'content': '按照该步骤阅读本章节。', 'completed': False}
+        for s in ('survey', 'question', 'read', 'recite', 'review')
+    ]}),
+    ('学术术语注释', {'annotations': [
+        {'term': 'Transformer', 'explanation': '基于自注意力机制的神经网络结构', 'context': '模型架构'},
+    ]}),
+    ('学术论文摘要', {
+        'overview': '本文提出了一种新方法。', 'keyFindings': ['效果优于基线'],
+        'methodology': '对比实验', 'conclusions': '方法有效', 'significance': '具有应用价值',
+    }),
+    ('作文批改', {
+        'analysis': {
+            'structureScore': 80, 'languageScore': 85, 'contentScore': 75, 'overallScore': 80,
+            'structureAnalysis': '结构清晰', 'languageAnalysis': '语言流畅', 'contentAnalysis': '内容充实',
+        },
+        'improvementPoints': [{'category': '内容', 'issue': '论据不足', 'suggestion': '补充例子', 'priority': 'medium'}],
+        'optimizedExamples': [{'originalText': '原文', 'optimizedText': '优化后', 'explanation': '更具体', 'improvementType': '表达'}],
+        'strengths': ['立意明确'], 'areasForImprovement': ['论证深度'], 'overallComment': '整体不错。',
+    }),
+    ('错题识别', {
+        'question': '解方程 2x + 3 = 11', 'userAnswer': 'x=5', 'correctAnswer': 'x=4',
+        'explanation': '移项得 2x = 8，所以 x = 4', 'subject': '数学', 'difficulty': 'easy',
+    }),
+    ('分析用户情绪', {'mood': 'stressed', 'stressLevel': 6}),
+    ('放松建议', {'suggestions': ['深呼吸五次', '起身走动一下', '听一首喜欢的歌']}),
+    ('金句生成', {'content': '学而不思则罔，思而不学则殆。', 'author': '孔子', 'category': '学习'}),
+    ('康奈尔', {'cues': ['核心概念', '关键公式'], 'summary': '本笔记介绍了核心概念。', 'questions': ['核心概念是什么？']}),
+    ('写作助手', {'title': '示例文档', 'content': '# 示例文档\n这是一段自动生成的正文。'}),
+]
+
+FILLER = '这是一个用于压测的模拟回复，内容没有实际意义。'
+
+
+def parse_latency(spec):
+    """Turn 'fixed:0.5', 'uniform:0.2,1.5', 'normal:1,0.3' or 'lognormal:mu,sigma' into a sampler."""
+    kind, _, args = spec.partition(':')
+    params = [float(a) for a in args.split(',') if a]
+    if kind == 'fixed':
+        return lambda: params[0] if params else 0.0
+    if kind == 'uniform':
+        return lambda: random.uniform(params[0], params[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(params[0], params[1]))
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(params[0], params[1])
+    raise ValueError(f'Unknown latency distribution: {spec}')
+
+
+def estimate_tokens(content):
+    return max(1, len(content_text(content)) // 2)
+
+
+def content_text(content):
+    """Text of a message; image parts (vision requests) count as their data URL."""
+    if isinstance(content, list):
+        return ''.join(part.get('text') or part.get('image_url', {}).get('url', '') for part in content)
+    return content or ''
+
+
+def build_reply(messages, reply_chars):
+    system = next((content_text(m.get('content')) for m in messages if m.get('role') == 'system'), '')
+    last = content_text(messages[-1].get('content')) if messages else ''
+    if JSON_SUFFIX in last or 'JSON' in system:
+        for keyword, shape in CANNED_JSON:
+            if keyword in system:
+                if callable(shape):
+                    shape = shape(messages)
+                return json.dumps(shape, ensure_ascii=False)
+        return '{}'
+    return (FILLER * (reply_chars // len(FILLER) + 1))[:reply_chars]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    opts = None
+    stats = {'requests': 0, 'errors': 0, 'requestBytes': 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        if self.opts.verbose:
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/models', '/v1/models'):
+            return self._send_json(200, {'object': 'list', 'data': [{'id': self.opts.model, 'object': 'model'}]})
+        if self.path == '/stats':
+            with self.stats_lock:
+                return self._send_json(200, dict(self.stats))
+        self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/chat/completions', '/v1/chat/completions'):
+            return self._send_json(404, {'error': {'message': 'not found'}})
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            self.stats['requestBytes'] += length
+
+        opts = self.opts
+        roll = random.random()
+        if roll < opts.timeout_rate:
+            time.sleep(opts.hang_seconds)
+            return self._send_json(504, {'error': {'message': 'injected timeout', 'type': 'timeout'}})
+        if roll < opts.timeout_rate + opts.error_rate:
+            with self.stats_lock:
+                self.stats['errors'] += 1
+            status = random.choice(opts.error_codes)
+            return self._send_json(status, {'error': {'message': f'injected error {status}', 'type': 'injected'}})
+
+        time.sleep(opts.latency())
+
+        messages = body.get('messages', [])
+        model = body.get('model', opts.model)
+        reply = build_reply(messages, opts.reply_chars)
+        prompt_tokens = sum(estimate_tokens(m.get('content')) for m in messages)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': estimate_tokens(reply),
+            'total_tokens': prompt_tokens + estimate_tokens(reply),
+        }
+        completion_id = 'chatcmpl-' + uuid.uuid4().hex
+        created = int(time.time())
+
+        if body.get('stream'):
+            return self._stream(completion_id, created, model, reply, usage)
+
+        self._send_json(200, {
+            'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+            'usage': usage,
+        })
+
+    def _stream(self, completion_id, created, model, reply, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            if extra:
+                chunk.update(extra)
+            self.wfile.write(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n\n')
+            self.wfile.flush()
+
+        event({'role': 'assistant', 'content': ''})
+        step = self.opts.stream_chunk_chars
+        for i in range(0, len(reply), step):
+            if self.opts.token_delay:
+                time.sleep(self.opts.token_delay)
+            event({'content': reply[i:i + step]})
+        event({}, 'stop', {'usage': usage})
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host='127.0.0.1', port=8001, **overrides):
+    """Build a server without starting it; overrides take the same names as the CLI flags."""
+    opts = build_parser().parse_args([])
+    for key, value in overrides.items():
+        setattr(opts, key, value)
+    if isinstance(opts.latency, str):
+        opts.latency = parse_latency(opts.latency)
+    handler = type('Handler', (FakeLLMHandler,), {'opts': opts, 'stats': {'requests': 0, 'errors': 0, 'requestBytes': 0}})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible LLM server for load testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--model', default='fake-model')
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:S | uniform:LO,HI | normal:MU,SIGMA | lognormal:MU,SIGMA (seconds)')
+    parser.add_argument('--reply-chars', type=int, default=400, help='length of free-text replies')
+    parser.add_argument('--stream-chunk-chars', type=int, default=8)
+    parser.add_argument('--token-delay', type=float, default=0.0, help='seconds between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with an error')
+    parser.add_argument('--error-codes', type=lambda s: [int(c) for c in s.split(',')], default=[429, 500, 503])
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction of calls that hang')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--verbose', action='store_true')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    server = make_server(**vars(args))
+    print(f'Fake LLM listening on http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""Local stand-in for a Redis server, enough for services.cache's redis backend.
+
+Speaks RESP over TCP and implements the handful of commands the app uses
+(plus a few for poking at it by hand), keeping everything in memory:
+
+    python -m tools.fake_redis_server --port 6390
+    CACHE_URL=redis://127.0.0.1:6390/0 python app.py
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class Store:
+    def __init__(self):
+        self.data = {}  # key -> (bytes value, expires_at or None)
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item and item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return None
+        return item
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    store = None
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].decode().upper()
+            handler = getattr(self, f'cmd_{name.lower()}', None)
+            if handler is None:
+                self._error(f"ERR unknown command '{name}'")
+                continue
+            try:
+                with self.store.lock:
+                    handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                self._error(f"ERR wrong arguments for '{name}' command")
+            if name == 'QUIT':
+                return
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # inline command, e.g. typed into telnet
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    # Replies
+    def _simple(self, text):
+        self.wfile.write(f'+{text}\r\n'.encode())
+
+    def _error(self, text):
+        self.wfile.write(f'-{text}\r\n'.encode())
+
+    def _int(self, n):
+        self.wfile.write(f':{n}\r\n'.encode())
+
+    def _bulk(self, data):
+        if data is None:
+            self.wfile.write(b'$-1\r\n')
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(data), data))
+
+    # Commands
+    def cmd_ping(self, *args):
+        if args:
+            self._bulk(args[0])
+        else:
+            self._simple('PONG')
+
+    def cmd_quit(self):
+        self._simple('OK')
+
+    def cmd_select(self, db):
+        self._simple('OK')
+
+    def cmd_auth(self, *args):
+        self._simple('OK')
+
+    def cmd_get(self, key):
+        item = self.store._live(key)
+        self._bulk(item[0] if item else None)
+
+    def cmd_set(self, key, value, *options):
+        expires_at, nx, xx = None, False, False
+        options = [o.upper() if isinstance(o, bytes) else o for o in options]
+        i = 0
+        while i < len(options):
+            opt = options[i]
+            if opt in (b'EX', b'PX'):
+                amount = float(options[i + 1])
+                expires_at = time.time() + (amount if opt == b'EX' else amount / 1000)
+                i += 2
+                continue
+            nx, xx = nx or opt == b'NX', xx or opt == b'XX'
+            i += 1
+        exists = self.store._live(key) is not None
+        if (nx and exists) or (xx and not exists):
+            self._bulk(None)
+            return
+        self.store.data[key] = (value, expires_at)
+        self._simple('OK')
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self.store._live(key) is not None:
+                del self.store.data[key]
+                removed += 1
+        self._int(removed)
+
+    def cmd_exists(self, *keys):
+        self._int(sum(1 for key in keys if self.store._live(key) is not None))
+
+    def cmd_incrby(self, key, amount):
+        item = self.store._live(key)
+        value = int(item[0]) if item else 0
+        value += int(amount)
+        self.store.data[key] = (str(value).encode(), item[1] if item else None)
+        self._int(value)
+
+    def cmd_incr(self, key):
+        self.cmd_incrby(key, b'1')
+
+    def cmd_pexpire(self, key, ms):
+        item = self.store._live(key)
+        if item:
+            self.store.data[key] = (item[0], time.time() + int(ms) / 1000)
+        self._int(1 if item else 0)
+
+    def cmd_expire(self, key, seconds):
+        self.cmd_pexpire(key, int(seconds) * 1000)
+
+    def cmd_pttl(self, key):
+        item = self.store._live(key)
+        if item is None:
+            self._int(-2)
+        else:
+            self._int(-1 if item[1] is None else int((item[1] - time.time()) * 1000))
+
+    def cmd_dbsize(self):
+        self._int(len(self.store.data))
+
+    def cmd_flushdb(self, *args):
+        self.store.data.clear()
+        self._simple('OK')
+
+    cmd_flushall = cmd_flushdb
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(host='127.0.0.1', port=6390):
+    """Build a server without starting it (port 0 picks a free port)."""
+    handler = type('Handler', (RespHandler,), {'store': Store()})
+    return FakeRedisServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory Redis-protocol server for local runs and tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port)
+    print(f'Fake Redis listening on redis://{args.host}:{args.port}/0')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Fill the database with synthetic users and data for benchmarks and manual testing.
+
+    python -m tools.gen_data --rows 100000 --users 1000
+
+Writes about --rows rows spread over the user tables of schema.sql, into
+DATABASE_PATH (and its shards, by DB_SHARDS) or --db. The data is shaped
+like real use rather than uniform:
+
+    - activity per user is Pareto distributed (alpha 1.5): most users have a
+      handful of rows, a few heavy users have thousands
+    - each table gets its share of the rows (TABLE_SHARES): many pomodoro
+      sessions, error questions and notes, few books and papers
+    - book sizes are log-normal around BOOK_MEDIAN_BYTES with a tail of
+      multi-megabyte books (each with reading progress and chapters), and
+      relaxation / brainstorm chat logs are log-normal around 10 messages
+      with a tail of hundreds
+    - timestamps cover the last year, half of the notes are due for review
+
+The same --rows, --users and --seed give the same data. tools/bench_endpoints
+uses populate() directly.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import config
+import database
+from utils.helpers import gen_id
+
+TABLE_SHARES = {
+    'pomodoro_sessions': 0.24,
+    'error_questions': 0.20,
+    'notes': 0.15,
+    'quotes': 0.11,
+    'problem_sessions': 0.09,
+    'essays': 0.05,
+    'documents': 0.04,
+    'relaxation_sessions': 0.04,
+    'brainstorm_sessions': 0.03,
+    'resource_searches': 0.03,
+    'papers': 0.01,
+    'books': 0.01,
+}
+PARETO_ALPHA = 1.5
+BOOK_MEDIAN_BYTES = 60 * 1024
+BOOK_MAX_BYTES = 8 * 1024 * 1024
+CHAT_MEDIAN_MESSAGES = 10
+BATCH_ROWS = 5000
+
+SUBJECTS = ('数学', '物理', '化学', '英语', '语文', '生物', '历史')
+DIFFICULTIES = ('easy', 'medium', 'hard')
+NOTE_METHODS = ('free', 'cornell', 'feynman')
+WORDS = ('学习', '方程', '函数', '记忆', '复习', '概念', '练习', '理解', '章节', '总结', '实验', '定理',
+         'theory', 'model', 'data', 'memory', 'review', 'practice', 'energy', 'reaction')
+
+
+def user_weights(rng, users):
+    """Share of the rows each user owns: Pareto distributed, heaviest user first."""
+    raw = sorted((rng.paretovariate(PARETO_ALPHA) for _ in range(users)), reverse=True)
+    total = sum(raw)
+    return [w / total for w in raw]
+
+
+def user_ids(users):
+    return [f'gen-user-{i}' for i in range(users)]
+
+
+class _Text:
+    """Slices of one random block, so large texts cost a copy rather than generation."""
+
+    def __init__(self, rng, size=2 * 1024 * 1024):
+        parts, length = [], 0
+        while length < size:
+            word = rng.choice(WORDS) + rng.choice(' ，。、\n')
+            parts.append(word)
+            length += len(word)
+        self.block = ''.join(parts)
+        self.rng = rng
+
+    def __call__(self, chars):
+        chars = max(1, int(chars))
+        if chars >= len(self.block):
+            return (self.block * (chars // len(self.block) + 1))[:chars]
+        start = self.rng.randrange(len(self.block) - chars)
+        return self.block[start:start + chars]
+
+    def around(self, median, sigma=0.6, cap=None):
+        chars = self.rng.lognormvariate(math.log(median), sigma)
+        return self(min(chars, cap) if cap else chars)
+
+
+def _timestamps(rng, days=365):
+    now = datetime.utcnow()
+
+    def stamp(offset_days=None):
+        when = now - timedelta(days=rng.random() * days if offset_days is None else offset_days)
+        return when.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    return stamp
+
+
+def _chat(rng, text, roles):
+    count = max(1, min(1000, int(rng.lognormvariate(math.log(CHAT_MEDIAN_MESSAGES), 1.0))))
+    return json.dumps([{'role': roles[i % len(roles)], 'content': text.around(120)} for i in range(count)],
+                      ensure_ascii=False)
+
+
+def _rows(table, user, rng, text, stamp):
+    """Rows for one row slot of table: {table: [row tuple]} (books bring their progress and chapters)."""
+    created = stamp()
+    if table == 'pomodoro_sessions':
+        duration = rng.choice((15, 25, 25, 25, 45, 50))
+        completed = int(rng.random() < 0.85)
+        return {table: [(gen_id(user), user, text(20), duration, created,
+                         created if completed else None, completed, created)]}
+    if table == 'error_questions':
+        return {table: [(gen_id(user), user, text.around(150), text(20), text(20), text.around(300),
+                         rng.choice(SUBJECTS), rng.choice(DIFFICULTIES), round(rng.random(), 2), created)]}
+    if table == 'notes':
+        due = stamp(rng.uniform(-30, 30)) if rng.random() < 0.9 else None
+        return {table: [(gen_id(user), user, text(16), text.around(600, 0.9), rng.choice(NOTE_METHODS), '{}', '{}',
+                         json.dumps(rng.sample(SUBJECTS, 2), ensure_ascii=False), due, rng.randint(0, 6),
+                         created, created)]}
+    if table == 'quotes':
+        return {table: [(gen_id(user), text.around(60), rng.choice(SUBJECTS), 'zh', text(6), rng.choice(SUBJECTS),
+                         user, 0, None, created)]}
+    if table == 'problem_sessions':
+        analysis = {'difficulty': rng.choice(DIFFICULTIES), 'problemType': text(8),
+                    'requiredConcepts': [text(6) for _ in range(3)], 'estimatedTime': rng.randint(5, 40),
+                    'solutionApproach': [text(30) for _ in range(4)]}
+        progress = [{'step': i, 'userResponse': text(40)} for i in range(rng.randint(0, 5))]
+        return {table: [(gen_id(user), user, text.around(200), rng.choice(SUBJECTS), len(progress),
+                         int(rng.random() < 0.6), json.dumps(progress, ensure_ascii=False),
+                         json.dumps(analysis, ensure_ascii=False), created)]}
+    if table == 'essays':
+        feedback = json.dumps({'score': rng.randint(60, 98), 'comments': text(200)}, ensure_ascii=False) \
+            if rng.random() < 0.7 else None
+        return {table: [(gen_id(user), user, text(16), text.around(1500), rng.choice(SUBJECTS),
+                         rng.choice(('A', 'B', 'C')), feedback, created)]}
+    if table == 'documents':
+        return {table: [(gen_id(user), text(16), text.around(3000, 1.0), user, created, created)]}
+    if table == 'relaxation_sessions':
+        return {table: [(gen_id(user), user, _chat(rng, text, ('user', 'assistant')), 'neutral', created)]}
+    if table == 'brainstorm_sessions':
+        return {table: [(gen_id(user), user, text(20), _chat(rng, text, ('optimist', 'pessimist', 'realist', 'creative')),
+                         text.around(800), text.around(300), 'active', created)]}
+    if table == 'resource_searches':
+        resources = [{'title': text(20), 'url': f'https://example.com/{rng.randrange(10 ** 9)}'} for _ in range(8)]
+        return {table: [(gen_id(user), user, text(12), 'balanced', json.dumps(resources, ensure_ascii=False), '{}',
+                         len(resources), created)]}
+    if table == 'papers':
+        return {table: [(gen_id(user), text(30), json.dumps([text(6), text(6)], ensure_ascii=False), text.around(800),
+                         text.around(40000, 0.8), None, user, created, created)]}
+    # books
+    book_id = gen_id(user)
+    content = text.around(BOOK_MEDIAN_BYTES // 3, 1.2, BOOK_MAX_BYTES // 3)  # ~3 UTF-8 bytes per character
+    chapters = max(1, min(60, len(content) // 8000))
+    step = len(content) // chapters
+    return {
+        'books': [(book_id, text(16), text(6), content, None, user, created, created)],
+        'reading_progress': [(gen_id(user), book_id, user, rng.randint(1, chapters), chapters, '[]', None)],
+        'book_chapters': [(book_id, i, f'第{i + 1}章', i * step, (i + 1) * step if i < chapters - 1 else len(content))
+                          for i in range(chapters)],
+    }
+
+
+INSERTS = {
+    'pomodoro_sessions': 'INSERT INTO pomodoro_sessions (id, user_id, task, duration, start_time, end_time, completed, created_at) VALUES (?,?,?,?,?,?,?,?)',
+    'error_questions': 'INSERT INTO error_questions (id, user_id, question, user_answer, correct_answer, explanation, subject, difficulty, mastery_level, created_at) VALUES (?,?,?,?,?,?,?,?,?,?)',
+    'notes': 'INSERT INTO notes (id, user_id, title, content, method, cornell_data, feynman_result, tags, next_review_at, review_count, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)',
+    'quotes': 'INSERT INTO quotes (id, content, theme, language, author, category, user_id, is_daily, daily_date, created_at) VALUES (?,?,?,?,?,?,?,?,?,?)',
+    'problem_sessions': 'INSERT INTO problem_sessions (id, user_id, question, subject, current_step, completed, user_progress, analysis, created_at) VALUES (?,?,?,?,?,?,?,?,?)',
+    'essays': 'INSERT INTO essays (id, user_id, title, content, subject, grade, feedback, created_at) VALUES (?,?,?,?,?,?,?,?)',
+    'documents': 'INSERT INTO documents (id, title, content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?)',
+    'relaxation_sessions': 'INSERT INTO relaxation_sessions (id, user_id, messages, mood, created_at) VALUES (?,?,?,?,?)',
+    'brainstorm_sessions': 'INSERT INTO brainstorm_sessions (id, user_id, topic, messages, synthesis, recommendation, status, created_at) VALUES (?,?,?,?,?,?,?,?)',
+    'resource_searches': 'INSERT INTO resource_searches (id, user_id, query, search_strategy, resources, categorized_resources, total_results, created_at) VALUES (?,?,?,?,?,?,?,?)',
+    'papers': 'INSERT INTO papers (id, title, authors, abstract, content, translated_content, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?)',
+    'books': 'INSERT INTO books (id, title, author, content, summary, user_id, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?)',
+    'reading_progress': 'INSERT INTO reading_progress (id, book_id, user_id, current_chapter, total_chapters, completed_steps, comprehension_score) VALUES (?,?,?,?,?,?,?)',
+    'book_chapters': 'INSERT INTO book_chapters (book_id, idx, title, start_offset, end_offset) VALUES (?,?,?,?,?)',
+}
+
+
+def plan(rows, users, seed=1):
+    """[(user_id, {table: row count})] for --rows rows over --users users."""
+    rng = random.Random(seed)
+    weights = user_weights(rng, users)
+    result = []
+    for user, weight in zip(user_ids(users), weights):
+        counts = {}
+        for table, share in TABLE_SHARES.items():
+            expected = rows * weight * share
+            # Round at random so small expectations still produce rows now and then
+            count = int(expected) + (rng.random() < expected - int(expected))
+            if count:
+                counts[table] = count
+        result.append((user, counts))
+    return result
+
+
+def populate(rows, users, seed=1, shards=None, base=None):
+    """Generate the data into every shard of base (DATABASE_PATH); returns a summary dict."""
+    shards = shards or database.shard_count()
+    base = base or config.DATABASE_PATH
+    rng = random.Random(seed + 1)
+    text = _Text(rng)
+    stamp = _timestamps(rng)
+    conns = {}
+    pending = {}
+    written = {}
+    start = time.perf_counter()
+
+    def flush(shard):
+        conn = conns[shard]
+        with conn:
+            for table, batch in pending[shard].items():
+                conn.executemany(INSERTS[table], batch)
+                written[table] = written.get(table, 0) + len(batch)
+        pending[shard] = {}
+
+    users_plan = plan(rows, users, seed)
+    for user, counts in users_plan:
+        shard = database.shard_for_user(user, shards)
+        if shard not in conns:
+            conns[shard] = sqlite3.connect(database.shard_path(shard, base))
+            # Throwaway bulk load: a crash only loses generated data
+            conns[shard].execute('PRAGMA synchronous=OFF')
+            pending[shard] = {}
+        for table, count in counts.items():
+            for _ in range(count):
+                for target, new_rows in _rows(table, user, rng, text, stamp).items():
+                    pending[shard].setdefault(target, []).extend(new_rows)
+        if sum(len(b) for b in pending[shard].values()) >= BATCH_ROWS:
+            flush(shard)
+    for shard, conn in conns.items():
+        flush(shard)
+        conn.close()
+
+    heaviest = users_plan[0]
+    return {
+        'rows': sum(written.values()), 'users': users, 'seed': seed,
+        'tables': dict(sorted(written.items())),
+        'heaviestUser': heaviest[0], 'heaviestUserRows': sum(heaviest[1].values()),
+        'seconds': round(time.perf_counter() - start, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic users and data')
+    parser.add_argument('--rows', type=int, default=100000, help='approximate number of rows to write')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='database file (default DATABASE_PATH); shards are created next to it')
+    args = parser.parse_args()
+
+    if args.db:
+        config.DATABASE_PATH = os.path.abspath(args.db)
+    os.makedirs(os.path.dirname(config.DATABASE_PATH), exist_ok=True)
+    database.init_db()
+    summary = populate(args.rows, args.users, args.seed)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Replay a realistic traffic mix against the Flask app and report latency percentiles.
+
+Against a running app (pointed at the fake LLM server):
+
+    python -m tools.loadtest --base-url http://127.0.0.1:5000 --duration 30 --concurrency 16
+
+Or fully self-contained, with the fake LLM, a throwaway database and the app
+all started in-process:
+
+    python -m tools.loadtest --self-host --llm-latency uniform:0.2,0.8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+DEFAULT_MIX = 'crud=6,chat=3,translate=1'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def random_text(n):
+    words = ['学习', '方程', '函数', '记忆', '复习', 'theory', 'model', 'data', '概念', '练习']
+    return ' '.join(random.choice(words) for _ in range(n))
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+class Client:
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+
+    def call(self, label, method, path, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        start = time.perf_counter()
+        ok = True
+        body = None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                raw = resp.read()
+                body = json.loads(raw) if raw else None
+        except (urllib.error.URLError, OSError, ValueError):
+            ok = False
+        self.recorder.record(f'{method} {label}', time.perf_counter() - start, ok)
+        return body
+
+
+def scenario_crud(client, user_id):
+    note = client.call('/api/v1/notes', 'POST', '/api/v1/notes', {
+        'userId': user_id, 'title': random_text(3), 'content': random_text(200), 'tags': ['bench'],
+    })
+    client.call('/api/v1/notes/user/<id>', 'GET', f'/api/v1/notes/user/{user_id}')
+    if note and note.get('id'):
+        client.call('/api/v1/notes/<id>', 'GET', f'/api/v1/notes/{note["id"]}')
+        client.call('/api/v1/notes/<id>', 'PUT', f'/api/v1/notes/{note["id"]}', {
+            'title': note['title'], 'content': random_text(220), 'tags': ['bench'],
+        })
+    doc = client.call('/api/v1/documents', 'POST', '/api/v1/documents', {
+        'userId': user_id, 'title': random_text(2), 'content': random_text(300),
+    })
+    if doc and doc.get('id'):
+        client.call('/api/v1/documents/<id>', 'GET', f'/api/v1/documents/{doc["id"]}')
+    client.call('/api/v1/documents/user/<id>', 'GET', f'/api/v1/documents/user/{user_id}')
+    client.call('/api/v1/error-questions', 'POST', '/api/v1/error-questions', {
+        'userId': user_id, 'question': random_text(30), 'subject': random.choice(['数学', '物理', '英语']),
+    })
+    client.call('/api/v1/error-questions/user/<id>/analysis', 'GET', f'/api/v1/error-questions/user/{user_id}/analysis')
+    client.call('/api/pomodoro/user/<id>/stats', 'GET', f'/api/pomodoro/user/{user_id}/stats')
+
+
+def scenario_chat(client, user_id):
+    session = client.call('/api/v1/relaxation-chat/sessions', 'POST', '/api/v1/relaxation-chat/sessions', {'userId': user_id})
+    if session and session.get('id'):
+        client.call('/api/v1/relaxation-chat/messages', 'POST', '/api/v1/relaxation-chat/messages', {
+            'userId': user_id, 'sessionId': session['id'], 'content': '最近考试压力有点大',
+        })
+    client.call('/api/v1/problems/analyze', 'POST', '/api/v1/problems/analyze', {
+        'question': '解方程 x^2 - 5x + 6 = 0', 'subject': '数学',
+    })
+    client.call('/api/v1/quotes/generate', 'POST', '/api/v1/quotes/generate', {'userId': user_id, 'theme': '学习'})
+
+
+def scenario_translate(client, user_id):
+    paper = client.call('/api/v1/papers', 'POST', '/api/v1/papers', {
+        'userId': user_id, 'title': 'Bench paper',
+        'content': '\n'.join(random_text(120) for _ in range(6)),
+    })
+    if paper and paper.get('id'):
+        client.call('/api/v1/papers/<id>/translate', 'POST', f'/api/v1/papers/{paper["id"]}/translate', {})
+
+
+SCENARIOS = {
+    'crud': scenario_crud,
+    'chat': scenario_chat,
+    'translate': scenario_translate,
+}
+
+
+def parse_mix(spec):
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario: {name}')
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def run(base_url, duration, concurrency, mix, users, timeout):
+    recorder = Recorder()
+    names = [m[0] for m in mix]
+    weights = [m[1] for m in mix]
+    user_ids = ['bench-' + ''.join(random.choices(string.ascii_lowercase, k=8)) for _ in range(users)]
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = Client(base_url, recorder, timeout)
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            SCENARIOS[name](client, random.choice(user_ids))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, time.perf_counter() - started
+
+
+def report(recorder, elapsed, out=sys.stdout):
+    total = sum(len(v) for v in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+    out.write(f'\n{total} requests in {elapsed:.1f}s  ({total / elapsed:.1f} req/s), {errors} errors\n\n')
+    out.write(f'{"endpoint":<52}{"count":>7}{"rps":>8}{"err":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}\n')
+    rows = {}
+    for label in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[label])
+        row = {
+            'count': len(values),
+            'rps': len(values) / elapsed,
+            'errors': recorder.errors.get(label, 0),
+            'p50': percentile(values, 50) * 1000,
+            'p95': percentile(values, 95) * 1000,
+            'p99': percentile(values, 99) * 1000,
+        }
+        rows[label] = row
+        out.write(f'{label:<52}{row["count"]:>7}{row["rps"]:>8.1f}{row["errors"]:>6}'
+                  f'{row["p50"]:>10.1f}{row["p95"]:>10.1f}{row["p99"]:>10.1f}\n')
+    return {'elapsed': elapsed, 'requests': total, 'errors': errors, 'endpoints': rows}
+
+
+def self_host(llm_latency, llm_error_rate):
+    """Start the fake LLM and the app on ephemeral ports; returns the app base URL."""
+    from tools.fake_llm_server import make_server
+
+    llm = make_server(port=0, latency=llm_latency, error_rate=llm_error_rate)
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+
+    tmp = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ['DASHSCOPE_BASE_URL'] = f'http://127.0.0.1:{llm.server_address[1]}/v1'
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'learning.db')
+
+    from werkzeug.serving import make_server as make_wsgi_server
+    from app import create_app
+
+    app = create_app()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_wsgi_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the learning platform API')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights, default {DEFAULT_MIX}')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--self-host', action='store_true', help='start the fake LLM and the app in-process')
+    parser.add_argument('--llm-latency', default='fixed:0.05')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    base_url = self_host(args.llm_latency, args.llm_error_rate) if args.self_host else args.base_url
+    recorder, elapsed = run(base_url, args.duration, args.concurrency, parse_mix(args.mix), args.users, args.timeout)
+    results = report(recorder, elapsed)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Move existing rows to the shard layout for a new DB_SHARDS value.
+
+Stop the app first, then run with the shard count the data is in now and the
+one you want, and restart with DB_SHARDS set to the new value:
+
+    python -m tools.reshard --from 1 --to 4
+    DB_SHARDS=4 gunicorn -c gunicorn.conf.py wsgi:app
+
+Rows are placed by the rules in database.py: per-user tables by user_id,
+child tables with their parent, GLOBAL_TABLES stay on shard 0. Ids never
+change; ids carrying a slot route themselves under any shard count, older
+ids are found by lookup. Each move copies rows into the target and deletes
+them from the source in one transaction, so an interrupted run can simply be
+run again. Shrinking leaves the emptied shard files behind for you to delete.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import config
+import database
+
+
+def plan(conn):
+    """Tables in the order they are moved: children before the parents they are placed by."""
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    children, owned = [], []
+    for table in tables:
+        if table in database.GLOBAL_TABLES:
+            continue
+        if table in database.CHILD_TABLES:
+            children.append(table)
+            continue
+        columns = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+        if 'user_id' not in columns:
+            raise SystemExit(f'Table {table} has no user_id; add it to GLOBAL_TABLES or CHILD_TABLES in database.py')
+        owned.append(table)
+    return children + owned
+
+
+def move_table(conn, table, source, shards, dry_run):
+    """Move rows of table out of the source shard; returns {target shard: rows}."""
+    columns = ', '.join(r[1] for r in conn.execute(f'PRAGMA main.table_info({table})'))
+    if table in database.CHILD_TABLES:
+        parent, column = database.CHILD_TABLES[table]
+        where = f'{column} IN (SELECT id FROM main.{parent} WHERE target_shard(user_id) = ?)'
+    else:
+        where = 'target_shard(user_id) = ?'
+
+    moved = {}
+    for target in range(shards):
+        if target == source:
+            continue
+        count = conn.execute(f'SELECT COUNT(*) FROM main.{table} WHERE {where}', (target,)).fetchone()[0]
+        if not count:
+            continue
+        moved[target] = count
+        if dry_run:
+            continue
+        with conn:
+            conn.execute(f'INSERT OR REPLACE INTO shard{target}.{table} ({columns}) '
+                         f'SELECT {columns} FROM main.{table} WHERE {where}', (target,))
+            conn.execute(f'DELETE FROM main.{table} WHERE {where}', (target,))
+    return moved
+
+
+def reshard(from_shards, to_shards, dry_run=False):
+    if not dry_run:
+        database.init_db(to_shards)
+    report = {'from': from_shards, 'to': to_shards, 'dryRun': dry_run, 'moved': {}}
+    start = time.perf_counter()
+    for source in range(from_shards):
+        path = database.shard_path(source)
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.create_function('target_shard', 1, lambda user_id: database.shard_for_user(user_id, to_shards),
+                             deterministic=True)
+        for target in range(to_shards):
+            if target != source:
+                conn.execute('ATTACH DATABASE ? AS ?', (database.shard_path(target), f'shard{target}'))
+        # ATTACH ... AS needs autocommit mode; the moves below run in explicit transactions
+        conn.isolation_level = ''
+        for table in plan(conn):
+            for target, count in move_table(conn, table, source, to_shards, dry_run).items():
+                key = f'{source}->{target}'
+                report['moved'].setdefault(key, {})[table] = count
+        conn.close()
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move rows between SQLite shards after changing DB_SHARDS')
+    parser.add_argument('--from', dest='from_shards', type=int, default=config.DB_SHARDS,
+                        help='shard count the data is in now (default: DB_SHARDS)')
+    parser.add_argument('--to', dest='to_shards', type=int, required=True, help='new shard count')
+    parser.add_argument('--dry-run', action='store_true', help='only count the rows that would move')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    args = parser.parse_args()
+    if args.from_shards < 1 or args.to_shards < 1:
+        parser.error('shard counts must be at least 1')
+
+    report = reshard(args.from_shards, args.to_shards, args.dry_run)
+    total = 0
+    for key, tables in sorted(report['moved'].items()):
+        for table, count in sorted(tables.items()):
+            print(f'{key:>8}  {table:<22} {count:>9} rows')
+            total += count
+    verb = 'would move' if args.dry_run else 'moved'
+    print(f'{verb} {total} rows in {report["seconds"]} s')
+    if not args.dry_run:
+        print(f'Restart the app with DB_SHARDS={args.to_shards}')
+        stale = [database.shard_path(i) for i in range(args.to_shards, args.from_shards)]
+        if stale:
+            print('Now empty and safe to delete: ' + ', '.join(stale))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
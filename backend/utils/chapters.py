@@ -0,0 +1,89 @@
+import re
+from utils.file_parser import PAGE_BREAK
+
+# Lines that look like chapter headings: 第三章 / 第3节 / Chapter 3 / PART II / 3. Title
+HEADING_PATTERNS = [
+    re.compile(r'^第[0-9一二三四五六七八九十百千零〇两]+[章节回篇卷部]\s*\S*'),
+    re.compile(r'^(chapter|part|book|section)\s+([0-9]+|[ivxlcdm]+|[a-z]+)\b', re.I),
+    re.compile(r'^[0-9]{1,3}[.、]\s*\S[^。；;，,!?！？]{0,40}$'),
+]
+MAX_HEADING_LENGTH = 60
+MIN_CHAPTER_CHARS = 200
+# Without usable headings, text is cut into sections of about this size
+SECTION_CHARS = 20000
+
+
+def detect_chapters(text):
+    """Split text into chapters using heading heuristics, then page boundaries.
+
+    Returns a list of {'index', 'title', 'start', 'end'} with character
+    offsets into text. Headings win; the text before the first heading (if
+    substantial) becomes a leading chapter. Without headings, long texts are
+    cut into ~SECTION_CHARS sections at page breaks (PDFs) or paragraph
+    breaks, so a reader never has to fetch the whole book at once.
+    """
+    if not text:
+        return [{'index': 1, 'title': '全文', 'start': 0, 'end': 0}]
+
+    starts = _heading_starts(text)
+    if len(starts) >= 2:
+        if starts[0][0] >= MIN_CHAPTER_CHARS:
+            starts.insert(0, (0, '前言'))
+        else:
+            starts[0] = (0, starts[0][1])
+    else:
+        starts = _section_starts(text)
+
+    chapters = []
+    for i, (pos, title) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        chapters.append({'index': i + 1, 'title': title, 'start': pos, 'end': end})
+    return chapters
+
+
+def _heading_starts(text):
+    headings = []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped and len(stripped) <= MAX_HEADING_LENGTH and _is_heading(stripped):
+            headings.append((offset, stripped))
+        offset += len(line)
+
+    # Drop headings that would create tiny chapters (tables of contents, numbered lists)
+    starts = []
+    for pos, title in headings:
+        if starts and pos - starts[-1][0] < MIN_CHAPTER_CHARS:
+            continue
+        starts.append((pos, title))
+    return starts
+
+
+def _section_starts(text):
+    if len(text) <= SECTION_CHARS * 1.5:
+        return [(0, '全文')]
+
+    boundary = PAGE_BREAK if PAGE_BREAK in text else '\n'
+    starts = [(0, _section_title(text, 0, 1))]
+    pos = 0
+    while len(text) - pos > SECTION_CHARS * 1.5:
+        cut = text.find(boundary, pos + SECTION_CHARS)
+        if cut == -1 or cut - pos > SECTION_CHARS * 2:
+            cut = pos + SECTION_CHARS
+        else:
+            cut += 1
+        starts.append((cut, _section_title(text, cut, len(starts) + 1)))
+        pos = cut
+    return starts
+
+
+def _section_title(text, pos, number):
+    first_line = text[pos:pos + MAX_HEADING_LENGTH * 2].strip().split('\n', 1)[0].strip()
+    if first_line:
+        return f'第{number}部分：{first_line[:MAX_HEADING_LENGTH // 2]}'
+    return f'第{number}部分'
+
+
+def _is_heading(line):
+    return any(p.match(line) for p in HEADING_PATTERNS)
+
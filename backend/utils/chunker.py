@@ -0,0 +1,207 @@
+"""Token-aware text chunking for LLM input.
+
+Token counts are estimated, not computed with the model's tokenizer: one
+token per CJK character (kana, hangul and full-width punctuation included)
+and one per four other characters, which is close for Qwen-style BPE
+vocabularies on Chinese and English prose and costs a few milliseconds per
+megabyte (ASCII-only text skips the CJK scan entirely).
+
+Text is cut into sentences at 。！？!? (with any closing quotes or brackets),
+at a full stop followed by whitespace, and at blank lines and page breaks;
+single newlines are treated as spaces, since PDF text breaks its lines
+mid-sentence. A sentence longer than a chunk is cut at clause punctuation or
+whitespace, and a run without either by characters.
+
+iter_chunks() packs sentences into chunks of at most max_tokens. Instead of
+filling every chunk and leaving a short remainder, it looks at up to
+WINDOW_CHUNKS chunks' worth of sentences at a time and spreads them evenly
+over as few chunks as fit. It reads its input lazily, so a generator of
+pages or a file object is chunked in bounded memory.
+"""
+import math
+import re
+
+# Chunks worth of sentences balanced together; bounds memory on streamed input
+WINDOW_CHUNKS = 8
+# Streamed text without a sentence boundary is passed on once this long
+MAX_PENDING_CHARS = 20000
+
+_CJK = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]+')
+_SENTENCE_END = re.compile(
+    r'(?:[。！？!?…]+|\.(?=\s))[”’"\'」』）)\]]*[ \t]*(?:\r?\n(?:[ \t]*\r?\n)+|\f)?\s*'
+    r'|\s*(?:\r?\n[ \t]*\r?\n|\f)\s*'
+)
+_CLAUSE_END = re.compile(r'[，、；：,;:]\s*|\s+')
+
+
+def estimate_tokens(text):
+    """Rough token count: one per CJK character, one per four other characters."""
+    if not text:
+        return 0
+    if text.isascii():
+        return (len(text) + 3) // 4
+    cjk = sum(m.end() - m.start() for m in _CJK.finditer(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def split_sentences(source):
+    """Yield the sentences of source, a string or an iterable of strings (pages, lines, file reads).
+
+    Sentences keep their trailing whitespace, so joining them gives back the text.
+    """
+    if isinstance(source, str):
+        source = (source,)
+    pending = ''
+    for piece in source:
+        if not piece:
+            continue
+        pending += piece
+        start = 0
+        for m in _SENTENCE_END.finditer(pending):
+            # A boundary at the end of what has been read may continue in the next piece
+            if m.end() == len(pending):
+                break
+            yield pending[start:m.end()]
+            start = m.end()
+        pending = pending[start:]
+        if len(pending) > MAX_PENDING_CHARS:
+            yield pending
+            pending = ''
+    if pending:
+        yield pending
+
+
+def head(text, max_tokens):
+    """The leading sentences of text that fit in max_tokens, for prompts that only need an excerpt."""
+    if not text:
+        return ''
+    # Nothing past max_tokens * 4 characters can fit (no character counts for
+    # less than a quarter token), so the rest of a long text need not be split
+    text = text[:max_tokens * 4 * 2]
+    taken = []
+    total = 0
+    for sentence, tokens in _units(split_sentences(text), max_tokens):
+        if total + tokens > max_tokens:
+            break
+        taken.append(sentence)
+        total += tokens
+    return ''.join(taken).strip()
+
+
+def iter_chunks(source, max_tokens, overlap_tokens=0):
+    """Yield chunks of source (a string or an iterable of strings) of at most max_tokens each.
+
+    With overlap_tokens, every chunk after the first starts with the last
+    sentences of the one before it, up to that many tokens, to keep context
+    across the cut; overlap counts towards max_tokens.
+    """
+    if overlap_tokens < 0 or overlap_tokens * 2 > max_tokens:
+        raise ValueError('overlap_tokens must be between 0 and half of max_tokens')
+    budget = max_tokens - overlap_tokens
+    previous = []
+    for group in _balanced(_units(split_sentences(source), budget), budget):
+        carried = _tail(previous, overlap_tokens) if overlap_tokens else []
+        yield ''.join(sentence for sentence, _ in carried + group).strip()
+        previous = group
+
+
+def _units(sentences, max_tokens):
+    """(sentence, tokens) pairs, with sentences over max_tokens cut down."""
+    for sentence in sentences:
+        if not sentence.strip():
+            continue
+        tokens = estimate_tokens(sentence)
+        if tokens <= max_tokens:
+            yield sentence, tokens
+        else:
+            yield from (unit for unit in _split_long(sentence, max_tokens) if unit[0].strip())
+
+
+def _split_long(sentence, max_tokens):
+    pieces = []
+    start = 0
+    for m in _CLAUSE_END.finditer(sentence):
+        if m.end() > start:
+            pieces.append(sentence[start:m.end()])
+            start = m.end()
+    if start < len(sentence):
+        pieces.append(sentence[start:])
+
+    current = ''
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if tokens > max_tokens:
+            if current:
+                yield current, current_tokens
+                current, current_tokens = '', 0
+            yield from _split_chars(piece, tokens, max_tokens)
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            yield current, current_tokens
+            current, current_tokens = '', 0
+        current += piece
+        current_tokens += tokens
+    if current:
+        yield current, current_tokens
+
+
+def _split_chars(piece, tokens, max_tokens):
+    # Equal parts, as many as the estimate needs
+    width = max(1, math.ceil(len(piece) / math.ceil(tokens / max_tokens)))
+    for i in range(0, len(piece), width):
+        part = piece[i:i + width]
+        part_tokens = estimate_tokens(part)
+        # Mixed runs can estimate a little over; halve until they fit
+        while part_tokens > max_tokens and len(part) > 1:
+            half = len(part) // 2
+            yield from _split_chars(part[:half], estimate_tokens(part[:half]), max_tokens)
+            part = part[half:]
+            part_tokens = estimate_tokens(part)
+        yield part, part_tokens
+
+
+def _balanced(units, budget):
+    """Group (sentence, tokens) units into lists of at most budget tokens, evenly sized per window."""
+    window = []
+    window_tokens = 0
+    for unit in units:
+        window.append(unit)
+        window_tokens += unit[1]
+        if window_tokens >= WINDOW_CHUNKS * budget:
+            groups = _split_evenly(window, window_tokens, budget)
+            # The last group goes back into the window, so windows do not leave short chunks behind
+            yield from groups[:-1]
+            window = groups[-1]
+            window_tokens = sum(tokens for _, tokens in window)
+    if window:
+        yield from _split_evenly(window, window_tokens, budget)
+
+
+def _split_evenly(units, total, budget):
+    target = total / max(1, math.ceil(total / budget))
+    groups = [[]]
+    done = 0  # tokens in the closed groups
+    current = 0
+    for unit in units:
+        tokens = unit[1]
+        # Cut where the running total is nearest the next multiple of target
+        if groups[-1] and (current + tokens > budget or done + current + tokens / 2 > target * len(groups)):
+            done += current
+            current = 0
+            groups.append([])
+        groups[-1].append(unit)
+        current += tokens
+    return groups
+
+
+def _tail(units, max_tokens):
+    taken = []
+    total = 0
+    for unit in reversed(units):
+        if total + unit[1] > max_tokens:
+            break
+        taken.append(unit)
+        total += unit[1]
+    taken.reverse()
+    return taken
@@ -0,0 +1,106 @@
+"""Response compression negotiated by Accept-Encoding.
+
+For when the backend is hit directly rather than through a compressing
+proxy. Bodies of compressible types above COMPRESSION_MIN_BYTES are encoded
+with brotli (if the optional `brotli` package is installed) or gzip,
+whichever the client ranks higher. Streamed responses are compressed chunk
+by chunk with a sync flush, so they keep streaming. A strong ETag gets an
+encoding suffix (as Apache's mod_deflate does) because the bytes differ;
+utils.http_cache accepts the suffixed form back.
+"""
+import gzip
+import zlib
+from flask import request
+import config
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml')
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding we support from a werkzeug Accept header, or None."""
+    best, best_q = None, 0
+    for encoding in available_encodings():
+        q = accept_encodings.quality(encoding)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, flushing after each so the client sees data as it is produced."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config.BROTLI_QUALITY)
+        for chunk in chunks:
+            if chunk:
+                yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def init_app(app):
+    if not config.COMPRESSION_ENABLED:
+        return
+
+    @app.after_request
+    def _compress_response(response):
+        if not _should_compress(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(_as_bytes(response.response), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config.COMPRESSION_MIN_BYTES:
+                return response
+            response.set_data(compress(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag + ETAG_SUFFIXES[encoding])
+        return response
+
+
+def _should_compress(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if 'no-transform' in (response.headers.get('Cache-Control') or ''):
+        return False
+    mimetype = response.mimetype or ''
+    # Event streams are left alone: some proxies buffer compressed SSE
+    if mimetype == 'text/event-stream':
+        return False
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _as_bytes(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
@@ -1,35 +1,228 @@
 import os
+import hashlib
+import signal
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import config
 
+# Bump when extraction output changes so cached text from older parsers is not reused
+EXTRACTOR_VERSION = 2
+# PDF pages are separated by a form feed so page boundaries survive extraction
+PAGE_BREAK = '\f'
 
-def extract_text_from_file(file_path):
+_pool = None
+_pool_users = {}  # pool -> extractions using it
+_pool_lock = threading.Lock()
+
+
+def save_upload(stream, path, chunk_size=1 << 20):
+    """Copy an upload stream to path, hashing it on the way; returns (sha256 hex, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def extract_text_from_file(file_path, progress=None):
+    """Extract the whole text of a file; see extract_text_to for the streaming form."""
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as dest:
+        extract_text_to(file_path, dest, progress)
+        dest.seek(0)
+        return dest.read()
+
+
+def extract_text_to(file_path, dest, progress=None):
+    """Write the text of file_path to the writable text stream dest, piece by piece.
+
+    progress, if given, is called as progress(done, total) with page counts
+    for PDFs (and 1/1 for other formats).
+    """
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.txt':
-        return _extract_txt(file_path)
+        _extract_txt(file_path, dest)
     elif ext == '.pdf':
-        return _extract_pdf(file_path)
+        _extract_pdf(file_path, dest, progress)
+        return
     elif ext == '.docx':
-        return _extract_docx(file_path)
+        _extract_docx(file_path, dest)
     else:
         raise ValueError(f'Unsupported file type: {ext}')
+    if progress:
+        progress(1, 1)
 
 
-def _extract_txt(path):
+def _extract_txt(path, dest):
     with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            dest.write(block)
+
+
+def _extract_pdf(path, dest, progress=None):
+    """Extract a PDF in the process pool, where the per-page timeout can be enforced.
+
+    Documents of at least PDF_PARALLEL_MIN_PAGES pages are fanned out in
+    batches of PDF_BATCH_PAGES; shorter ones go to one worker as a single job.
+    """
+    from PyPDF2 import PdfReader
+    total = len(PdfReader(path).pages)
+    if total < config.PDF_PARALLEL_MIN_PAGES:
+        ranges = [(0, total)] if total else []
+    else:
+        batch = config.PDF_BATCH_PAGES
+        ranges = [(start, min(start + batch, total)) for start in range(0, total, batch)]
+    # Keep only a couple of batches per worker in flight so memory stays bounded
+    window = max(1, config.PDF_WORKERS) * 2
+    pool = _acquire_pool()
+    retried = False
+    pending = []
+    next_range = 0
+    first = True
+
+    def submit(start, end):
+        return start, end, pool.submit(_extract_pages, path, start, end, config.PDF_PAGE_TIMEOUT)
+
+    try:
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < window:
+                pending.append(submit(*ranges[next_range]))
+                next_range += 1
+
+            start, end, future = pending[0]
+            try:
+                # The worker enforces the per-page timeout; this only guards against a wedged worker
+                texts = future.result(timeout=config.PDF_PAGE_TIMEOUT * (end - start) + 30)
+            except FutureTimeout:
+                # Give up on the batch and move what is queued behind it to a fresh pool
+                texts = [''] * (end - start)
+                _cancel(pending[1:])
+                _release_pool(pool, broken=True)
+                pool = _acquire_pool()
+                pending[1:] = [submit(s, e) for s, e, _ in pending[1:]]
+            except BrokenProcessPool:
+                # A worker died (crash, OOM): run what was in flight once more on a fresh pool
+                if retried:
+                    raise
+                retried = True
+                _cancel(pending)
+                _release_pool(pool, broken=True)
+                pool = _acquire_pool()
+                pending = [submit(s, e) for s, e, _ in pending]
+                continue
+            pending.pop(0)
+            for text in texts:
+                first = _write_page(dest, text, first, PAGE_BREAK)
+            if progress:
+                progress(end, total)
+    finally:
+        # Left over when extraction fails part way
+        _cancel(pending)
+        _release_pool(pool)
 
 
-def _extract_pdf(path):
+def _cancel(batches):
+    # Futures of a pool that is being given up; shutdown(cancel_futures=) needs Python 3.9
+    for _, _, future in batches:
+        future.cancel()
+
+
+def _write_page(dest, text, first, separator='\n'):
+    if not text:
+        return first
+    if not first:
+        dest.write(separator)
+    dest.write(text)
+    return False
+
+
+class _PageTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+
+# The last PdfReader per thread, reused across the batches of one document
+_readers = threading.local()
+
+
+def _extract_pages(path, start, end, page_timeout):
+    """Extract pages [start, end) of a PDF; a page that errors or exceeds page_timeout yields ''."""
     from PyPDF2 import PdfReader
-    reader = PdfReader(path)
-    text = []
-    for page in reader.pages:
-        t = page.extract_text()
-        if t:
-            text.append(t)
-    return '\n'.join(text)
+    key = (path, os.path.getmtime(path))
+    if getattr(_readers, 'key', None) != key:
+        _readers.key, _readers.reader = key, PdfReader(path)
+    reader = _readers.reader
+
+    # SIGALRM only works on the main thread of a POSIX process (i.e. inside pool workers)
+    use_alarm = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+    texts = []
+    try:
+        for i in range(start, end):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                texts.append(reader.pages[i].extract_text() or '')
+            except Exception:
+                texts.append('')
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return texts
+
+
+def _acquire_pool():
+    """The current pool, counted as in use until _release_pool()."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=max(1, config.PDF_WORKERS),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        _pool_users[_pool] = _pool_users.get(_pool, 0) + 1
+        return _pool
+
+
+def _release_pool(pool, broken=False):
+    """Stop using pool. A broken pool (a worker stuck on a pathological page)
+    is replaced for new extractions at once, but its processes are only
+    terminated when the last extraction still using it is done."""
+    global _pool
+    with _pool_lock:
+        if broken and _pool is pool:
+            _pool = None
+        _pool_users[pool] -= 1
+        retire = _pool_users[pool] == 0 and _pool is not pool
+        if retire:
+            del _pool_users[pool]
+    if retire:
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False)
 
 
-def _extract_docx(path):
+def _extract_docx(path, dest):
     from docx import Document
     doc = Document(path)
-    return '\n'.join(p.text for p in doc.paragraphs if p.text.strip())
+    first = True
+    for p in doc.paragraphs:
+        if p.text.strip():
+            first = _write_page(dest, p.text, first)
@@ -1,15 +1,49 @@
+import os
 import uuid
 import json
+import zlib
 from datetime import datetime
 from flask import jsonify
 
 
-def gen_id():
-    return str(uuid.uuid4())
+def gen_id(user_id=None):
+    """A new UUID; with user_id it carries the owner's shard slot (see database.py).
+
+    Slot ids are RFC 9562 version 8 UUIDs whose first 16 bits are the slot;
+    the rest stays random.
+    """
+    if user_id is None:
+        return str(uuid.uuid4())
+    value = int.from_bytes(os.urandom(16), 'big') & _SLOT_ID_MASK
+    value |= (user_slot(user_id) << 112) | _SLOT_ID_BITS
+    h = f'{value:032x}'
+    return f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
+
+
+# Cleared: slot, version and variant bits; set: version 8, RFC 4122 variant
+_SLOT_ID_MASK = ~((0xffff << 112) | (0xf << 76) | (0x3 << 62)) & ((1 << 128) - 1)
+_SLOT_ID_BITS = (0x8 << 76) | (0x2 << 62)
+
+
+def user_slot(user_id):
+    """Stable 16-bit hash of a user id; shards are slot % DB_SHARDS."""
+    return zlib.crc32(str(user_id or '').encode('utf-8')) & 0xffff
+
+
+def id_slot(resource_id):
+    """Slot stored in an id from gen_id(user_id), or None for other ids."""
+    if not isinstance(resource_id, str) or len(resource_id) != 36 or resource_id[14] != '8':
+        return None
+    try:
+        return int(resource_id[:4], 16)
+    except ValueError:
+        return None
 
 
 def now_iso():
-    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    # Millisecond precision: updated_at doubles as the ETag version of a row
+    now = datetime.utcnow()
+    return now.strftime('%Y-%m-%dT%H:%M:%S.') + f'{now.microsecond // 1000:03d}Z'
 
 
 def row_to_dict(row):
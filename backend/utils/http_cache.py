@@ -0,0 +1,78 @@
+"""Conditional requests (ETag / If-None-Match / If-Match).
+
+ETags are computed from cheap version queries (a row's updated_at, or the
+count, newest updated_at and write counter of a user's collection) that are
+answered from covering indexes and primary keys, so a 304 is returned before
+the body is loaded or serialized. A 304 carries the ETag with the same
+content-encoding suffix (utils/compression.py) as the response it validates.
+"""
+import hashlib
+from flask import request, make_response
+import config
+from utils.compression import ETAG_SUFFIXES, choose_encoding
+
+
+def make_etag(*parts):
+    """A strong ETag (unquoted) for the given version parts."""
+    raw = '\x1f'.join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def row_etag(db, table, row_id):
+    """ETag of a single row from its id and updated_at, or None if the row does not exist."""
+    # Force the (id, updated_at) index: through the primary key SQLite would
+    # read the table row, walking the overflow pages of a large content column
+    row = db.execute(f'SELECT updated_at FROM {table} INDEXED BY idx_{table}_version WHERE id = ?', (row_id,)).fetchone()
+    return version_etag(table, row_id, row['updated_at']) if row else None
+
+
+def version_etag(table, row_id, updated_at):
+    """Same as row_etag, for a row that is already loaded."""
+    return make_etag(table, row_id, updated_at)
+
+
+def collection_etag(db, table, user_id, variant=''):
+    """ETag of a user's rows in table; changes on any insert, update or delete.
+
+    The schema's triggers bump collection_versions on every write to table;
+    count and newest updated_at are kept so a reset counter cannot repeat an
+    old ETag.
+    """
+    row = db.execute(
+        f'SELECT COUNT(*) AS n, MAX(updated_at) AS latest, '
+        f'(SELECT version FROM collection_versions WHERE user_id = ? AND table_name = ?) AS version '
+        f'FROM {table} WHERE user_id = ?', (user_id, table, user_id)
+    ).fetchone()
+    return make_etag(table, user_id, row['n'], row['latest'], row['version'], variant)
+
+
+def is_fresh(etag):
+    """True if the client's If-None-Match already names etag (in any content encoding)."""
+    return any(request.if_none_match.contains(e) for e in _encoded_variants(etag))
+
+
+def precondition_failed(etag):
+    """True if the request carries an If-Match that does not name etag."""
+    return bool(request.if_match) and not any(request.if_match.contains(e) for e in _encoded_variants(etag))
+
+
+def _encoded_variants(etag):
+    # utils.compression suffixes the ETag of compressed responses
+    return [etag] + [etag + suffix for suffix in ETAG_SUFFIXES.values()]
+
+
+def not_modified(etag):
+    """A 304 for etag, suffixed like the 200 it validates was (see utils.compression)."""
+    # The tag for the encoding negotiated now, else whichever variant the client holds
+    encoding = choose_encoding(request.accept_encodings) if config.COMPRESSION_ENABLED else None
+    preferred = etag + ETAG_SUFFIXES[encoding] if encoding else etag
+    candidates = [preferred] + _encoded_variants(etag)
+    response = make_response('', 304)
+    response.set_etag(next((e for e in candidates if request.if_none_match.contains(e)), preferred))
+    return response
+
+
+def with_etag(response, etag):
+    response = make_response(response)
+    response.set_etag(etag)
+    return response
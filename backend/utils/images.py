@@ -0,0 +1,151 @@
+"""Photo preprocessing for the vision model, and perceptual hashes to spot repeats.
+
+Phone photos arrive as 3-12MB JPEGs of 12+ megapixels, sideways (rotation
+lives in the EXIF tag) and mostly empty paper around the question. The model
+reads text fine at VISION_MAX_SIDE pixels, so the upload is turned into a
+small upright JPEG before it is base64'd into the prompt:
+
+    load()    1. decode at a reduced JPEG scale when the photo is much larger than needed
+              2. apply the EXIF orientation
+    encode()  3. crop to the ink, dropping blank paper and whatever the page lies on
+              4. downscale so the long side is at most VISION_MAX_SIDE
+              5. re-encode as JPEG at VISION_JPEG_QUALITY (EXIF and other metadata dropped)
+
+image_hash() is a 256-bit perceptual hash of the loaded (uncropped) image,
+so a repeat can be recognised before any encoding work: copies of the same photo (sent
+again, or re-compressed and resized by a chat app on the way) land within a
+few bits of each other, other photos, even of the same worksheet template,
+dozens of bits away. See services/vision_cache.py.
+"""
+import io
+import math
+import config
+
+HASH_SIZE = 16
+HASH_SCAN_SIDE = 64
+CROP_SCAN_SIDE = 512
+# The page around the ink is found on a coarser copy, with rank filters of
+# PAGE_CLOSE pixels (those get slow on large images)
+PAGE_SCAN_SIDE = 128
+PAGE_CLOSE = 3
+# A pixel counts as ink when it is this much darker than the paper (0-255)
+INK_CONTRAST = 60
+# Keep this fraction of the cropped side around the ink
+CROP_PADDING = 0.03
+
+
+class ImageError(ValueError):
+    pass
+
+
+def load(data, max_side=None):
+    """Decode uploaded image bytes into an upright RGB (or greyscale) image; raises ImageError if they are not an image."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    max_side = max_side or config.VISION_MAX_SIDE
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale for a fraction of the work;
+        # ask for a long side of at least max_side
+        scale = max_side / max(image.size)
+        if scale < 1:
+            image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageError('Unsupported image') from e
+
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+
+def encode(image, max_side=None, quality=None):
+    """Crop a load()ed image to its content, scale it down and return it as JPEG bytes."""
+    from PIL import Image
+    max_side = max_side or config.VISION_MAX_SIDE
+    quality = quality or config.VISION_JPEG_QUALITY
+    box = content_box(image)
+    if box:
+        image = image.crop(box)
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def content_box(image):
+    """Bounding box of the ink on the page plus a little padding, or None when cropping would not help."""
+    from PIL import Image, ImageChops, ImageFilter
+    scan = image.convert('L')
+    scan.thumbnail((CROP_SCAN_SIDE, CROP_SCAN_SIDE))
+    # Paper is the brightest large area; ink is much darker than it
+    histogram = scan.histogram()
+    target, seen, paper = scan.width * scan.height * 0.9, 0, 255
+    for level, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            paper = level
+            break
+    threshold = paper - INK_CONTRAST
+    if threshold <= 0:
+        return None
+    # Fill the ink holes in the paper mask, then shrink it away from the paper's
+    # edges, so a desk or shadow around the page does not count as ink
+    page = scan.resize(_fit(scan.size, PAGE_SCAN_SIDE), Image.BOX).point(lambda p: 255 if p >= threshold else 0)
+    page = page.filter(ImageFilter.MaxFilter(PAGE_CLOSE)).filter(ImageFilter.MinFilter(PAGE_CLOSE))
+    page = page.filter(ImageFilter.MinFilter(PAGE_CLOSE)).resize(scan.size, Image.NEAREST)
+    ink = ImageChops.multiply(scan.point(lambda p: 255 if p < threshold else 0), page)
+    bbox = ink.getbbox()
+    if not bbox:
+        return None
+
+    sx, sy = image.width / scan.width, image.height / scan.height
+    left, top, right, bottom = bbox[0] * sx, bbox[1] * sy, bbox[2] * sx, bbox[3] * sy
+    pad_x, pad_y = (right - left) * CROP_PADDING + 2, (bottom - top) * CROP_PADDING + 2
+    box = (max(0, int(left - pad_x)), max(0, int(top - pad_y)),
+           min(image.width, int(right + pad_x) + 1), min(image.height, int(bottom + pad_y) + 1))
+    # Not worth a re-encode for a sliver, and a tiny box is more likely noise than the question
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    if area > image.width * image.height * 0.9 or area < image.width * image.height * 0.02:
+        return None
+    return box
+
+
+def _fit(size, side):
+    scale = side / max(size)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def image_hash(image):
+    """256-bit DCT hash (64 hex characters) of a PIL image.
+
+    Each bit says whether one of the 16 x 16 lowest frequencies of a 64 x 64
+    grey copy is above their median, which survives re-encoding, resizing and
+    sensor noise but not a different page.
+    """
+    from PIL import Image
+    n = HASH_SCAN_SIDE
+    pixels = image.convert('L').resize((n, n), Image.BOX).tobytes()
+    rows = [[sum(c * v for c, v in zip(basis, pixels[y * n:(y + 1) * n])) for basis in _DCT] for y in range(n)]
+    coefficients = [sum(_DCT[v][y] * rows[y][u] for y in range(n)) for v in range(HASH_SIZE) for u in range(HASH_SIZE)]
+    # The first coefficient is the average brightness, which says nothing about content
+    median = sorted(coefficients[1:])[len(coefficients) // 2]
+    bits = 0
+    for c in coefficients:
+        bits = (bits << 1) | (c > median)
+    return f'{bits:0{HASH_SIZE * HASH_SIZE // 4}x}'
+
+
+def hash_distance(a, b):
+    """Number of differing bits between two image_hash() values."""
+    # int.bit_count() needs Python 3.10
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+_DCT = [[math.cos(math.pi * (2 * x + 1) * u / (2 * HASH_SCAN_SIDE)) for x in range(HASH_SCAN_SIDE)] for u in range(HASH_SIZE)]
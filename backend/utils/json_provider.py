@@ -0,0 +1,65 @@
+"""JSON provider for the Flask app backed by orjson when it is installed.
+
+orjson serializes the large book/paper payloads several times faster than
+the stdlib encoder and emits UTF-8 directly instead of \\u-escaping Chinese
+text. Anything orjson refuses (e.g. integers above 64 bits) falls back to
+the stdlib path. orjson's own datetime and dataclass encoding is turned off,
+so those go through Flask's default() on both paths (datetimes as HTTP
+dates). The two paths give the same values but not the same bytes: the
+stdlib escapes non-ASCII characters, and orjson writes NaN and infinity as
+null where the stdlib writes NaN and Infinity.
+"""
+from flask.json.provider import DefaultJSONProvider
+import config
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # The stdlib path keeps Flask's defaults; orjson always emits UTF-8
+    def __init__(self, app):
+        super().__init__(app)
+        self._options = 0
+        if orjson is not None:
+            self._options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                             | orjson.OPT_PASSTHROUGH_DATACLASS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0))
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # Let the stdlib produce the error Flask expects (and accept what orjson is stricter about)
+            return super().loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self._options | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the JSON provider selected by config.JSON_PROVIDER ('auto', 'orjson' or 'stdlib')."""
+    if config.JSON_PROVIDER == 'stdlib':
+        return
+    if config.JSON_PROVIDER == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson but orjson is not installed')
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
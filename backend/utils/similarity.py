@@ -0,0 +1,83 @@
+"""Near-duplicate detection for short texts: shingles, MinHash signatures, LSH band keys.
+
+Text is normalised first (lower case, every number becomes 0, punctuation
+dropped), so questions that differ only in their numbers count as the same
+kind. Each CJK character is a token, as is each run of Latin letters, each
+number and each operator; shingles are pairs of neighbouring tokens.
+
+Signatures use one-permutation MinHash: every shingle is hashed once and
+lands in one of SIGNATURE_SIZE bins, each bin keeps its smallest hash, and
+empty bins borrow from the next non-empty one. The share of positions where
+two signatures agree estimates the Jaccard similarity of the shingle sets,
+at one hash per shingle instead of one per shingle and position.
+
+For lookups the signature is cut into BANDS bands of BAND_ROWS positions and
+each band is hashed to a key: texts with similarity s share at least one key
+with probability 1 - (1 - s ** BAND_ROWS) ** BANDS (0.99 at s = 0.5, 0.48
+at 0.2), so an index on the keys finds the candidates without a scan.
+"""
+import operator
+import re
+import struct
+import zlib
+from array import array
+
+SIGNATURE_SIZE = 32
+BAND_ROWS = 2
+BANDS = SIGNATURE_SIZE // BAND_ROWS
+
+_TOKEN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]|[a-z]+|\d+(?:\.\d+)?|[=+\-*/^<>%\u221a\u03c0\u2220\u25b3\u00b0]')
+_BIN_SHIFT = 32 - (SIGNATURE_SIZE - 1).bit_length()
+_EMPTY = 0xFFFFFFFF
+
+
+def tokens(text):
+    return ['0' if t[0].isdigit() else t for t in _TOKEN.findall((text or '').lower())]
+
+
+def shingles(text):
+    words = tokens(text)
+    if len(words) < 2:
+        return set(words)
+    return {a + ' ' + b for a, b in zip(words, words[1:])}
+
+
+def signature(text):
+    """MinHash signature (tuple of SIGNATURE_SIZE ints) of text, or None if it has no tokens."""
+    found = shingles(text)
+    if not found:
+        return None
+    bins = [_EMPTY] * SIGNATURE_SIZE
+    for shingle in found:
+        h = zlib.crc32(shingle.encode('utf-8'))
+        # Multiplying spreads crc32's differences into the top bits, which pick the bin
+        b = ((h * 0x9E3779B1) & 0xFFFFFFFF) >> _BIN_SHIFT
+        if h < bins[b]:
+            bins[b] = h
+    for i in range(SIGNATURE_SIZE):
+        if bins[i] == _EMPTY:
+            for step in range(1, SIGNATURE_SIZE):
+                borrowed = bins[(i + step) % SIGNATURE_SIZE]
+                if borrowed != _EMPTY:
+                    bins[i] = (borrowed + step * 0x61C88647) & 0xFFFFFFFF
+                    break
+    return tuple(bins)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the texts two signatures came from."""
+    return sum(map(operator.eq, a, b)) / SIGNATURE_SIZE
+
+
+def band_keys(sig):
+    """[(band, key)] for the LSH index."""
+    return [(band, zlib.crc32(struct.pack(f'{BAND_ROWS}I', *sig[band * BAND_ROWS:(band + 1) * BAND_ROWS])))
+            for band in range(BANDS)]
+
+
+def pack(sig):
+    return array('I', sig).tobytes()
+
+
+def unpack(data):
+    return tuple(array('I', data))
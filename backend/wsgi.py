@@ -0,0 +1,12 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+from app import create_app
+
+app = create_app()
+
+# With preload_app the master imports this module once before forking; loading
+# the LLM client here puts its ~40MB of modules in memory shared by all workers
+# instead of each worker importing them on its first AI request.
+if os.environ.get('PRELOAD_AI_CLIENT', '1') == '1':
+    from services.ai_service import get_client
+    get_client()